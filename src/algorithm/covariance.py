@@ -0,0 +1,147 @@
+import numpy as np
+
+from algorithm.workspace import Workspace
+
+MAX_CACHE_BYTES=2**30
+
+def weighted_covariance(input, weight, chunk_size=None, accumulate_dtype=None, workspace=None):
+    """
+    Weighted spatial covariance U_{nf} = 1/n_frames * sum_{t} weight_{nft} x_{ft} x_{ft}^H,
+    computed as a batched matrix product (X * weight) @ X^H instead of materializing
+    the per-frame outer products x_{ft} x_{ft}^H.
+    Args:
+        input (n_channels, n_bins, n_frames)
+        weight (n_sources, n_bins, n_frames): broadcastable, e.g. (n_sources, 1, n_frames).
+        chunk_size <int>: number of frames processed at once. If None, all frames are processed at once.
+        accumulate_dtype: dtype of sums over frames, e.g. np.complex128 for single precision input.
+            Each chunk is cast to it, so `chunk_size` also bounds the extra memory. If None, dtype of input and weight is used.
+        workspace <Workspace>: buffers of X^H and X * weight of each chunk, which are reused by later calls. If None, they are allocated.
+    Returns:
+        output (n_sources, n_bins, n_channels, n_channels): dtype of input and weight.
+    """
+    n_channels, n_bins, n_frames = input.shape
+    n_sources = weight.shape[0]
+
+    if chunk_size is None:
+        chunk_size = n_frames
+
+    X = input.transpose(1,0,2) # (n_bins, n_channels, n_frames)
+    dtype = np.result_type(input.dtype, weight.dtype)
+
+    if accumulate_dtype is None:
+        accumulate_dtype = dtype
+    else:
+        accumulate_dtype = np.result_type(dtype, accumulate_dtype)
+
+    output = np.zeros((n_sources, n_bins, n_channels, n_channels), dtype=accumulate_dtype)
+
+    for start_idx in range(0, n_frames, chunk_size):
+        end_idx = min(start_idx + chunk_size, n_frames)
+        X_chunk = X[:,:,start_idx:end_idx].astype(accumulate_dtype, copy=False) # (n_bins, n_channels, chunk_size)
+
+        if workspace is None:
+            X_Hermite = X_chunk.transpose(0,2,1).conj() # (n_bins, chunk_size, n_channels)
+        else:
+            X_Hermite = workspace('input_Hermite', (n_bins, end_idx - start_idx, n_channels), X_chunk.dtype)
+            np.conj(X_chunk.transpose(0,2,1), out=X_Hermite)
+
+        for source_idx in range(n_sources):
+            weight_n = weight[source_idx,:,np.newaxis,start_idx:end_idx] # (n_bins, 1, chunk_size)
+
+            if workspace is None:
+                XW = X_chunk * weight_n
+            else:
+                XW = workspace('weighted_input', X_chunk.shape, np.result_type(X_chunk.dtype, weight_n.dtype))
+                np.multiply(X_chunk, weight_n, out=XW)
+
+            output[source_idx] += XW @ X_Hermite # (n_bins, n_channels, n_channels)
+
+    output /= n_frames
+
+    return output.astype(dtype, copy=False)
+
+class WeightedCovariance:
+    """
+    Weighted spatial covariance engine for a fixed input.
+    If `cache=True`, the upper triangles of the per-frame outer products x_{ft} x_{ft}^H are precomputed once
+    and every call reduces to a single batched matrix product with the weights.
+    When the cache would exceed `max_bytes`, the covariance is computed on the fly by `weighted_covariance`.
+    """
+    def __init__(self, input, cache=False, max_bytes=MAX_CACHE_BYTES, chunk_size=None, accumulate_dtype=None):
+        """
+        Args:
+            input (n_channels, n_bins, n_frames)
+            cache <bool>: precompute per-frame outer products.
+            max_bytes <int>: memory budget of cache in bytes.
+            chunk_size <int>: number of frames processed at once when computing on the fly.
+            accumulate_dtype: dtype of sums over frames. See `weighted_covariance`. The cache is kept in dtype of input.
+        """
+        n_channels, n_bins, n_frames = input.shape
+
+        self.input = input
+        self.chunk_size = chunk_size
+        self.accumulate_dtype = accumulate_dtype
+        self.workspace = Workspace()
+        self.shard_workspaces = {}
+        self.n_channels, self.n_bins, self.n_frames = n_channels, n_bins, n_frames
+
+        row, column = np.triu_indices(n_channels)
+        self.row, self.column = row, column
+        n_elements = len(row)
+
+        real_dtype = np.empty(0, dtype=input.dtype).real.dtype
+        n_bytes = n_bins * 2 * n_elements * n_frames * real_dtype.itemsize
+
+        if cache and n_bytes <= max_bytes:
+            X = input.transpose(1,0,2) # (n_bins, n_channels, n_frames)
+            XX = X[:,row,:] * X[:,column,:].conj() # (n_bins, n_elements, n_frames)
+            self.outer_product = np.concatenate([XX.real, XX.imag], axis=1) # (n_bins, 2 * n_elements, n_frames)
+        else:
+            self.outer_product = None
+
+    @property
+    def is_cached(self):
+        return self.outer_product is not None
+
+    def __call__(self, weight, bins=None):
+        """
+        Args:
+            weight (n_sources, n_bins, n_frames): broadcastable, e.g. (n_sources, 1, n_frames).
+                If `bins` is given, (n_sources, len(bins), n_frames) or broadcastable.
+            bins <slice>: range of bins to compute. If None or slice(None), all bins are computed.
+                Each range has its own workspace, so disjoint ranges can be computed by different threads.
+        Returns:
+            output (n_sources, n_bins, n_channels, n_channels)
+        """
+        if bins is None or bins == slice(None):
+            input, outer_product = self.input, self.outer_product
+            workspace = self.workspace
+        else:
+            input = self.input[:,bins]
+            outer_product = None if self.outer_product is None else self.outer_product[bins]
+            workspace = self.shard_workspaces.setdefault((bins.start, bins.stop), Workspace())
+
+        if not self.is_cached:
+            return weighted_covariance(input, weight, chunk_size=self.chunk_size, accumulate_dtype=self.accumulate_dtype, workspace=workspace)
+
+        n_channels, n_frames = self.n_channels, self.n_frames
+        row, column = self.row, self.column
+        n_elements = len(row)
+
+        n_sources = weight.shape[0]
+        dtype = np.result_type(self.input.dtype, weight.dtype)
+        weight = weight.transpose(1,2,0) # (n_bins, n_frames, n_sources) or (1, n_frames, n_sources)
+
+        if self.accumulate_dtype is not None:
+            weight = weight.astype(np.result_type(weight.dtype, np.empty(0, dtype=self.accumulate_dtype).real.dtype), copy=False)
+
+        upper = outer_product @ weight / n_frames # (n_bins, 2 * n_elements, n_sources)
+        upper = upper[:,:n_elements,:] + 1j * upper[:,n_elements:,:] # (n_bins, n_elements, n_sources)
+        upper = upper.transpose(2,0,1) # (n_sources, n_bins, n_elements)
+
+        n_bins = upper.shape[1]
+        output = np.empty((n_sources, n_bins, n_channels, n_channels), dtype=upper.dtype)
+        output[:,:,column,row] = upper.conj()
+        output[:,:,row,column] = upper
+
+        return output.astype(dtype, copy=False)
@@ -0,0 +1,410 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+EPS=1e-12
+
+__initializations__ = ['random', 'nndsvd', 'nndsvda', 'nndsvdar', 'kmeans']
+
+class Initializer:
+    """
+    Base class of initializations of NMF.
+    `__call__(target, n_bases)` returns initial bases and activations of target, whose leading axes, if any, are treated as batch,
+    e.g. (n_sources, n_bins, n_frames) of ILRMA gives bases (n_sources, n_bins, n_bases) and activations (n_sources, n_bases, n_frames).
+    """
+    def __call__(self, target, n_bases):
+        """
+        Args:
+            target (*, n_bins, n_frames): nonnegative matrix.
+            n_bases <int>: number of bases.
+        Returns:
+            base (*, n_bins, n_bases)
+            activation (*, n_bases, n_frames)
+        """
+        batch_shape, (n_bins, n_frames) = target.shape[:-2], target.shape[-2:]
+
+        base = np.empty(batch_shape + (n_bins, n_bases))
+        activation = np.empty(batch_shape + (n_bases, n_frames))
+
+        for batch_idx in np.ndindex(*batch_shape):
+            base[batch_idx], activation[batch_idx] = self.initialize(target[batch_idx], n_bases)
+
+        return base, activation
+
+    def initialize(self, target, n_bases):
+        """
+        Args:
+            target (n_bins, n_frames)
+        Returns:
+            base (n_bins, n_bases)
+            activation (n_bases, n_frames)
+        """
+        raise NotImplementedError("Implement 'initialize' function.")
+
+class RandomInitializer(Initializer):
+    """
+    Uniform random values in [0, 1) drawn from np.random, i.e. bases first, then activations.
+    """
+    def __call__(self, target, n_bases):
+        batch_shape, (n_bins, n_frames) = target.shape[:-2], target.shape[-2:]
+
+        base = np.random.rand(*batch_shape, n_bins, n_bases)
+        activation = np.random.rand(*batch_shape, n_bases, n_frames)
+
+        return base, activation
+
+class NNDSVD(Initializer):
+    """
+    Nonnegative double singular value decomposition.
+    Each of the leading singular triplets is replaced by its dominant nonnegative part, so that the initial product
+    is close to the best rank-n_bases approximation, and is deterministic.
+    Multiplicative updates never move entries from 0, so the zeros of fill='zero' remain through the iterations, which suits sparse factors.
+    fill='mean' (NNDSVDa) or 'random' (NNDSVDar) replaces them by the mean of target (times small random values).
+    Reference: "SVD based initialization: A head start for nonnegative matrix factorization"
+    See https://doi.org/10.1016/j.patcog.2007.09.010
+    """
+    def __init__(self, fill='mean', n_oversamples=10, n_power_iterations=4, seed=0, eps=EPS):
+        """
+        Args:
+            fill <str>: 'zero' (NNDSVD), 'mean' (NNDSVDa), or 'random' (NNDSVDar).
+            n_oversamples <int>, n_power_iterations <int>: parameters of randomized SVD.
+                If n_bases + n_oversamples is not smaller than min(n_bins, n_frames), full SVD is computed instead.
+            seed <int>: seed of randomized SVD and fill='random'. np.random is not consumed.
+        """
+        if fill not in ['zero', 'mean', 'random']:
+            raise ValueError("Not support fill {}. Choose from 'zero', 'mean', or 'random'.".format(fill))
+
+        self.fill = fill
+        self.n_oversamples = n_oversamples
+        self.n_power_iterations = n_power_iterations
+        self.seed = seed
+        self.eps = eps
+
+    def initialize(self, target, n_bases):
+        rng = np.random.default_rng(self.seed)
+
+        U, S, V = _truncated_svd(target, n_bases, n_oversamples=self.n_oversamples, n_power_iterations=self.n_power_iterations, rng=rng)
+
+        n_bins, n_frames = target.shape
+        base = np.zeros((n_bins, n_bases))
+        activation = np.zeros((n_bases, n_frames))
+
+        # Leading singular vectors of nonnegative matrix can be taken nonnegative (Perron-Frobenius).
+        base[:,0] = np.sqrt(S[0]) * np.abs(U[:,0])
+        activation[0] = np.sqrt(S[0]) * np.abs(V[0])
+
+        for base_idx in range(1, len(S)):
+            u, v = U[:,base_idx], V[base_idx]
+            u_positive, u_negative = np.maximum(u, 0), np.maximum(-u, 0)
+            v_positive, v_negative = np.maximum(v, 0), np.maximum(-v, 0)
+
+            norm_u_positive, norm_u_negative = np.linalg.norm(u_positive), np.linalg.norm(u_negative)
+            norm_v_positive, norm_v_negative = np.linalg.norm(v_positive), np.linalg.norm(v_negative)
+
+            positive, negative = norm_u_positive * norm_v_positive, norm_u_negative * norm_v_negative
+
+            if positive > negative:
+                u, v, sigma = u_positive / norm_u_positive, v_positive / norm_v_positive, positive
+            elif negative > 0:
+                u, v, sigma = u_negative / norm_u_negative, v_negative / norm_v_negative, negative
+            else:
+                continue
+
+            scale = np.sqrt(S[base_idx] * sigma)
+            base[:,base_idx] = scale * u
+            activation[base_idx] = scale * v
+
+        base[base < self.eps] = 0
+        activation[activation < self.eps] = 0
+
+        if self.fill != 'zero':
+            mean = target.mean()
+
+            if self.fill == 'mean':
+                base[base == 0] = mean
+                activation[activation == 0] = mean
+            else:
+                is_zero = base == 0
+                base[is_zero] = mean * rng.random(is_zero.sum()) / 100
+                is_zero = activation == 0
+                activation[is_zero] = mean * rng.random(is_zero.sum()) / 100
+
+        return base, activation
+
+class KMeansInitializer(Initializer):
+    """
+    Bases are centroids of k-means on frames normalized by their sums, i.e. spectral shapes which recur in target.
+    Activations are then solved with the bases fixed. See `solve_activation`.
+    """
+    def __init__(self, iteration=20, n_updates=10, seed=0, eps=EPS):
+        """
+        Args:
+            iteration <int>: number of iterations of k-means.
+            n_updates <int>: number of updates of activations with fixed bases.
+            seed <int>: seed of k-means++ seeding. np.random is not consumed.
+        """
+        self.iteration = iteration
+        self.n_updates = n_updates
+        self.seed = seed
+        self.eps = eps
+
+    def initialize(self, target, n_bases):
+        rng = np.random.default_rng(self.seed)
+
+        gain = target.sum(axis=0)
+        frames = target[:,gain > self.eps] / gain[gain > self.eps]
+        frames = frames.transpose(1,0) # (n_valid_frames, n_bins)
+
+        if len(frames) < n_bases:
+            raise ValueError("Number of nonzero frames {} is smaller than n_bases {}.".format(len(frames), n_bases))
+
+        centroid = _kmeans(frames, n_bases, iteration=self.iteration, rng=rng)
+        base = np.maximum(centroid.transpose(1,0), self.eps)
+        activation = solve_activation(target, base, n_updates=self.n_updates, eps=self.eps)
+
+        return base, activation
+
+class DictionaryInitializer(Initializer):
+    """
+    Warm start from a pretrained dictionary of bases, e.g. learned on previous files of the same speaker or instrument.
+    Activations are solved with the bases fixed. See `solve_activation`.
+    The dictionary is either given as array, or loaded lazily from `DictionaryCache` by its configuration at the first call.
+    If the configuration is not in the cache, `fallback` is used instead.
+    """
+    def __init__(self, base=None, cache=None, config=None, fallback=None, n_updates=10, eps=EPS):
+        """
+        Args:
+            base (n_bins, n_bases) or (*, n_bins, n_bases): dictionary, whose leading axes are broadcast to the batch of target.
+            cache <DictionaryCache>: cache which the dictionary of `config` is loaded from, if base is None.
+            config <dict>: configuration of dictionary, e.g. {'speaker': 'A', 'fft_size': 4096, 'n_bases': 10}.
+            fallback: initialization if the dictionary is not found. See `build_initializer`.
+            n_updates <int>: number of updates of activations with fixed bases.
+        """
+        if base is None and cache is None:
+            raise ValueError("Specify base or cache.")
+
+        self.base = base
+        self.cache = cache
+        self.config = config
+        self.fallback = build_initializer(fallback)
+        self.n_updates = n_updates
+        self.eps = eps
+
+    def __call__(self, target, n_bases):
+        base = self.base
+
+        if base is None:
+            base = self.cache.load(self.config)
+
+        if base is None:
+            return self.fallback(target, n_bases)
+
+        if base.shape[-1] != n_bases:
+            raise ValueError("Dictionary has {} bases, but n_bases is {}.".format(base.shape[-1], n_bases))
+
+        batch_shape = np.broadcast_shapes(target.shape[:-2], base.shape[:-2])
+        base = np.broadcast_to(base, batch_shape + base.shape[-2:]).astype(np.float64)
+        activation = solve_activation(target, np.maximum(base, self.eps), n_updates=self.n_updates, eps=self.eps)
+
+        return base, activation
+
+class DictionaryCache:
+    """
+    Dictionaries of NMF bases persisted in a directory, and keyed by configuration (any JSON-serializable dict).
+    Each dictionary is saved as <key>.npz with its configuration, and loaded lazily at the first request and kept in memory.
+    """
+    def __init__(self, root):
+        """
+        Args:
+            root <str>: directory of dictionaries, which is created at the first save.
+        """
+        self.root = root
+        self.dictionaries = {}
+
+    def key(self, config):
+        """
+        Args:
+            config <dict>: configuration of dictionary.
+        Returns:
+            key <str>: hash of configuration, which does not depend on the order of items.
+        """
+        serialized = json.dumps(config, sort_keys=True, default=str)
+
+        return hashlib.sha1(serialized.encode('utf-8')).hexdigest()[:16]
+
+    def path(self, config):
+        return os.path.join(self.root, "{}.npz".format(self.key(config)))
+
+    def __contains__(self, config):
+        return self.key(config) in self.dictionaries or os.path.exists(self.path(config))
+
+    def load(self, config):
+        """
+        Returns:
+            base (*, n_bins, n_bases): dictionary of config, or None if not saved.
+        """
+        key = self.key(config)
+
+        if key not in self.dictionaries:
+            path = self.path(config)
+
+            if not os.path.exists(path):
+                return None
+
+            with np.load(path) as npz:
+                self.dictionaries[key] = npz['base']
+
+        return self.dictionaries[key]
+
+    def save(self, config, base):
+        """
+        Args:
+            config <dict>: configuration of dictionary.
+            base (*, n_bins, n_bases): dictionary, e.g. `base` of NMF or ILRMA after separation.
+        """
+        os.makedirs(self.root, exist_ok=True)
+
+        path = self.path(config)
+        base = np.array(base, dtype=np.float64)
+
+        # Written to a temporary file first, so a dictionary is never read half-written by other processes.
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, base=base, config=json.dumps(config, sort_keys=True, default=str))
+        os.replace(path + '.tmp', path)
+
+        self.dictionaries[self.key(config)] = base
+
+def build_initializer(init):
+    """
+    Args:
+        init: <Initializer>, name in __initializations__, array of bases (see `DictionaryInitializer`), or None (random).
+    Returns:
+        initializer <Initializer>
+    """
+    if init is None:
+        return RandomInitializer()
+
+    if isinstance(init, Initializer):
+        return init
+
+    if isinstance(init, np.ndarray):
+        return DictionaryInitializer(base=init)
+
+    if init == 'random':
+        return RandomInitializer()
+    if init == 'nndsvd':
+        return NNDSVD(fill='zero')
+    if init == 'nndsvda':
+        return NNDSVD(fill='mean')
+    if init == 'nndsvdar':
+        return NNDSVD(fill='random')
+    if init == 'kmeans':
+        return KMeansInitializer()
+
+    raise ValueError("Not support initialization {}. Choose from {}.".format(init, __initializations__))
+
+def solve_activation(target, base, n_updates=10, eps=EPS):
+    """
+    Activations of target given fixed bases by multiplicative updates of Euclidean NMF from ones,
+    which are strictly positive unlike projection by pseudo-inverse, so later multiplicative updates can move every entry.
+    Args:
+        target (*, n_bins, n_frames)
+        base (*, n_bins, n_bases)
+    Returns:
+        activation (*, n_bases, n_frames)
+    """
+    base_transpose = base.swapaxes(-1,-2)
+    numerator = base_transpose @ target
+    gram = base_transpose @ base
+
+    activation = np.ones(numerator.shape)
+
+    for idx in range(n_updates):
+        activation *= numerator / np.maximum(gram @ activation, eps)
+        activation = np.maximum(activation, eps)
+
+    return activation
+
+def _truncated_svd(input, rank, n_oversamples=10, n_power_iterations=4, rng=None):
+    """
+    Leading singular triplets by randomized SVD, or by full SVD for small input.
+    Reference: "Finding structure with randomness: Probabilistic algorithms for constructing approximate matrix decompositions"
+    See https://arxiv.org/abs/0909.4061
+    Returns:
+        U (n_rows, rank), S (rank,), V (rank, n_columns)
+    """
+    n_rows, n_columns = input.shape
+    rank = min(rank, n_rows, n_columns)
+
+    if rank + n_oversamples >= min(n_rows, n_columns):
+        U, S, V = np.linalg.svd(input, full_matrices=False)
+
+        return U[:,:rank], S[:rank], V[:rank]
+
+    if rng is None:
+        rng = np.random.default_rng()
+
+    Q = input @ rng.standard_normal((n_columns, rank + n_oversamples))
+    Q, _ = np.linalg.qr(Q)
+
+    for idx in range(n_power_iterations):
+        Q, _ = np.linalg.qr(input.transpose(1,0) @ Q)
+        Q, _ = np.linalg.qr(input @ Q)
+
+    U, S, V = np.linalg.svd(Q.transpose(1,0) @ input, full_matrices=False)
+    U = Q @ U
+
+    return U[:,:rank], S[:rank], V[:rank]
+
+def _kmeans(input, n_clusters, iteration=20, rng=None):
+    """
+    Lloyd's algorithm with k-means++ seeding.
+    Args:
+        input (n_samples, n_features)
+    Returns:
+        centroid (n_clusters, n_features)
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    n_samples = len(input)
+    squared_norm = np.sum(input**2, axis=1)
+
+    centroid = np.empty((n_clusters, input.shape[1]))
+    centroid[0] = input[rng.integers(n_samples)]
+    distance = np.maximum(squared_norm - 2 * input @ centroid[0] + np.sum(centroid[0]**2), 0)
+
+    for cluster_idx in range(1, n_clusters):
+        total = distance.sum()
+
+        if total > 0:
+            sample_idx = rng.choice(n_samples, p=distance / total)
+        else:
+            sample_idx = rng.integers(n_samples)
+
+        centroid[cluster_idx] = input[sample_idx]
+        distance = np.minimum(distance, np.maximum(squared_norm - 2 * input @ centroid[cluster_idx] + np.sum(centroid[cluster_idx]**2), 0))
+
+    for idx in range(iteration):
+        distance = squared_norm[:,np.newaxis] - 2 * input @ centroid.transpose(1,0) + np.sum(centroid**2, axis=1) # (n_samples, n_clusters)
+        assignment = np.argmin(distance, axis=1)
+        membership = (assignment == np.arange(n_clusters)[:,np.newaxis]).astype(input.dtype) # (n_clusters, n_samples)
+        counts = membership.sum(axis=1)
+
+        previous_centroid = centroid
+        centroid = membership @ input
+
+        # Empty cluster is moved to the sample farthest from its centroid.
+        for cluster_idx in np.flatnonzero(counts == 0):
+            sample_idx = np.argmax(distance[np.arange(n_samples), assignment])
+            centroid[cluster_idx] = input[sample_idx]
+            distance[sample_idx] = 0
+            counts[cluster_idx] = 1
+
+        centroid /= counts[:,np.newaxis]
+
+        if np.allclose(centroid, previous_centroid):
+            break
+
+    return centroid
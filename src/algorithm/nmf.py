@@ -1,5 +1,10 @@
+import copy
 import numpy as np
-from criterion.divergence import generalized_kl_divergence, is_divergence
+from algorithm.precision import resolve_dtype, adjust_eps
+from algorithm.workspace import Workspace
+from algorithm.initialization import build_initializer
+from criterion.divergence import generalized_kl_divergence, is_divergence, beta_divergence
+from criterion.stopping import build_stopping
 
 EPS=1e-12
 
@@ -14,29 +19,217 @@ class NMFbase:
 
         self.n_bases = n_bases
         self.loss = []
+        self.stopping = None
+        # Number of leading bases which are fixed to pretrained ones given by `update(target, fixed_base=...)`.
+        self.n_fixed = 0
 
         self.eps = eps
     
-    def update(self, target, iteration=100):
+    def update(self, target, iteration=100, stopping=None, dtype=None, init=None, fixed_base=None):
+        """
+        Args:
+            target (n_bins, n_frames): nonnegative matrix.
+            stopping <StoppingCriterion> or <list<StoppingCriterion>>: see criterion.stopping.
+            dtype: precision of factors, e.g. np.float32. If None, precision of target is used. See algorithm.precision.
+            init: initialization of factors, e.g. 'nndsvda', 'kmeans', or pretrained bases (n_bins, n_bases).
+                If None, factors are initialized at random. See algorithm.initialization.
+            fixed_base (n_bins, n_fixed): pretrained bases, which replace the first n_fixed initial bases and are not updated.
+                The other n_bases - n_fixed bases are learned (semi-supervised NMF). If n_fixed == n_bases, only activations are updated.
+        """
         n_bases = self.n_bases
-        eps = self.eps
+
+        _, self.real_dtype = resolve_dtype(dtype, input_dtype=target.dtype)
+        self._eps = adjust_eps(self.eps, self.real_dtype)
+        target = target.astype(self.real_dtype, copy=False)
+
+        self.stopping = build_stopping(stopping)
+
+        if self.stopping is not None:
+            self.stopping.reset()
 
         self.target = target
-        F_bin, T_bin = target.shape
 
-        self.base = np.random.rand(F_bin, n_bases)
-        self.activation = np.random.rand(n_bases, T_bin)
+        base, activation = build_initializer(init)(target, n_bases)
+        self.base = base.astype(self.real_dtype)
+        self.activation = activation.astype(self.real_dtype)
+
+        self.n_fixed = self._fix_base(fixed_base)
 
         for idx in range(iteration):
-            self.update_once()
+            if self.n_fixed > 0:
+                self.update_once_with_fixed_base()
+            else:
+                self.update_once()
 
-            TV = self.base @ self.activation
+            TV = self.reconstruct()
             loss = self.criterion(TV, target)
             self.loss.append(loss.sum())
+
+            if self.stopping is not None and self.stopping(self):
+                break
         
     def update_once(self):
         raise NotImplementedError("Implement 'update_once' function")
 
+    def update_once_with_fixed_base(self):
+        """
+        Update of free bases and all activations, given by the update rules of `compute_statistics`, `update_base_by_statistics`,
+        and `update_activation` of each class. Bases are updated column-wise given activations, so updating all bases
+        and restoring the fixed ones is identical to updating the free ones only.
+        """
+        target = self.target
+        n_fixed = self.n_fixed
+
+        T, V = self.base, self.activation
+
+        # Update free bases
+        if n_fixed < self.n_bases:
+            numerator, denominator = self.compute_statistics(target, T, V)
+            T_free = self.update_base_by_statistics(T, numerator, denominator)[:,n_fixed:]
+            T = np.concatenate([T[:,:n_fixed], T_free], axis=1)
+
+        # Update activations
+        V = self.update_activation(target, T, V)
+
+        self.base, self.activation = T, V
+
+    def _fix_base(self, fixed_base):
+        """
+        Replace the first bases of `self.base` by fixed_base.
+        Returns:
+            n_fixed <int>: number of fixed bases.
+        """
+        if fixed_base is None:
+            return 0
+
+        n_bins, n_fixed = fixed_base.shape
+
+        if n_bins != self.base.shape[0] or n_fixed > self.n_bases:
+            raise ValueError("fixed_base is expected to be ({}, n_fixed) with n_fixed <= {}, but given {}.".format(self.base.shape[0], self.n_bases, fixed_base.shape))
+
+        self.base[:,:n_fixed] = fixed_base
+
+        return n_fixed
+
+    def reconstruct(self):
+        """
+        Returns:
+            reconstruction (n_bins, n_frames): base @ activation.
+        """
+        return self.base @ self.activation
+
+    def update_online(self, target, block_size=1024, n_passes=1, iteration=10, forget=1.0, out=None, dtype=None, init=None, fixed_base=None):
+        """
+        Online (mini-batch) NMF, which streams blocks of frames and keeps only bases and sufficient statistics of the basis update.
+        Activations are solved for each block with fixed bases, then the statistics are accumulated and the bases are updated,
+        so memory is O(n_bins * (n_bases + block_size)) regardless of the number of frames.
+        Reference: "Online algorithms for nonnegative matrix factorization with the Itakura-Saito divergence"
+        See https://ieeexplore.ieee.org/document/6082314
+        Args:
+            target: nonnegative matrix (n_bins, n_frames) sliceable along frames, e.g. np.memmap,
+                or callable which returns an iterable of blocks (n_bins, n_block_frames) at every pass, e.g. a generator function.
+            block_size <int>: number of frames of each block when target is a matrix.
+            n_passes <int>: number of passes over all blocks.
+            iteration <int>: number of updates of activations of each block.
+            forget <float>: forgetting factor of the statistics in (0, 1]. If 1, all blocks are weighted equally.
+            out (n_bases, n_frames): array to write activations of the last pass into, e.g. np.memmap. If None, activations are discarded.
+            dtype: precision of factors, e.g. np.float32. If None, precision of the first block is used.
+            init: initialization of bases from the first block. If None, bases are initialized at random. See `update`.
+            fixed_base (n_bins, n_fixed): pretrained bases which are not updated. See `update`.
+        Loss of each pass (sum over blocks) is appended to `self.loss`.
+        """
+        n_bases = self.n_bases
+
+        self.target = None
+        self.activation = None
+        self.real_dtype = None
+        self.base = None
+
+        numerator, denominator = None, None
+
+        for pass_idx in range(n_passes):
+            loss = 0
+            frame_idx = 0
+
+            for block in _iterate_blocks(target, block_size=block_size):
+                if self.real_dtype is None:
+                    _, self.real_dtype = resolve_dtype(dtype, input_dtype=block.dtype)
+                    self._eps = adjust_eps(self.eps, self.real_dtype)
+
+                block = np.asarray(block).astype(self.real_dtype, copy=False)
+                n_bins, n_frames = block.shape
+
+                if self.base is None:
+                    if init is None:
+                        self.base = np.random.rand(n_bins, n_bases).astype(self.real_dtype)
+                    else:
+                        base, _ = build_initializer(init)(block, n_bases)
+                        self.base = base.astype(self.real_dtype)
+
+                    self.n_fixed = self._fix_base(fixed_base)
+
+                T = self.base
+                V = np.random.rand(n_bases, n_frames).astype(self.real_dtype)
+
+                for idx in range(iteration):
+                    V = self.update_activation(block, T, V)
+
+                _numerator, _denominator = self.compute_statistics(block, T, V)
+
+                if numerator is None:
+                    numerator, denominator = _numerator, _denominator
+                else:
+                    numerator = forget * numerator + _numerator
+                    denominator = forget * denominator + _denominator
+
+                if self.n_fixed < n_bases:
+                    self.base = self.update_base_by_statistics(T, numerator, denominator)
+                    self.base[:,:self.n_fixed] = T[:,:self.n_fixed]
+
+                loss += self.criterion(T @ V, block).sum()
+
+                if out is not None and pass_idx == n_passes - 1:
+                    out[:,frame_idx:frame_idx+n_frames] = V
+
+                frame_idx += n_frames
+
+            self.loss.append(loss)
+
+    def update_activation(self, target, base, activation):
+        """
+        Args:
+            target (n_bins, n_frames)
+            base (n_bins, n_bases)
+            activation (n_bases, n_frames)
+        Returns:
+            activation (n_bases, n_frames): activation updated once with fixed bases.
+        """
+        raise NotImplementedError("Implement 'update_activation' function")
+
+    def compute_statistics(self, target, base, activation):
+        """
+        Args:
+            target (n_bins, n_frames)
+            base (n_bins, n_bases)
+            activation (n_bases, n_frames)
+        Returns:
+            numerator, denominator: sufficient statistics of the multiplicative update of bases, which are summed over blocks.
+        For an update T <- T * (numerator / denominator)^p, bases of the block are included in the numerator as T^(1/p),
+        so that `update_base_by_statistics` gives bases by (numerator / denominator)^p. Multiplying the current bases by the ratio
+        of accumulated statistics instead would compound the updates of past blocks.
+        """
+        raise NotImplementedError("Implement 'compute_statistics' function")
+
+    def update_base_by_statistics(self, base, numerator, denominator):
+        """
+        Args:
+            base (n_bins, n_bases)
+            numerator, denominator: see `compute_statistics`.
+        Returns:
+            base (n_bins, n_bases)
+        """
+        raise NotImplementedError("Implement 'update_base_by_statistics' function")
+
 class EUCNMF(NMFbase):
     def __init__(self, n_bases=2, eps=EPS):
         """
@@ -49,7 +242,7 @@ class EUCNMF(NMFbase):
 
     def update_once(self):
         target = self.target
-        eps = self.eps
+        eps = self._eps
 
         T, V = self.base, self.activation
 
@@ -71,6 +264,36 @@ class EUCNMF(NMFbase):
 
         self.base, self.activation = T, V
 
+    def update_activation(self, target, base, activation):
+        eps = self._eps
+
+        T, V = base, activation
+        T_transpose = T.transpose(1,0)
+        TV = T @ V
+        TV[TV < eps] = eps
+        TTV = T_transpose @ TV
+        TTV[TTV < eps] = eps
+        V = V * (T_transpose @ target / TTV)
+
+        return V
+
+    def compute_statistics(self, target, base, activation):
+        V = activation
+        V_transpose = V.transpose(1,0)
+
+        # Current bases are multiplied into the denominator by `update_base_by_statistics`, so they are not included in the numerator.
+        return target @ V_transpose, V @ V_transpose # (n_bins, n_bases), (n_bases, n_bases)
+
+    def update_base_by_statistics(self, base, numerator, denominator):
+        eps = self._eps
+
+        T = base
+        TVV = T @ denominator
+        TVV[TVV < eps] = eps
+        T = T * (numerator / TVV)
+
+        return T
+
 class KLNMF(NMFbase):
     def __init__(self, n_bases=2, eps=EPS):
         """
@@ -83,7 +306,7 @@ class KLNMF(NMFbase):
 
     def update_once(self):
         target = self.target
-        eps = self.eps
+        eps = self._eps
 
         T, V = self.base, self.activation
 
@@ -107,6 +330,39 @@ class KLNMF(NMFbase):
 
         self.base, self.activation = T, V
 
+    def update_activation(self, target, base, activation):
+        eps = self._eps
+
+        T, V = base, activation
+        T_transpose = T.transpose(1,0)
+        TV = T @ V
+        TV[TV < eps] = eps
+        Tsum = T_transpose.sum(axis=1, keepdims=True)
+        Tsum[Tsum < eps] = eps
+        division = target / TV
+        V = V * (T_transpose @ division / Tsum)
+
+        return V
+
+    def compute_statistics(self, target, base, activation):
+        eps = self._eps
+
+        T, V = base, activation
+        V_transpose = V.transpose(1,0)
+        TV = T @ V
+        TV[TV < eps] = eps
+        division = target / TV
+
+        return T * (division @ V_transpose), V_transpose.sum(axis=0, keepdims=True) # (n_bins, n_bases), (1, n_bases)
+
+    def update_base_by_statistics(self, base, numerator, denominator):
+        eps = self._eps
+
+        Vsum = np.maximum(denominator, eps)
+        T = numerator / Vsum
+
+        return T
+
 class ISNMF(NMFbase):
     def __init__(self, n_bases=2, eps=EPS):
         """
@@ -119,7 +375,7 @@ class ISNMF(NMFbase):
 
     def update_once(self):
         target = self.target
-        eps = self.eps
+        eps = self._eps
 
         T, V = self.base, self.activation
 
@@ -142,7 +398,469 @@ class ISNMF(NMFbase):
         V = V * np.sqrt(T_transpose @ division / TTV)
 
         self.base, self.activation = T, V
-        
+
+    def update_activation(self, target, base, activation):
+        eps = self._eps
+
+        T, V = base, activation
+        T_transpose = T.transpose(1,0)
+        TV = T @ V
+        TV[TV < eps] = eps
+        division, TV_inverse = target / (TV**2), 1 / TV
+        TTV = T_transpose @ TV_inverse
+        TTV[TTV < eps] = eps
+        V = V * np.sqrt(T_transpose @ division / TTV)
+
+        return V
+
+    def compute_statistics(self, target, base, activation):
+        eps = self._eps
+
+        T, V = base, activation
+        V_transpose = V.transpose(1,0)
+        TV = T @ V
+        TV[TV < eps] = eps
+        division, TV_inverse = target / (TV**2), 1 / TV
+
+        # Exponent of the update is 1/2.
+        return T**2 * (division @ V_transpose), TV_inverse @ V_transpose # (n_bins, n_bases), (n_bins, n_bases)
+
+    def update_base_by_statistics(self, base, numerator, denominator):
+        eps = self._eps
+
+        TVV = np.maximum(denominator, eps)
+        T = np.sqrt(numerator / TVV)
+
+        return T
+
+class BetaNMF(NMFbase):
+    """
+    NMF based on beta divergence, which includes EUCNMF (beta=2), KLNMF (beta=1), and ISNMF (beta=0) as special cases.
+    Multiplicative updates with the exponent of majorization-minimization converge for any beta.
+    The reconstruction T @ V is computed once per update of each factor and reused by the next update and loss,
+    and the ratios are formed in place in buffers of workspace, so steady-state iterations allocate no (n_bins, n_frames) array.
+    Reference: "Algorithms for nonnegative matrix factorization with the beta-divergence"
+    See https://arxiv.org/abs/1010.1763
+    """
+    def __init__(self, n_bases=2, beta=1, eps=EPS):
+        """
+        Args:
+            n_bases: number of bases
+            beta <float>: parameter of beta divergence, e.g. 2 (EUC), 1 (KL), or 0 (IS).
+        """
+        super().__init__(n_bases=n_bases, eps=eps)
+
+        self.beta = beta
+
+        if beta < 1:
+            self.exponent = 1 / (2 - beta)
+        elif beta > 2:
+            self.exponent = 1 / (beta - 1)
+        else:
+            self.exponent = 1
+
+        if beta == 2:
+            self.criterion = lambda input, target: (input - target)**2
+        elif beta == 1:
+            self.criterion = generalized_kl_divergence
+        elif beta == 0:
+            self.criterion = is_divergence
+        else:
+            self.criterion = lambda input, target: beta_divergence(input, target, beta=beta)
+
+        self.workspace = Workspace()
+        self.reconstruction = None
+
+    def update(self, target, iteration=100, stopping=None, dtype=None, init=None, fixed_base=None):
+        self.reconstruction = None
+
+        super().update(target, iteration=iteration, stopping=stopping, dtype=dtype, init=init, fixed_base=fixed_base)
+
+    def update_online(self, target, block_size=1024, n_passes=1, iteration=10, forget=1.0, out=None, dtype=None, init=None, fixed_base=None):
+        self.reconstruction = None
+
+        super().update_online(target, block_size=block_size, n_passes=n_passes, iteration=iteration, forget=forget, out=out, dtype=dtype, init=init, fixed_base=fixed_base)
+
+    def update_once_with_fixed_base(self):
+        # Reconstruction is recomputed by the update rules, so the cache is not kept.
+        super().update_once_with_fixed_base()
+        self.reconstruction = None
+
+    def update_once(self):
+        target = self.target
+
+        T, V = self.base, self.activation
+
+        if self.reconstruction is None:
+            self.reconstruction = self.compute_reconstruction(T, V)
+
+        # Update bases
+        numerator, denominator = self.compute_auxiliary(target, self.reconstruction)
+        T = self.update_factor(T, numerator, denominator, V, axis='base')
+
+        # Update activations
+        TV = self.compute_reconstruction(T, V)
+        numerator, denominator = self.compute_auxiliary(target, TV)
+        V = self.update_factor(V, numerator, denominator, T, axis='activation')
+
+        self.base, self.activation = T, V
+        self.reconstruction = self.compute_reconstruction(T, V)
+
+    def reconstruct(self):
+        if self.reconstruction is None:
+            return super().reconstruct()
+
+        return self.reconstruction
+
+    def compute_reconstruction(self, base, activation):
+        """
+        Args:
+            base (n_bins, n_bases): leading axes, if any, are treated as batch.
+            activation (n_bases, n_frames): leading axes, if any, are treated as batch.
+        Returns:
+            reconstruction (n_bins, n_frames): T @ V floored by eps, in the buffer 'reconstruction' of workspace.
+        """
+        batch_shape = np.broadcast_shapes(base.shape[:-2], activation.shape[:-2])
+        shape = batch_shape + (base.shape[-2], activation.shape[-1])
+
+        TV = self.workspace('reconstruction', shape, np.result_type(base.dtype, activation.dtype))
+        np.matmul(base, activation, out=TV)
+        np.maximum(TV, self._eps, out=TV)
+
+        return TV
+
+    def compute_auxiliary(self, target, reconstruction):
+        """
+        Args:
+            target (n_bins, n_frames)
+            reconstruction (n_bins, n_frames)
+        Returns:
+            numerator (n_bins, n_frames): target * reconstruction^(beta - 2).
+            denominator (n_bins, n_frames) or None: reconstruction^(beta - 1). None means ones.
+        """
+        beta = self.beta
+        TV = reconstruction
+
+        if beta == 2:
+            return target, TV
+
+        numerator = self.workspace('numerator', TV.shape, TV.dtype)
+
+        if beta == 1:
+            np.divide(target, TV, out=numerator)
+
+            return numerator, None
+
+        denominator = self.workspace('denominator', TV.shape, TV.dtype)
+
+        if beta == 0:
+            np.reciprocal(TV, out=denominator)
+            np.multiply(target, denominator, out=numerator)
+            numerator *= denominator
+        else:
+            np.power(TV, beta - 1, out=denominator)
+            np.multiply(target, denominator, out=numerator)
+            numerator /= TV
+
+        return numerator, denominator
+
+    def update_factor(self, factor, numerator, denominator, other, axis='base'):
+        """
+        Multiplicative update of either factor given the other one.
+        Args:
+            factor: base (n_bins, n_bases) or activation (n_bases, n_frames), which is updated in place.
+            numerator, denominator: see `compute_auxiliary`.
+            other: activation (n_bases, n_frames) if axis='base', otherwise base (n_bins, n_bases).
+            axis <str>: 'base' or 'activation'.
+        Returns:
+            factor: updated factor.
+        """
+        gradient_positive, gradient_negative = self.compute_gradient(numerator, denominator, other, axis=axis)
+        gradient_negative = np.maximum(gradient_negative, self._eps)
+        ratio = np.divide(gradient_positive, gradient_negative, out=gradient_positive)
+
+        if self.exponent == 0.5:
+            np.sqrt(ratio, out=ratio)
+        elif self.exponent != 1:
+            np.power(ratio, self.exponent, out=ratio)
+
+        factor *= ratio
+
+        return factor
+
+    def compute_gradient(self, numerator, denominator, other, axis='base'):
+        """
+        Leading axes of arguments, if any, are treated as batch.
+        Args:
+            numerator, denominator: see `compute_auxiliary`.
+            other: activation (n_bases, n_frames) if axis='base', otherwise base (n_bins, n_bases).
+            axis <str>: 'base' or 'activation'.
+        Returns:
+            gradient_positive, gradient_negative: positive and negative parts of gradient of the factor given by `axis`.
+        """
+        other_transpose = other.swapaxes(-1,-2)
+
+        if axis == 'base':
+            gradient_positive = numerator @ other_transpose
+
+            if denominator is None:
+                gradient_negative = other_transpose.sum(axis=-2, keepdims=True)
+            else:
+                gradient_negative = denominator @ other_transpose
+        else:
+            gradient_positive = other_transpose @ numerator
+
+            if denominator is None:
+                gradient_negative = other_transpose.sum(axis=-1, keepdims=True)
+            else:
+                gradient_negative = other_transpose @ denominator
+
+        return gradient_positive, gradient_negative
+
+    def update_activation(self, target, base, activation):
+        TV = self.compute_reconstruction(base, activation)
+        numerator, denominator = self.compute_auxiliary(target, TV)
+
+        return self.update_factor(activation, numerator, denominator, base, axis='activation')
+
+    def compute_statistics(self, target, base, activation):
+        TV = self.compute_reconstruction(base, activation)
+        numerator, denominator = self.compute_auxiliary(target, TV)
+        V_transpose = activation.transpose(1,0)
+
+        if denominator is None:
+            denominator = V_transpose.sum(axis=0, keepdims=True)
+        else:
+            denominator = denominator @ V_transpose
+
+        return base**(1 / self.exponent) * (numerator @ V_transpose), denominator
+
+    def update_base_by_statistics(self, base, numerator, denominator):
+        eps = self._eps
+
+        T = (numerator / np.maximum(denominator, eps))**self.exponent
+
+        return T
+
+class BatchBetaNMF(BetaNMF):
+    """
+    Beta-NMF of a batch of nonnegative matrices, which runs all factorizations by single batched matrix products.
+    Bases are either independent for each item, or shared across the batch as in the partitioning function of ILRMA.
+    Matrices of different lengths are zero-padded and specified by frame masks.
+    """
+    def __init__(self, n_bases=2, beta=1, share_base=False, eps=EPS):
+        """
+        Args:
+            n_bases: number of bases
+            beta <float>: parameter of beta divergence, e.g. 2 (EUC), 1 (KL), or 0 (IS).
+            share_base <bool>: share bases (n_bins, n_bases) across the batch. Otherwise, bases are (batch_size, n_bins, n_bases).
+        """
+        super().__init__(n_bases=n_bases, beta=beta, eps=eps)
+
+        self.share_base = share_base
+        self.mask = None
+
+    def update(self, target, iteration=100, stopping=None, dtype=None, init=None, mask=None):
+        """
+        Args:
+            target (batch_size, n_bins, n_frames): nonnegative matrices.
+            stopping <StoppingCriterion> or <list<StoppingCriterion>>: see criterion.stopping.
+            dtype: precision of factors, e.g. np.float32. If None, precision of target is used. See algorithm.precision.
+            init: initialization of factors. See `NMFbase.update`. Shared bases are initialized from frames of all items.
+            mask (batch_size, n_frames): True for valid frames. If None, all frames are valid.
+        Per-item loss of each iteration is appended to `self.loss` as (batch_size,).
+        """
+        n_bases = self.n_bases
+
+        _, self.real_dtype = resolve_dtype(dtype, input_dtype=target.dtype)
+        self._eps = adjust_eps(self.eps, self.real_dtype)
+        target = target.astype(self.real_dtype, copy=False)
+
+        batch_size, n_bins, n_frames = target.shape
+
+        if mask is None:
+            self.mask = None
+        else:
+            # Masked frames of target are set to 0, and excluded from the denominators of updates and loss.
+            mask = mask.astype(self.real_dtype)[:,np.newaxis,:] # (batch_size, 1, n_frames)
+            target = target * mask
+            self.mask = mask
+
+        self.stopping = build_stopping(stopping)
+
+        if self.stopping is not None:
+            self.stopping.reset()
+
+        self.target = target
+        self.reconstruction = None
+
+        initializer = build_initializer(init)
+
+        if self.share_base:
+            # Items are concatenated along frames.
+            base, activation = initializer(target.transpose(1,0,2).reshape(n_bins, batch_size * n_frames), n_bases)
+            activation = np.ascontiguousarray(activation.reshape(n_bases, batch_size, n_frames).transpose(1,0,2))
+        else:
+            base, activation = initializer(target, n_bases)
+
+        self.base = base.astype(self.real_dtype)
+        self.activation = activation.astype(self.real_dtype)
+
+        for idx in range(iteration):
+            self.update_once()
+
+            self.loss.append(self.compute_loss(target, self.reconstruct()))
+
+            if self.stopping is not None and self.stopping(self):
+                break
+
+    def update_online(self, target, block_size=1024, n_passes=1, iteration=10, forget=1.0, out=None, dtype=None, init=None, fixed_base=None):
+        """
+        Online update is rejected by ValueError, because a batch is factorized at once.
+        Stream each item by `BetaNMF.update_online` instead.
+        """
+        raise ValueError("Not support online update for batch processing. Use BetaNMF.update_online for each item.")
+
+    def compute_loss(self, target, reconstruction):
+        """
+        Args:
+            target (batch_size, n_bins, n_frames)
+            reconstruction (batch_size, n_bins, n_frames)
+        Returns:
+            loss (batch_size,): loss of each item over valid frames.
+        """
+        loss = self.criterion(reconstruction, target) # (batch_size, n_bins, n_frames)
+
+        if self.mask is not None:
+            # Masked frames are set to 0 instead of multiplied by mask, because criterion may be nan at 0 of target, e.g. beta < 1.
+            np.copyto(loss, 0, where=(self.mask == 0))
+
+        return loss.sum(axis=(1,2))
+
+    def compute_auxiliary(self, target, reconstruction):
+        numerator, denominator = super().compute_auxiliary(target, reconstruction)
+
+        # Numerator is already 0 at masked frames, because target is 0 there.
+        if self.mask is not None and denominator is not None:
+            masked_denominator = self.workspace('masked_denominator', denominator.shape, denominator.dtype)
+            denominator = np.multiply(denominator, self.mask, out=masked_denominator)
+
+        return numerator, denominator
+
+    def compute_gradient(self, numerator, denominator, other, axis='base'):
+        if self.mask is not None and denominator is None:
+            # Denominator of ones is replaced by mask (batch_size, 1, n_frames) without broadcasting it over bins.
+            gradient_positive, _ = super().compute_gradient(numerator, None, other, axis=axis)
+
+            if axis == 'base':
+                gradient_negative = self.mask @ other.swapaxes(-1,-2)
+            else:
+                gradient_negative = other.sum(axis=-2)[...,np.newaxis] * self.mask
+        else:
+            gradient_positive, gradient_negative = super().compute_gradient(numerator, denominator, other, axis=axis)
+
+        if axis == 'base' and self.share_base:
+            gradient_positive, gradient_negative = gradient_positive.sum(axis=0), gradient_negative.sum(axis=0)
+
+        return gradient_positive, gradient_negative
+
+class StreamingNMF:
+    """
+    Activations of streamed frames given fixed bases, e.g. a pretrained dictionary of noise and speech for low-latency enhancement.
+    With the bases fixed, activations of frames are independent, so each call costs O(n_bins * n_bases) per frame
+    regardless of the length of stream. Update rules of activations are those of the given NMF, e.g. KLNMF or ISNMF.
+    Activations of new frames start from those of the last frame, which needs fewer iterations than random initialization.
+    """
+    def __init__(self, nmf, base=None, iteration=10, dtype=None):
+        """
+        Args:
+            nmf <NMFbase>: NMF which has `update_activation`, e.g. KLNMF, ISNMF, or BetaNMF.
+            base (n_bins, n_bases): fixed bases. If None, `nmf.base` (e.g. learned by `nmf.update`) is used.
+            iteration <int>: number of updates of activations of each call.
+            dtype: precision of activations, e.g. np.float32. If None, precision of bases is used. See algorithm.precision.
+        """
+        if base is None:
+            base = nmf.base
+
+        _, real_dtype = resolve_dtype(dtype, input_dtype=base.dtype)
+
+        self.base = base.astype(real_dtype)
+        self.iteration = iteration
+        self.real_dtype = real_dtype
+        # Flooring of update rules is that of the precision of stream.
+        self.eps = adjust_eps(nmf.eps, real_dtype)
+
+        # Update rules run on a shallow copy, so that the given NMF keeps its eps and buffers.
+        self.nmf = copy.copy(nmf)
+        self.nmf._eps = self.eps
+
+        if isinstance(nmf, BetaNMF):
+            self.nmf.workspace = Workspace()
+            self.nmf.reconstruction = None
+
+        self.reset()
+
+    def reset(self):
+        self.activation = None # (n_bases, 1): activation of the last frame.
+
+    def __call__(self, target):
+        """
+        Args:
+            target (n_bins, n_frames): nonnegative frames, e.g. power spectrogram of chunk by algorithm.stft.StreamingSTFT.
+        Returns:
+            activation (n_bases, n_frames)
+        """
+        n_bases = self.base.shape[1]
+        n_frames = target.shape[1]
+
+        target = target.astype(self.real_dtype, copy=False)
+
+        if n_frames == 0:
+            return np.zeros((n_bases, 0), dtype=self.real_dtype)
+
+        if self.activation is None:
+            activation = np.ones((n_bases, n_frames), dtype=self.real_dtype)
+        else:
+            activation = np.repeat(self.activation, n_frames, axis=1)
+
+        for idx in range(self.iteration):
+            activation = self.nmf.update_activation(target, self.base, activation)
+
+        self.activation = activation[:,-1:].copy()
+
+        return activation
+
+    def compute_gain(self, activation, indices):
+        """
+        Wiener-like gain of a subset of bases, e.g. speech bases of noisy frames.
+        Args:
+            activation (n_bases, n_frames): see `__call__`.
+            indices: indices or boolean mask of bases of the component.
+        Returns:
+            gain (n_bins, n_frames): ratio of reconstruction of the component to that of all bases, in [0, 1].
+        """
+        T, V = self.base, activation
+
+        TV = np.maximum(T @ V, self.eps)
+        TV_component = T[:,indices] @ V[indices]
+
+        return TV_component / TV
+
+def _iterate_blocks(target, block_size=1024):
+    """
+    Args:
+        target: matrix (n_bins, n_frames) sliceable along frames, or callable which returns an iterable of blocks.
+    Yields:
+        block (n_bins, n_block_frames)
+    """
+    if callable(target):
+        yield from target()
+        return
+
+    n_frames = target.shape[-1]
+
+    for start_idx in range(0, n_frames, block_size):
+        yield target[:,start_idx:start_idx+block_size]
 
 def _test(metric='EUC'):
     np.random.seed(111)
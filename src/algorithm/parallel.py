@@ -0,0 +1,150 @@
+import os
+import warnings
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from algorithm.stability import StabilityCheck
+
+class BinShardExecutor:
+    """
+    Execution backend which splits the frequency axis into contiguous shards and processes them on a thread pool.
+    Spatial updates (weighted covariances and IP/IP2/ISS) are independent across bins, and NumPy releases the GIL
+    in matrix products and linalg, so shards run in parallel on a single recording.
+    While shards run, BLAS is limited to `blas_threads` threads by threadpoolctl to avoid oversubscription.
+    Without threadpoolctl, BLAS is not limited and RuntimeWarning is issued. Then set OMP_NUM_THREADS etc. before NumPy is imported.
+    """
+    def __init__(self, n_threads=None, n_shards=None, blas_threads=1):
+        """
+        Args:
+            n_threads <int>: number of threads. If None, os.cpu_count() is used.
+            n_shards <int>: number of shards. If None, n_threads is used.
+            blas_threads <int>: number of BLAS threads while shards run. If None, BLAS is not limited.
+        """
+        if n_threads is None:
+            n_threads = os.cpu_count() or 1
+
+        if n_shards is None:
+            n_shards = n_threads
+
+        self.n_threads = n_threads
+        self.n_shards = n_shards
+        self.blas_threads = blas_threads
+
+        self.executor = None
+
+    def shards(self, n_bins):
+        """
+        Args:
+            n_bins <int>
+        Returns:
+            shards <list<slice>>: contiguous ranges of bins, whose sizes differ by at most 1.
+        """
+        n_shards = max(min(self.n_shards, n_bins), 1)
+        boundaries = [(n_bins * shard_idx) // n_shards for shard_idx in range(n_shards + 1)]
+
+        return [slice(start, end) for start, end in zip(boundaries[:-1], boundaries[1:])]
+
+    def map(self, function, n_bins):
+        """
+        Args:
+            function <callable>: function(shard_idx, bins), where bins <slice> is a range of bins.
+                Shards have to write disjoint parts of shared arrays.
+            n_bins <int>
+        Returns:
+            outputs <list>: outputs of function in order of shards.
+        """
+        shards = self.shards(n_bins)
+
+        if self.n_threads <= 1 or len(shards) == 1:
+            return [function(shard_idx, bins) for shard_idx, bins in enumerate(shards)]
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.n_threads)
+
+        with _limit_blas_threads(self.blas_threads):
+            futures = [self.executor.submit(function, shard_idx, bins) for shard_idx, bins in enumerate(shards)]
+            outputs = [future.result() for future in futures]
+
+        return outputs
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __getstate__(self):
+        # Thread pool cannot be pickled, and is created again on demand.
+        state = self.__dict__.copy()
+        state['executor'] = None
+
+        return state
+
+@contextmanager
+def _limit_blas_threads(n_threads):
+    if n_threads is None:
+        yield
+        return
+
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        warnings.warn("threadpoolctl is not installed, so BLAS threads are not limited to {} per shard. Install threadpoolctl, or set OMP_NUM_THREADS etc. before NumPy is imported.".format(n_threads), RuntimeWarning, stacklevel=3)
+        yield
+        return
+
+    with threadpool_limits(limits=n_threads, user_api='blas'):
+        yield
+
+def update_by_shards(parallel, update_bins, n_bins, stability_check, shard_stability_checks=None, gather_stability=True):
+    """
+    Run an update of demixing filters, which is independent across bins, serially or by shards in parallel.
+    Each shard has its own StabilityCheck, because StabilityCheck keeps decisions and statistics of the bins it has solved.
+    Args:
+        parallel <BinShardExecutor> or None: None means serial processing.
+        update_bins <callable>: update_bins(bins, stability_check), where bins <slice> is a range of bins.
+        n_bins <int>
+        stability_check <StabilityCheck>: used for all bins in serial processing, and template of shards otherwise.
+        shard_stability_checks <list<StabilityCheck>>: stability checks of shards returned by the previous call, if any.
+        gather_stability <bool>: gather the numbers of rejected bins of shards into `stability_check` for this iteration.
+            Set True only if update_bins calls StabilityCheck.step, e.g. by IP.
+    Returns:
+        shard_stability_checks <list<StabilityCheck>>: stability checks of shards, which are given to the next call
+            so that decisions reused by `interval` of StabilityCheck persist across iterations.
+    """
+    if shard_stability_checks is None:
+        shard_stability_checks = []
+
+    if parallel is None:
+        update_bins(slice(None), stability_check)
+
+        return shard_stability_checks
+
+    n_shards = len(parallel.shards(n_bins))
+
+    if len(shard_stability_checks) != n_shards:
+        shard_stability_checks = [
+            StabilityCheck(method=stability_check.method, threshold=stability_check.threshold, interval=stability_check.interval) for _ in range(n_shards)
+        ]
+
+    parallel.map(lambda shard_idx, bins: update_bins(bins, shard_stability_checks[shard_idx]), n_bins)
+
+    if gather_stability:
+        stability_check.step()
+        stability_check.n_rejected[-1] = sum([_stability_check.n_rejected[-1] for _stability_check in shard_stability_checks])
+
+    return shard_stability_checks
+
+def build_parallel(parallel):
+    """
+    Args:
+        parallel <BinShardExecutor>, <int> (number of threads), or None
+    Returns:
+        parallel <BinShardExecutor> or None: None means serial processing.
+    """
+    if parallel is None or isinstance(parallel, BinShardExecutor):
+        return parallel
+
+    if parallel <= 1:
+        return None
+
+    return BinShardExecutor(n_threads=parallel)
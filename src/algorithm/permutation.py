@@ -0,0 +1,273 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+EPS=1e-12
+
+__permutation_criteria__ = ['power', 'doa', 'harmonic']
+
+class PermutationSolver:
+    """
+    Permutation alignment of frequency-domain ICA.
+    Each bin is assigned to clusters (= aligned sources) by the Hungarian algorithm on a similarity matrix of (n_sources, n_sources),
+    so the cost per bin is O(n_sources^3) instead of O(n_sources!).
+
+    Criteria (applied in the given order):
+        'power': correlation of power envelopes with cluster centroids.
+            Unless preceded by another criterion, bins are first aligned progressively. Then, they are refined by centroids of all bins.
+        'doa': distance between phase differences of the mixing matrix W^{-1} and those of time differences of arrival (TDOA) of cluster centroids.
+            Centroids are medians of TDOA over bins up to `max_bin`, which should be below spatial aliasing.
+            The phase distance is periodic, so bins above `max_bin` are also assigned.
+        'harmonic': correlation of power envelopes with the aligned adjacent and harmonic bins (f-2, f-1, f+1, f+2, f/2, 2f-1, 2f, 2f+1).
+            Useful as fine-tuning after 'power' or 'doa'.
+    Reference: "A robust and precise method for solving the permutation problem of frequency-domain blind source separation"
+    See https://ieeexplore.ieee.org/document/1306537
+    """
+    def __init__(self, criteria='power', n_iterations=10, reference_id=0, max_bin=None, eps=EPS):
+        """
+        Args:
+            criteria <str> or <list<str>>: 'power', 'doa', 'harmonic', or list of them.
+            n_iterations <int>: maximum number of refinement passes of each criterion. A criterion stops when no bin changes.
+            reference_id <int>: reference microphone of TDOA.
+            max_bin <int>: maximum bin to estimate TDOA of centroids by 'doa'. If None, all bins are used.
+        """
+        if isinstance(criteria, str):
+            criteria = [criteria]
+
+        for criterion in criteria:
+            if criterion not in __permutation_criteria__:
+                raise ValueError("Not support {} criterion. Choose from {}.".format(criterion, __permutation_criteria__))
+
+        self.criteria = criteria
+        self.n_iterations = n_iterations
+        self.reference_id = reference_id
+        self.max_bin = max_bin
+        self.eps = eps
+
+    def __call__(self, estimation, demix_filter=None):
+        """
+        Args:
+            estimation (n_sources, n_bins, n_frames)
+            demix_filter (n_bins, n_sources, n_channels): required by 'doa'.
+        Returns:
+            permutation (n_bins, n_sources): aligned source k of bin f is estimation[permutation[f, k], f].
+        """
+        n_sources, n_bins, n_frames = estimation.shape
+        permutation = None
+
+        for criterion in self.criteria:
+            if criterion == 'power':
+                envelope = self.compute_envelope(estimation)
+                permutation = self.solve_by_power(envelope, permutation=permutation)
+            elif criterion == 'doa':
+                if demix_filter is None:
+                    raise ValueError("Specify demix_filter to solve permutation by 'doa'.")
+                permutation = self.solve_by_doa(demix_filter, permutation=permutation)
+            else:
+                envelope = self.compute_envelope(estimation)
+                permutation = self.solve_by_harmonic(envelope, permutation=permutation)
+
+        if permutation is None:
+            permutation = np.tile(np.arange(n_sources), reps=(n_bins, 1))
+
+        return permutation
+
+    def compute_envelope(self, estimation):
+        """
+        Args:
+            estimation (n_sources, n_bins, n_frames)
+        Returns:
+            envelope (n_bins, n_sources, n_frames): power envelopes with zero mean and unit norm, which are invariant to scaling.
+        """
+        eps = self.eps
+
+        envelope = np.abs(estimation).transpose(1,0,2) # (n_bins, n_sources, n_frames)
+        envelope = envelope - envelope.mean(axis=2, keepdims=True)
+        norm = np.sqrt(np.sum(envelope**2, axis=2, keepdims=True))
+        norm[norm < eps] = eps
+        envelope = envelope / norm
+
+        return envelope
+
+    def solve_by_power(self, envelope, permutation=None):
+        """
+        Args:
+            envelope (n_bins, n_sources, n_frames)
+            permutation (n_bins, n_sources): initial permutation. If None, bins are aligned progressively.
+        Returns:
+            permutation (n_bins, n_sources)
+        """
+        n_bins, n_sources, n_frames = envelope.shape
+
+        if permutation is None:
+            # Bins whose sources are less correlated with each other are more reliable, and aligned first.
+            correlation = np.abs(envelope @ envelope.transpose(0,2,1)) # (n_bins, n_sources, n_sources)
+            correlation = correlation.sum(axis=(1,2)) - np.trace(correlation, axis1=1, axis2=2) # (n_bins,)
+            indices = np.argsort(correlation)
+
+            permutation = np.empty((n_bins, n_sources), dtype=int)
+            permutation[indices[0]] = np.arange(n_sources)
+            centroid = envelope[indices[0]].copy() # (n_sources, n_frames)
+
+            for bin_idx in indices[1:]:
+                score = envelope[bin_idx] @ centroid.transpose(1,0) # (n_sources, n_sources)
+                permutation[bin_idx] = _assign(score)
+                centroid += envelope[bin_idx, permutation[bin_idx]]
+
+        for idx in range(self.n_iterations):
+            aligned = _permute(envelope, permutation) # (n_bins, n_sources, n_frames)
+            centroid = aligned.mean(axis=0) # (n_sources, n_frames)
+            score = envelope @ centroid.transpose(1,0) # (n_bins, n_sources, n_sources)
+            permutation, is_updated = _update(score, permutation)
+
+            if not is_updated:
+                break
+
+        return permutation
+
+    def solve_by_doa(self, demix_filter, permutation=None):
+        """
+        Args:
+            demix_filter (n_bins, n_sources, n_channels)
+            permutation (n_bins, n_sources): initial permutation. If None, sources are sorted by TDOA.
+        Returns:
+            permutation (n_bins, n_sources)
+        """
+        eps = self.eps
+        reference_id = self.reference_id
+        n_bins, n_sources, n_channels = demix_filter.shape
+
+        # Columns of mixing matrix are steering vectors of sources.
+        mixing_matrix = np.linalg.inv(demix_filter) # (n_bins, n_channels, n_sources)
+        reference = mixing_matrix[:,reference_id,np.newaxis,:].copy() # (n_bins, 1, n_sources)
+        reference[np.abs(reference) < eps] = eps
+        phase = np.angle(mixing_matrix / reference) # (n_bins, n_channels, n_sources)
+        phase = np.delete(phase, reference_id, axis=1).transpose(0,2,1) # (n_bins, n_sources, n_channels - 1)
+
+        # DC bin has no phase information and is left as is.
+        fft_size = 2 * (n_bins - 1)
+        max_bin = n_bins - 1 if self.max_bin is None else min(self.max_bin, n_bins - 1)
+        frequency = 2 * np.pi * np.arange(1, n_bins) / fft_size # (n_bins - 1,)
+        phase, frequency = phase[1:], frequency[:,np.newaxis,np.newaxis]
+        tdoa = - phase[:max_bin] / frequency[:max_bin] # (max_bin, n_sources, n_channels - 1) in samples
+
+        if permutation is None:
+            # Sources are initially sorted along the principal axis of TDOA.
+            _tdoa = tdoa.reshape(-1, n_channels - 1)
+            _, _, principal_axis = np.linalg.svd(_tdoa - _tdoa.mean(axis=0), full_matrices=False)
+            projection = (phase / frequency) @ principal_axis[0] # (n_bins - 1, n_sources)
+            permutation = np.argsort(projection, axis=1) # (n_bins - 1, n_sources)
+            permutation = np.concatenate([np.arange(n_sources)[np.newaxis,:], permutation], axis=0)
+
+        _permutation = permutation[1:]
+
+        for idx in range(max(self.n_iterations, 1)):
+            aligned = _permute(tdoa, _permutation[:max_bin]) # (max_bin, n_sources, n_channels - 1)
+            centroid = np.median(aligned, axis=0) # (n_sources, n_channels - 1)
+            # Periodic distance |exp(j phase) - exp(- j omega tau)|^2 = 2 - 2 cos(phase + omega tau).
+            distance = np.sum(1 - np.cos(phase[:,:,np.newaxis,:] + frequency[...,np.newaxis] * centroid), axis=3) # (n_bins - 1, n_sources, n_sources)
+            _permutation, is_updated = _update(- distance, _permutation)
+
+            if not is_updated:
+                break
+
+        permutation = permutation.copy()
+        permutation[1:] = _permutation
+
+        return permutation
+
+    def solve_by_harmonic(self, envelope, permutation=None):
+        """
+        Args:
+            envelope (n_bins, n_sources, n_frames)
+            permutation (n_bins, n_sources): initial permutation.
+        Returns:
+            permutation (n_bins, n_sources)
+        """
+        n_bins, n_sources, n_frames = envelope.shape
+
+        if permutation is None:
+            permutation = np.tile(np.arange(n_sources), reps=(n_bins, 1))
+
+        bins = np.arange(n_bins)
+        neighbors = [bins - 2, bins - 1, bins + 1, bins + 2, bins // 2, 2 * bins - 1, 2 * bins, 2 * bins + 1]
+
+        for idx in range(self.n_iterations):
+            aligned = _permute(envelope, permutation) # (n_bins, n_sources, n_frames)
+            centroid = np.zeros_like(envelope) # (n_bins, n_sources, n_frames)
+
+            for neighbor in neighbors:
+                is_valid = (neighbor >= 0) & (neighbor < n_bins) & (neighbor != bins)
+                centroid[is_valid] += aligned[neighbor[is_valid]]
+
+            score = envelope @ centroid.transpose(0,2,1) # (n_bins, n_sources, n_sources)
+            permutation, is_updated = _update(score, permutation)
+
+            if not is_updated:
+                break
+
+        return permutation
+
+def apply_permutation(demix_filter, estimation, permutation):
+    """
+    Args:
+        demix_filter (n_bins, n_sources, n_channels)
+        estimation (n_sources, n_bins, n_frames)
+        permutation (n_bins, n_sources)
+    Returns:
+        demix_filter (n_bins, n_sources, n_channels)
+        estimation (n_sources, n_bins, n_frames)
+    """
+    n_bins = permutation.shape[0]
+    bins = np.arange(n_bins)
+
+    demix_filter = demix_filter[bins[:,np.newaxis], permutation]
+    estimation = estimation[permutation.transpose(1,0), bins[np.newaxis,:]]
+
+    return demix_filter, estimation
+
+def _permute(input, permutation):
+    """
+    Args:
+        input (n_bins, n_sources, *)
+        permutation (n_bins, n_sources)
+    Returns:
+        output (n_bins, n_sources, *): output[f, k] = input[f, permutation[f, k]]
+    """
+    n_bins = permutation.shape[0]
+
+    return input[np.arange(n_bins)[:,np.newaxis], permutation]
+
+def _assign(score):
+    """
+    Args:
+        score (n_sources, n_clusters): similarity between sources and clusters.
+    Returns:
+        permutation (n_clusters,): source assigned to each cluster.
+    """
+    sources, clusters = linear_sum_assignment(score, maximize=True)
+    permutation = np.empty_like(sources)
+    permutation[clusters] = sources
+
+    return permutation
+
+def _update(score, permutation):
+    """
+    Args:
+        score (n_bins, n_sources, n_clusters)
+        permutation (n_bins, n_sources): current permutation.
+    Returns:
+        permutation (n_bins, n_sources)
+        is_updated <bool>: True if any bin is changed.
+    """
+    n_bins, n_sources, _ = score.shape
+
+    if n_sources == 2:
+        # Only two candidates, which are compared at once.
+        is_swapped = score[:,0,1] + score[:,1,0] > score[:,0,0] + score[:,1,1]
+        new_permutation = np.where(is_swapped[:,np.newaxis], np.array([1,0]), np.array([0,1]))
+    else:
+        new_permutation = np.stack([_assign(_score) for _score in score], axis=0)
+
+    is_updated = np.any(new_permutation != permutation)
+
+    return new_permutation, is_updated
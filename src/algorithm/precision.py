@@ -0,0 +1,58 @@
+import numpy as np
+
+__real_dtypes__ = [np.float32, np.float64]
+
+def resolve_dtype(dtype=None, input_dtype=None):
+    """
+    Args:
+        dtype: precision of computation, e.g. np.complex64, np.float32, 'complex128'.
+            If None, the precision of `input_dtype` is used (double precision for other than single precision).
+        input_dtype: dtype of input.
+    Returns:
+        complex_dtype <np.dtype>: np.complex64 or np.complex128.
+        real_dtype <np.dtype>: np.float32 or np.float64.
+    """
+    if dtype is None:
+        if input_dtype is not None and np.dtype(input_dtype) in [np.complex64, np.float32]:
+            dtype = input_dtype
+        else:
+            dtype = np.float64
+
+    dtype = np.dtype(dtype)
+
+    if dtype.kind not in ['f', 'c'] or np.finfo(dtype).dtype not in __real_dtypes__:
+        raise ValueError("Not support dtype {}. Choose single or double precision.".format(dtype))
+
+    real_dtype = np.finfo(dtype).dtype
+    complex_dtype = np.result_type(real_dtype, np.complex64)
+
+    return complex_dtype, real_dtype
+
+def adjust_eps(eps, dtype):
+    """
+    Flooring value which is safe in the precision of dtype.
+    eps is raised so that 1 / eps^4 does not overflow, e.g. 3.3e-10 for single precision. For double precision, eps is kept as is.
+    The returned value is meant for computation only. Keep the given eps, so that it does not depend on precision of previous calls.
+    Args:
+        eps <float>: flooring value given for double precision.
+        dtype: real or complex dtype.
+    Returns:
+        eps <float>
+    """
+    tiny = float(np.finfo(dtype).tiny)
+
+    return max(eps, tiny**0.25)
+
+def adjust_threshold(threshold, dtype):
+    """
+    Threshold of condition number which is meaningful in the precision of dtype.
+    Condition numbers above 1 / (machine epsilon) cannot be distinguished from singular, e.g. 8.4e+6 for single precision.
+    Args:
+        threshold <float>: threshold given for double precision.
+        dtype: real or complex dtype.
+    Returns:
+        threshold <float>
+    """
+    machine_eps = float(np.finfo(dtype).eps)
+
+    return min(threshold, 1 / machine_eps)
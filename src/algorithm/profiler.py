@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import nullcontext
+
+MAX_EVENTS=100000
+
+class Profiler:
+    """
+    Recorder of wall time (and optionally peak allocation) of named stages, e.g. 'update_source_model', 'update_space_model',
+    'normalize', 'projection_back', 'loss', 'stft', and 'istft'. Stages can be nested and recorded from multiple threads.
+    Separators record their stages if `profiler` is given by `__call__(input, profiler=Profiler())`.
+    A stage costs two calls of time.perf_counter() and a few dictionary updates, so profiling can be left on in production.
+    Allocation tracing by tracemalloc is more expensive, and is enabled only if `trace_memory=True`.
+    """
+    def __init__(self, trace_memory=False, max_events=MAX_EVENTS):
+        """
+        Args:
+            trace_memory <bool>: record peak size of memory allocated during each stage by tracemalloc.
+            max_events <int>: maximum number of events kept for `to_chrome_trace`. Older events are discarded.
+                Statistics of `summary` include all events. If None, all events are kept.
+        """
+        self.trace_memory = trace_memory
+        self.max_events = max_events
+
+        self.reset()
+
+    def reset(self):
+        self.events = deque(maxlen=self.max_events) # (name, start, duration, nbytes, thread_id)
+        self.statistics = {}
+        self.origin = time.perf_counter()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def __call__(self, name):
+        """
+        Args:
+            name <str>: name of stage.
+        Returns:
+            stage: context manager which records the stage on exit.
+        """
+        return _Stage(self, name)
+
+    def _enter(self):
+        if not self.trace_memory:
+            return
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        stack = getattr(self.local, 'stack', None)
+
+        if stack is None:
+            stack = []
+            self.local.stack = stack
+
+        current, peak = tracemalloc.get_traced_memory()
+
+        if len(stack) > 0:
+            # Peak of the outer stage so far, which is lost by reset_peak().
+            stack[-1][1] = max(stack[-1][1], peak)
+
+        stack.append([current, current])
+        tracemalloc.reset_peak()
+
+    def _exit(self, name, start, end):
+        nbytes = None
+
+        if self.trace_memory:
+            stack = self.local.stack
+            _, peak = tracemalloc.get_traced_memory()
+            current, inner_peak = stack.pop()
+            peak = max(peak, inner_peak)
+            nbytes = peak - current
+
+            if len(stack) > 0:
+                stack[-1][1] = max(stack[-1][1], peak)
+
+        duration = end - start
+
+        with self.lock:
+            self.events.append((name, start - self.origin, duration, nbytes, threading.get_ident()))
+            statistics = self.statistics.get(name)
+
+            if statistics is None:
+                statistics = {'count': 0, 'total': 0.0, 'max': 0.0, 'bytes': None}
+                self.statistics[name] = statistics
+
+            statistics['count'] += 1
+            statistics['total'] += duration
+            statistics['max'] = max(statistics['max'], duration)
+
+            if nbytes is not None:
+                statistics['bytes'] = max(statistics['bytes'] or 0, nbytes)
+
+    def summary(self):
+        """
+        Returns:
+            summary <dict>: statistics of each stage, i.e. 'count', 'total', 'mean', and 'max' of seconds,
+                and 'bytes' (peak allocation, or None if memory is not traced).
+        """
+        summary = {}
+
+        with self.lock:
+            for name, statistics in self.statistics.items():
+                summary[name] = dict(statistics)
+                summary[name]['mean'] = statistics['total'] / statistics['count']
+
+        return summary
+
+    def to_dict(self):
+        """
+        Returns:
+            output <dict>: 'summary' (see `summary`) and 'events' (list of name, start and duration in seconds, bytes, and thread).
+        """
+        with self.lock:
+            events = [
+                {'name': name, 'start': start, 'duration': duration, 'bytes': nbytes, 'thread': thread_id} for name, start, duration, nbytes, thread_id in self.events
+            ]
+
+        return {'summary': self.summary(), 'events': events}
+
+    def to_json(self, path=None):
+        """
+        Args:
+            path <str>: path of JSON file. If None, JSON is returned as string.
+        """
+        output = json.dumps(self.to_dict())
+
+        if path is None:
+            return output
+
+        with open(path, 'w') as f:
+            f.write(output)
+
+    def to_chrome_trace(self, path=None):
+        """
+        Trace event format, which can be loaded into chrome://tracing or Perfetto.
+        Args:
+            path <str>: path of JSON file. If None, trace is returned as dict.
+        """
+        pid = os.getpid()
+        trace_events = []
+
+        with self.lock:
+            for name, start, duration, nbytes, thread_id in self.events:
+                event = {'name': name, 'ph': 'X', 'ts': 1e+6 * start, 'dur': 1e+6 * duration, 'pid': pid, 'tid': thread_id}
+
+                if nbytes is not None:
+                    event['args'] = {'bytes': nbytes}
+
+                trace_events.append(event)
+
+        trace = {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+        if path is None:
+            return trace
+
+        with open(path, 'w') as f:
+            json.dump(trace, f)
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter()
+        self.start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter()
+        self.profiler._exit(self.name, self.start, end)
+
+        return False
+
+def profile(profiler, name):
+    """
+    Args:
+        profiler <Profiler> or None
+        name <str>: name of stage.
+    Returns:
+        stage: context manager which records the stage by profiler. If profiler is None, it does nothing.
+    """
+    if profiler is None:
+        return nullcontext()
+
+    return profiler(name)
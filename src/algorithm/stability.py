@@ -0,0 +1,94 @@
+import numpy as np
+
+from algorithm.precision import adjust_threshold
+
+THRESHOLD=1e+12
+
+__stability_checks__ = ['cond', 'norm', 'hadamard']
+
+class StabilityCheck:
+    """
+    Stability check of linear systems A x = e_n solved in iterative projection.
+    Bins whose A is judged as ill-conditioned are rejected, i.e. the corresponding filters are not updated.
+
+    Methods:
+        'cond': 2-norm condition number by SVD, and solution by LU. Exact but expensive.
+        'norm': 1-norm condition number ||A||_1 ||A^{-1}||_1, where A^{-1} is computed by LU and also gives the solution.
+        'hadamard': Hadamard ratio |det A| / prod_i ||a_i||_2 in (0, 1]. Bins with the ratio below 1 / threshold are rejected.
+    """
+    def __init__(self, method='norm', threshold=THRESHOLD, interval=1):
+        """
+        Args:
+            method <str>: 'cond', 'norm', or 'hadamard'.
+            threshold <float>: threshold for condition number.
+            interval <int>: stability is checked every `interval` iterations. Otherwise, the last decision is reused.
+        """
+        if method not in __stability_checks__:
+            raise ValueError("Not support {} stability check. Choose from {}.".format(method, __stability_checks__))
+
+        self.method = method
+        self.threshold = threshold
+        self.interval = interval
+
+        self.reset()
+
+    def reset(self):
+        self.iteration = 0
+        self.n_rejected = []
+        self.condition = {}
+
+    def step(self):
+        """
+        Call once at the beginning of each iteration.
+        """
+        self.iteration += 1
+        self.n_rejected.append(0)
+
+    def solve(self, input, source_idx):
+        """
+        Args:
+            input (n_bins, n_sources, n_channels): A
+            source_idx <int>: index n of e_n
+        Returns:
+            output (n_bins, n_channels): solution of A x = e_n
+            condition (n_bins,): True if A is well-conditioned.
+        """
+        # Condition numbers beyond the precision of input cannot be distinguished from singular.
+        threshold = adjust_threshold(self.threshold, input.dtype)
+        n_bins, n_sources, n_channels = input.shape
+
+        is_checked = (self.iteration - 1) % self.interval == 0 or source_idx not in self.condition
+
+        if self.method == 'norm':
+            input_inverse = np.linalg.inv(input) # (n_bins, n_channels, n_sources)
+            output = input_inverse[:,:,source_idx]
+
+            if is_checked:
+                norm = np.abs(input).sum(axis=1).max(axis=1) # (n_bins,)
+                norm_inverse = np.abs(input_inverse).sum(axis=1).max(axis=1) # (n_bins,)
+                condition = norm * norm_inverse < threshold # (n_bins,)
+        else:
+            e_n = np.zeros((n_bins, n_sources, 1), dtype=input.dtype)
+            e_n[:,source_idx,:] = 1
+            output = np.linalg.solve(input, e_n)[:,:,0]
+
+            if is_checked:
+                if self.method == 'cond':
+                    condition = np.linalg.cond(input) < threshold # (n_bins,)
+                else:
+                    determinant = np.abs(np.linalg.det(input)) # (n_bins,)
+                    norm = np.prod(np.linalg.norm(input, axis=2), axis=1) # (n_bins,)
+                    condition = determinant > norm / threshold # (n_bins,)
+
+        if is_checked:
+            self.condition[source_idx] = condition
+        else:
+            condition = self.condition[source_idx]
+
+        # NaN or inf is also rejected.
+        condition = np.logical_and(condition, np.all(np.isfinite(output), axis=1))
+
+        if len(self.n_rejected) > 0:
+            self.n_rejected[-1] += int(n_bins - condition.sum())
+
+        return output, condition
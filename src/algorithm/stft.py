@@ -18,9 +18,9 @@ def istft(input, fft_size, hop_size=None, window_fn='hann', normalize=False, len
     
 def build_window(fft_size, window_fn='hann'):
     if window_fn == 'hann':
-        window = ss.hann(fft_size, sym=False)
+        window = ss.windows.hann(fft_size, sym=False)
     elif window_fn == 'hamming':
-        window = ss.hamming(fft_size, sym=False)
+        window = ss.windows.hamming(fft_size, sym=False)
     else:
         raise ValueError("Not support {} window.".format(window_fn))
         
@@ -46,6 +46,366 @@ def build_optimal_window(window, hop_size=None):
     
     return optimal_window
 
+class StreamingSTFT:
+    """
+    Stateful STFT which takes sample chunks of arbitrary size.
+    Samples which do not fill a frame yet are carried to the next call.
+    The output of all chunks followed by `flush()` is identical to `stft` of the whole signal.
+    """
+    def __init__(self, fft_size, hop_size=None, window_fn='hann', boundary=True):
+        """
+        Args:
+            fft_size <int>: FFT size.
+            hop_size <int>: hop size. Default: fft_size // 2.
+            window_fn <str>: 'hann' or 'hamming'.
+            boundary <bool>: pad fft_size // 2 zeros at both ends as scipy.signal.stft does.
+        """
+        if hop_size is None:
+            hop_size = fft_size // 2
+
+        self.fft_size, self.hop_size = fft_size, hop_size
+        self.boundary = boundary
+
+        window = build_window(fft_size, window_fn=window_fn)
+        # Same scaling as scipy.signal.stft.
+        self.window = window / window.sum()
+
+        self.reset()
+
+    def reset(self):
+        self.n_channels, self.n_dims = None, None
+        self.buffer = None # (n_channels, capacity)
+        self.frames = None # (n_channels, max_frames, fft_size)
+        self.n_buffered = 0
+
+    def _prepare(self, n_channels, n_samples):
+        """
+        Allocate buffers at the first call, and grow them only when a larger chunk is given.
+        """
+        fft_size, hop_size = self.fft_size, self.hop_size
+
+        if self.buffer is None:
+            self.n_channels = n_channels
+            self.buffer = np.zeros((n_channels, fft_size + n_samples))
+            self.n_buffered = fft_size // 2 if self.boundary else 0
+        elif n_channels != self.n_channels:
+            raise ValueError("Number of channels is {}, but given {}.".format(self.n_channels, n_channels))
+
+        capacity = self.n_buffered + n_samples
+
+        if capacity > self.buffer.shape[1]:
+            buffer = np.zeros((n_channels, capacity))
+            buffer[:,:self.n_buffered] = self.buffer[:,:self.n_buffered]
+            self.buffer = buffer
+
+        max_frames = max((capacity - fft_size) // hop_size + 1, 1)
+
+        if self.frames is None or max_frames > self.frames.shape[1]:
+            self.frames = np.empty((n_channels, max_frames, fft_size))
+
+    def __call__(self, input):
+        """
+        Args:
+            input (n_channels, n_samples) or (n_samples,)
+        Returns:
+            output (n_channels, n_bins, n_frames) or (n_bins, n_frames): frames completed by this chunk.
+        """
+        n_dims = input.ndim
+        self.n_dims = n_dims
+
+        if n_dims == 1:
+            input = input[np.newaxis,:]
+
+        n_channels, n_samples = input.shape
+        self._prepare(n_channels, n_samples)
+
+        self.buffer[:,self.n_buffered:self.n_buffered+n_samples] = input
+        self.n_buffered += n_samples
+
+        output = self._analyze()
+
+        if n_dims == 1:
+            output = output[0]
+
+        return output
+
+    def flush(self):
+        """
+        Pad zeros to the end of signal and emit the remaining frames.
+        Returns:
+            output (n_channels, n_bins, n_frames) or (n_bins, n_frames)
+        """
+        fft_size, hop_size = self.fft_size, self.hop_size
+
+        if self.buffer is None:
+            raise ValueError("No samples are given.")
+
+        n_samples = fft_size // 2 if self.boundary else 0
+        n_buffered = self.n_buffered + n_samples
+
+        # Pad so that the last frame includes the last sample, as scipy.signal.stft(padded=True) does.
+        if n_buffered > fft_size:
+            n_samples += (- (n_buffered - fft_size)) % hop_size
+        elif self.n_buffered > 0:
+            n_samples += fft_size - n_buffered
+
+        input = np.zeros((self.n_channels, n_samples))
+
+        if self.n_dims == 1:
+            input = input[0]
+
+        output = self(input)
+        self.reset()
+
+        return output
+
+    def _analyze(self):
+        fft_size, hop_size = self.fft_size, self.hop_size
+        n_buffered = self.n_buffered
+
+        if n_buffered < fft_size:
+            return np.zeros((self.n_channels, fft_size // 2 + 1, 0), dtype=np.complex128)
+
+        n_frames = (n_buffered - fft_size) // hop_size + 1
+        segments = np.lib.stride_tricks.sliding_window_view(self.buffer[:,:n_buffered], fft_size, axis=1)[:,::hop_size] # (n_channels, n_frames, fft_size)
+        frames = self.frames[:,:n_frames]
+        np.multiply(segments[:,:n_frames], self.window, out=frames)
+        output = np.fft.rfft(frames, axis=2).transpose(0,2,1) # (n_channels, n_bins, n_frames)
+
+        # Carry samples of incomplete frames to the next call.
+        n_consumed = n_frames * hop_size
+        n_remaining = n_buffered - n_consumed
+        self.buffer[:,:n_remaining] = self.buffer[:,n_consumed:n_buffered]
+        self.n_buffered = n_remaining
+
+        return output
+
+class StreamingISTFT:
+    """
+    Stateful inverse STFT which takes frames of arbitrary number and overlap-adds them to the persistent buffer.
+    Synthesis uses the optimal window given by `build_optimal_window`.
+    The output of all frames followed by `flush()` is identical to `istft` of the whole spectrogram.
+    """
+    def __init__(self, fft_size, hop_size=None, window_fn='hann', boundary=True):
+        """
+        Args:
+            fft_size <int>: FFT size.
+            hop_size <int>: hop size. Default: fft_size // 2.
+            window_fn <str>: 'hann' or 'hamming'.
+            boundary <bool>: remove fft_size // 2 samples padded by StreamingSTFT at both ends.
+        """
+        if hop_size is None:
+            hop_size = fft_size // 2
+
+        if fft_size % hop_size != 0:
+            raise ValueError("fft_size is expected to be divisible by hop_size, but given {} and {}.".format(fft_size, hop_size))
+
+        self.fft_size, self.hop_size = fft_size, hop_size
+        self.boundary = boundary
+
+        window = build_window(fft_size, window_fn=window_fn)
+        # Undo the scaling of StreamingSTFT, and synthesize by the optimal window.
+        self.window = window.sum() * build_optimal_window(window, hop_size=hop_size)
+        # Overlap-added weights of analysis and synthesis windows. It is 1 except for the first and last frames.
+        self.weight = window * build_optimal_window(window, hop_size=hop_size)
+
+        self.reset()
+
+    def reset(self):
+        self.n_channels, self.n_dims = None, None
+        self.buffer = None # (n_channels, capacity)
+        self.norm = None # (capacity,)
+        self.n_discard = self.fft_size // 2 if self.boundary else 0
+
+    def _prepare(self, n_channels, n_frames):
+        fft_size, hop_size = self.fft_size, self.hop_size
+        capacity = n_frames * hop_size + fft_size
+
+        if self.buffer is None:
+            self.n_channels = n_channels
+            self.buffer = np.zeros((n_channels, capacity))
+            self.norm = np.zeros(capacity)
+        elif n_channels != self.n_channels:
+            raise ValueError("Number of channels is {}, but given {}.".format(self.n_channels, n_channels))
+        elif capacity > self.buffer.shape[1]:
+            n_overlap = fft_size - hop_size
+            buffer, norm = np.zeros((n_channels, capacity)), np.zeros(capacity)
+            buffer[:,:n_overlap], norm[:n_overlap] = self.buffer[:,:n_overlap], self.norm[:n_overlap]
+            self.buffer, self.norm = buffer, norm
+
+    def __call__(self, input):
+        """
+        Args:
+            input (n_channels, n_bins, n_frames) or (n_bins, n_frames)
+        Returns:
+            output (n_channels, n_samples) or (n_samples,): samples completed by these frames.
+        """
+        fft_size, hop_size = self.fft_size, self.hop_size
+        n_dims = input.ndim
+        self.n_dims = n_dims
+
+        if n_dims == 2:
+            input = input[np.newaxis]
+
+        n_channels, n_bins, n_frames = input.shape
+        self._prepare(n_channels, n_frames)
+
+        frames = np.fft.irfft(input, n=fft_size, axis=1) # (n_channels, fft_size, n_frames)
+        # Frames are windowed at once in place, so the overlap-add below allocates no array per frame.
+        frames *= self.window[:,np.newaxis]
+        buffer, norm = self.buffer, self.norm
+
+        for frame_idx in range(n_frames):
+            start_idx = frame_idx * hop_size
+            buffer[:,start_idx:start_idx+fft_size] += frames[:,:,frame_idx]
+            norm[start_idx:start_idx+fft_size] += self.weight
+
+        output = self._emit(n_frames * hop_size)
+
+        if n_dims == 2:
+            output = output[0]
+
+        return output
+
+    def flush(self):
+        """
+        Emit the remaining samples overlapped with no later frame.
+        Returns:
+            output (n_channels, n_samples) or (n_samples,)
+        """
+        if self.buffer is None:
+            raise ValueError("No frames are given.")
+
+        n_samples = self.fft_size - self.hop_size
+
+        if self.boundary:
+            n_samples -= self.fft_size // 2
+
+        output = self._emit(max(n_samples, 0))
+
+        if self.n_dims == 2:
+            output = output[0]
+
+        self.reset()
+
+        return output
+
+    def _emit(self, n_samples):
+        fft_size, hop_size = self.fft_size, self.hop_size
+        buffer, norm = self.buffer, self.norm
+
+        output = buffer[:,:n_samples] / np.maximum(norm[:n_samples], np.finfo(norm.dtype).tiny)
+
+        n_discard = min(self.n_discard, n_samples)
+        output = output[:,n_discard:]
+        self.n_discard -= n_discard
+
+        n_overlap = fft_size - hop_size
+        buffer[:,:n_overlap] = buffer[:,n_samples:n_samples+n_overlap]
+        norm[:n_overlap] = norm[n_samples:n_samples+n_overlap]
+        buffer[:,n_overlap:] = 0
+        norm[n_overlap:] = 0
+
+        return output
+
+class ConsistencyProjection:
+    """
+    Projection of spectrograms onto the set of consistent spectrograms, i.e. stft(istft(input)),
+    which is equivalent to the round trip of `istft` and `stft` with the same configuration.
+    Windows and normalization are precomputed, and frame buffers are kept across calls of the same shape.
+    Overlap-add and framing are done by hop-size blocks, so all sources are processed by one batched rfft/irfft.
+    """
+    def __init__(self, fft_size, hop_size=None, window_fn='hann'):
+        """
+        Args:
+            fft_size <int>: FFT size.
+            hop_size <int>: hop size. Default: fft_size // 2.
+            window_fn <str>: 'hann' or 'hamming'.
+        """
+        if hop_size is None:
+            hop_size = fft_size // 2
+
+        if fft_size % hop_size != 0:
+            raise ValueError("fft_size is expected to be divisible by hop_size, but given {} and {}.".format(fft_size, hop_size))
+
+        self.fft_size, self.hop_size = fft_size, hop_size
+        self.n_overlaps = fft_size // hop_size
+
+        # Scaling of stft and istft by window.sum() cancels out in the round trip.
+        window = build_window(fft_size, window_fn=window_fn)
+        self.window = window.reshape(self.n_overlaps, hop_size) # (n_overlaps, hop_size)
+
+        self.n_frames = None
+        self.normalization = None
+        self.signal = None
+        self.frames = None
+
+    def _prepare(self, n_batches, n_frames, dtype=np.float64):
+        """
+        Args:
+            dtype: real dtype of frame buffers, i.e. precision of input.
+        """
+        fft_size, hop_size = self.fft_size, self.hop_size
+        n_overlaps = self.n_overlaps
+        n_blocks = n_frames + n_overlaps - 1
+
+        if self.n_frames != n_frames:
+            window = self.window
+            norm = np.zeros((n_blocks, hop_size))
+
+            for overlap_idx in range(n_overlaps):
+                norm[overlap_idx:overlap_idx+n_frames] += window[overlap_idx]**2
+
+            # istft removes fft_size // 2 samples at both ends, and stft pads zeros there again.
+            normalization = np.zeros(n_blocks * hop_size)
+            valid = slice(fft_size // 2, n_blocks * hop_size - fft_size // 2)
+            normalization[valid] = 1 / norm.reshape(-1)[valid]
+
+            self.n_frames = n_frames
+            self.normalization = normalization.reshape(n_blocks, hop_size)
+
+        if self.signal is None or self.signal.shape != (n_batches, n_blocks, hop_size) or self.signal.dtype != dtype:
+            self.signal = np.empty((n_batches, n_blocks, hop_size), dtype=dtype)
+            self.frames = np.empty((n_batches, n_frames, n_overlaps, hop_size), dtype=dtype)
+
+    def __call__(self, input):
+        """
+        Args:
+            input (*, n_bins, n_frames)
+        Returns:
+            output (*, n_bins, n_frames): in the precision of input.
+        """
+        fft_size, hop_size = self.fft_size, self.hop_size
+        n_overlaps = self.n_overlaps
+
+        shape = input.shape
+        n_bins, n_frames = shape[-2:]
+        input = input.reshape(-1, n_bins, n_frames)
+        n_batches = input.shape[0]
+
+        self._prepare(n_batches, n_frames, dtype=np.finfo(input.dtype).dtype)
+        signal, frames = self.signal, self.frames
+        window = self.window
+
+        # Inverse STFT by overlap-add of hop-size blocks.
+        frames_inverse = np.fft.irfft(input, n=fft_size, axis=1) # (n_batches, fft_size, n_frames)
+        frames_inverse = frames_inverse.transpose(0,2,1).reshape(n_batches, n_frames, n_overlaps, hop_size)
+        signal[...] = 0
+
+        for overlap_idx in range(n_overlaps):
+            signal[:,overlap_idx:overlap_idx+n_frames] += window[overlap_idx] * frames_inverse[:,:,overlap_idx]
+
+        signal *= self.normalization
+
+        # STFT of the signal.
+        for overlap_idx in range(n_overlaps):
+            np.multiply(signal[:,overlap_idx:overlap_idx+n_frames], window[overlap_idx], out=frames[:,:,overlap_idx])
+
+        output = np.fft.rfft(frames.reshape(n_batches, n_frames, fft_size), axis=2) # (n_batches, n_frames, n_bins)
+        output = output.transpose(0,2,1).reshape(*shape).astype(input.dtype, copy=False)
+
+        return output
+
 def _test():
     np.random.seed(111)
 
@@ -0,0 +1,163 @@
+import numpy as np
+
+from algorithm.stability import StabilityCheck
+
+EPS=1e-12
+
+__update_rules__ = ['IP', 'IP2', 'ISS']
+
+def update_by_ip(demix_filter, weighted_covariance, stability_check=None, logdet=None):
+    """
+    Iterative projection (IP).
+    Reference: "Stable and fast update rules for independent vector analysis based on auxiliary function technique"
+    See https://ieeexplore.ieee.org/document/6082320
+    Args:
+        demix_filter (n_bins, n_sources, n_channels): updated in place.
+        weighted_covariance (n_sources, n_bins, n_channels, n_channels)
+        stability_check <StabilityCheck>: stability check when computing (WU)^{-1}. If None, StabilityCheck() is used.
+        logdet (n_bins,): log|det W|, updated in place if given.
+            Replacing the n-th row by w_n^H / sqrt(w_n^H U_n w_n) with w_n = (W U_n)^{-1} e_n multiplies det W by sqrt(w_n^H U_n w_n).
+    Returns:
+        demix_filter (n_bins, n_sources, n_channels)
+    """
+    W, U = demix_filter, weighted_covariance
+    n_bins, n_sources, n_channels = W.shape
+
+    if stability_check is None:
+        stability_check = StabilityCheck()
+
+    stability_check.step()
+
+    for source_idx in range(n_sources):
+        # W: (n_bins, n_sources, n_channels), U: (n_sources, n_bins, n_channels, n_channels)
+        w_n_Hermite = W[:,source_idx,:] # (n_bins, n_channels)
+        U_n = U[source_idx] # (n_bins, n_channels, n_channels)
+        WU = W @ U_n # (n_bins, n_sources, n_channels)
+        w_n, condition = stability_check.solve(WU, source_idx)
+        condition = condition[:,np.newaxis] # (n_bins, 1)
+        wUw = w_n[:,np.newaxis,:].conj() @ U_n @ w_n[:,:,np.newaxis]
+        denominator = np.sqrt(wUw[...,0])
+        w_n_Hermite = np.where(condition, w_n.conj() / denominator, w_n_Hermite)
+        # if condition number is too big, `denominator[denominator < eps] = eps` may diverge of cost function.
+        W[:,source_idx,:] = w_n_Hermite
+
+        if logdet is not None:
+            logdet += np.log(np.abs(np.where(condition, denominator, 1)[:,0]))
+
+    return W
+
+def update_by_ip2(demix_filter, weighted_covariance, eps=EPS, logdet=None):
+    """
+    Pairwise iterative projection (IP2) for 2 sources and 2 channels.
+    The generalized eigenvalue problem V_1 u = lambda V_2 u is solved in closed form.
+    Reference: "Fast stereo independent vector analysis and its implementation on mobile phone"
+    See https://ieeexplore.ieee.org/document/6521264
+    Args:
+        demix_filter (n_bins, 2, 2): updated in place.
+        weighted_covariance (2, n_bins, 2, 2)
+        logdet (n_bins,): log|det W|, updated in place if given.
+    Returns:
+        demix_filter (n_bins, 2, 2)
+    """
+    W, U = demix_filter, weighted_covariance
+    n_bins, n_sources, n_channels = W.shape
+
+    if n_sources != 2 or n_channels != 2:
+        raise ValueError("IP2 supports only 2 sources and 2 channels, but given {} sources and {} channels.".format(n_sources, n_channels))
+
+    # Eigenvectors are invariant to scaling of V_1 and V_2, so normalize them to avoid scale-dependent eps.
+    trace = np.real(U[:,:,0,0] + U[:,:,1,1]) # (2, n_bins)
+    trace[trace < eps] = eps
+    V = U / trace[:,:,np.newaxis,np.newaxis]
+    V_1, V_2 = V[0], V[1] # (n_bins, 2, 2)
+
+    # det(V_1 - lambda V_2) = a * lambda^2 + b * lambda + c
+    a = np.real(V_2[:,0,0] * V_2[:,1,1] - V_2[:,0,1] * V_2[:,1,0]) # (n_bins,)
+    b = - np.real(V_1[:,0,0] * V_2[:,1,1] + V_1[:,1,1] * V_2[:,0,0] - V_1[:,0,1] * V_2[:,1,0] - V_1[:,1,0] * V_2[:,0,1]) # (n_bins,)
+    c = np.real(V_1[:,0,0] * V_1[:,1,1] - V_1[:,0,1] * V_1[:,1,0]) # (n_bins,)
+    a[a < eps] = eps
+    discriminant = b**2 - 4 * a * c
+    discriminant[discriminant < 0] = 0
+    # The source with smaller eigenvalue is assigned to the 1st row, which maximizes |det W|.
+    eigenvalues = np.stack([- b - np.sqrt(discriminant), - b + np.sqrt(discriminant)], axis=1) / (2 * a[:,np.newaxis]) # (n_bins, 2)
+
+    for source_idx in range(n_sources):
+        U_n = U[source_idx] # (n_bins, 2, 2)
+        M = V_1 - eigenvalues[:,source_idx,np.newaxis,np.newaxis] * V_2 # (n_bins, 2, 2)
+        # Null vector of singular 2x2 matrix from either row, whichever is more reliable.
+        u_0 = np.stack([M[:,0,1], - M[:,0,0]], axis=1) # (n_bins, 2)
+        u_1 = np.stack([M[:,1,1], - M[:,1,0]], axis=1) # (n_bins, 2)
+        norm_0, norm_1 = np.sum(np.abs(u_0)**2, axis=1), np.sum(np.abs(u_1)**2, axis=1)
+        w_n = np.where((norm_0 >= norm_1)[:,np.newaxis], u_0, u_1) # (n_bins, 2)
+        wUw = np.real(w_n[:,np.newaxis,:].conj() @ U_n @ w_n[:,:,np.newaxis])[:,0,0] # (n_bins,)
+        wUw[wUw < eps] = eps
+        W[:,source_idx,:] = w_n.conj() / np.sqrt(wUw[:,np.newaxis])
+
+    if logdet is not None:
+        logdet[:] = np.log(np.abs(W[:,0,0] * W[:,1,1] - W[:,0,1] * W[:,1,0]))
+
+    return W
+
+def update_by_iss(demix_filter, estimation, weight, eps=EPS, logdet=None):
+    """
+    Iterative source steering (ISS), which does not need any matrix inversion.
+    Reference: "Fast and stable blind source separation with rank-1 updates"
+    See https://ieeexplore.ieee.org/document/9053556
+    Args:
+        demix_filter (n_bins, n_sources, n_channels): updated in place.
+        estimation (n_sources, n_bins, n_frames): updated in place.
+        weight (n_sources, n_bins, n_frames): broadcastable, e.g. (n_sources, 1, n_frames).
+        logdet (n_bins,): log|det W|, updated in place if given. W is multiplied by (I - v e_n^T), whose determinant is 1 - v_n.
+    Returns:
+        demix_filter (n_bins, n_sources, n_channels)
+        estimation (n_sources, n_bins, n_frames)
+    """
+    W, Y = demix_filter, estimation
+    n_sources, n_bins, n_frames = Y.shape
+
+    for source_idx in range(n_sources):
+        Y_n = Y[source_idx] # (n_bins, n_frames)
+        numerator = np.sum(weight * Y * Y_n.conj(), axis=2) # (n_sources, n_bins)
+        denominator = np.sum(weight * np.abs(Y_n)**2, axis=2) # (n_sources, n_bins)
+        denominator[denominator < eps] = eps
+        v = numerator / denominator # (n_sources, n_bins)
+        v[source_idx] = 1 - 1 / np.sqrt(denominator[source_idx] / n_frames)
+
+        Y -= v[:,:,np.newaxis] * Y_n
+        W -= v.transpose(1,0)[:,:,np.newaxis] * W[:,source_idx,np.newaxis,:]
+
+        if logdet is not None:
+            logdet += np.log(np.abs(1 - v[source_idx]))
+
+    return W, Y
+
+def update_by_iss_covariance(demix_filter, weighted_covariance, eps=EPS, logdet=None):
+    """
+    Iterative source steering (ISS) given weighted covariances instead of the separated signals.
+    Statistics of ISS are quadratic forms of U, i.e. 1/n_frames * sum_{t} weight_{mt} y_{mt} y_{nt}^* = w_m^H U_m w_n,
+    so ISS is also available when only (e.g. exponentially averaged) covariances are kept.
+    Args:
+        demix_filter (n_bins, n_sources, n_channels): updated in place.
+        weighted_covariance (n_sources, n_bins, n_channels, n_channels)
+        logdet (n_bins,): log|det W|, updated in place if given.
+    Returns:
+        demix_filter (n_bins, n_sources, n_channels)
+    """
+    W, U = demix_filter, weighted_covariance
+    n_bins, n_sources, n_channels = W.shape
+
+    for source_idx in range(n_sources):
+        w_n = W[:,source_idx,:].conj() # (n_bins, n_channels)
+        Uw_n = U @ w_n[:,:,np.newaxis] # (n_sources, n_bins, n_channels, 1)
+        numerator = np.sum(W * Uw_n[...,0].transpose(1,0,2), axis=2).transpose(1,0) # (n_sources, n_bins)
+        denominator = np.real(np.sum(w_n.conj() * Uw_n[...,0], axis=2)) # (n_sources, n_bins)
+        denominator[denominator < eps] = eps
+        v = numerator / denominator # (n_sources, n_bins)
+        v[source_idx] = 1 - 1 / np.sqrt(denominator[source_idx])
+
+        W -= v.transpose(1,0)[:,:,np.newaxis] * W[:,source_idx,np.newaxis,:]
+
+        if logdet is not None:
+            logdet += np.log(np.abs(1 - v[source_idx]))
+
+    return W
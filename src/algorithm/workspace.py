@@ -0,0 +1,36 @@
+import numpy as np
+
+class Workspace:
+    """
+    Named buffers which are reused across iterations.
+    A buffer is allocated at the first request of its name, and the same array is returned while its shape and dtype are unchanged,
+    so kernels writing into buffers by `out=` allocate nothing after the first iteration.
+    Contents of a buffer are overwritten by the next kernel which requests the same name.
+    """
+    def __init__(self):
+        self.buffers = {}
+
+    def __call__(self, name, shape, dtype):
+        """
+        Args:
+            name <str>: name of buffer.
+            shape <tuple<int>>
+            dtype: dtype of buffer.
+        Returns:
+            buffer <np.ndarray>: uninitialized array of (*shape).
+        """
+        shape = tuple(shape)
+        buffer = self.buffers.get(name)
+
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buffer
+
+        return buffer
+
+    @property
+    def nbytes(self):
+        return sum([buffer.nbytes for buffer in self.buffers.values()])
+
+    def clear(self):
+        self.buffers = {}
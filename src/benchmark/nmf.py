@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of BetaNMF against EUCNMF, KLNMF, and ISNMF on the power spectrogram of a synthetic source.
+BetaNMF with beta=2, 1, and 0 has to reproduce the factors of the corresponding class.
+BatchBetaNMF of segments of the spectrogram is compared with BetaNMF of each segment in a loop.
+Usage: cd src; python -m benchmark.nmf
+"""
+
+import argparse
+import time
+import tracemalloc
+import numpy as np
+
+from algorithm.stft import stft
+from algorithm.nmf import EUCNMF, KLNMF, ISNMF, BetaNMF, BatchBetaNMF
+from benchmark.synthetic import generate_source
+
+parser = argparse.ArgumentParser(description="Benchmark of BetaNMF against EUCNMF, KLNMF, and ISNMF")
+
+parser.add_argument('--duration', type=float, default=60, help='Duration of source [s].')
+parser.add_argument('--fft_size', type=int, default=2048, help='FFT size.')
+parser.add_argument('--hop_size', type=int, default=512, help='Hop size.')
+parser.add_argument('--n_bases', type=int, default=16, help='Number of bases.')
+parser.add_argument('--iteration', type=int, default=50, help='Number of iterations.')
+parser.add_argument('--beta', type=float, nargs='*', default=[0.5, 1.5, 3], help='Other values of beta benchmarked only by BetaNMF.')
+parser.add_argument('--batch_size', type=int, default=32, help='Number of segments of spectrogram factorized by BatchBetaNMF.')
+parser.add_argument('--tolerance', type=float, default=1e-6, help='Tolerance of relative difference of factors from the reference class.')
+parser.add_argument('--seed', type=int, default=111, help='Random seed.')
+
+def benchmark_nmf(nmf, target, iteration=50, seed=111):
+    """
+    Args:
+        nmf <NMFbase>
+        target (n_bins, n_frames)
+    Returns:
+        result <dict>: seconds per iteration, final loss, and peak bytes allocated by an iteration.
+    """
+    np.random.seed(seed)
+
+    start = time.perf_counter()
+    nmf.update(target, iteration=iteration)
+    elapsed = time.perf_counter() - start
+
+    # Allocation of a steady-state iteration.
+    tracemalloc.start()
+    nmf.update_once()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'seconds_per_iteration': elapsed / iteration,
+        'loss': float(nmf.loss[iteration - 1]),
+        'bytes': peak
+    }
+
+    return result
+
+def benchmark_batch_nmf(target, n_bases=16, beta=1, iteration=50, seed=111):
+    """
+    Args:
+        target (batch_size, n_bins, n_frames)
+    Returns:
+        result <dict>: seconds per iteration of BatchBetaNMF and of BetaNMF in a loop, and relative difference of factors.
+    """
+    batch_size, n_bins, n_frames = target.shape
+
+    np.random.seed(seed)
+    base = np.random.rand(batch_size, n_bins, n_bases)
+    activation = np.random.rand(batch_size, n_bases, n_frames)
+
+    nmf = BatchBetaNMF(n_bases=n_bases, beta=beta)
+    nmf.update(target, iteration=0)
+    nmf.base, nmf.activation = base.copy(), activation.copy()
+
+    start = time.perf_counter()
+    for idx in range(iteration):
+        nmf.update_once()
+        nmf.loss.append(nmf.compute_loss(nmf.target, nmf.reconstruct()))
+    batch_elapsed = time.perf_counter() - start
+
+    references = []
+
+    for batch_idx in range(batch_size):
+        reference = BetaNMF(n_bases=n_bases, beta=beta)
+        reference.update(target[batch_idx], iteration=0)
+        reference.base, reference.activation = base[batch_idx].copy(), activation[batch_idx].copy()
+        references.append(reference)
+
+    start = time.perf_counter()
+    for reference in references:
+        for idx in range(iteration):
+            reference.update_once()
+            reference.loss.append(reference.criterion(reference.reconstruct(), reference.target).sum())
+    loop_elapsed = time.perf_counter() - start
+
+    difference = max([
+        max(relative_difference(nmf.base[batch_idx], reference.base), relative_difference(nmf.activation[batch_idx], reference.activation)) for batch_idx, reference in enumerate(references)
+    ])
+
+    result = {
+        'batch_seconds_per_iteration': batch_elapsed / iteration,
+        'loop_seconds_per_iteration': loop_elapsed / iteration,
+        'difference': difference
+    }
+
+    return result
+
+def relative_difference(input, reference):
+    return float(np.abs(input - reference).max() / np.abs(reference).max())
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    sr = 16000
+
+    source = generate_source(int(args.duration * sr), sr=sr, rng=rng)
+    target = np.abs(stft(source, fft_size=args.fft_size, hop_size=args.hop_size))**2
+
+    print("target: {} x {}".format(*target.shape))
+    print("{:>8} {:>6} {:>10} {:>10} {:>14} {:>10} {:>8}".format('method', 'beta', 'ms/iter', 'MB/iter', 'loss', 'diff', 'status'))
+
+    n_failures = 0
+
+    for cls, beta in [(EUCNMF, 2), (KLNMF, 1), (ISNMF, 0)]:
+        reference = cls(n_bases=args.n_bases)
+        result = benchmark_nmf(reference, target, iteration=args.iteration, seed=args.seed)
+        print("{:>8} {:>6} {:>10.2f} {:>10.2f} {:>14.6e} {:>10} {:>8}".format(cls.__name__, beta, 1000 * result['seconds_per_iteration'], result['bytes'] / 2**20, result['loss'], '-', 'ref'))
+
+        nmf = BetaNMF(n_bases=args.n_bases, beta=beta)
+        result = benchmark_nmf(nmf, target, iteration=args.iteration, seed=args.seed)
+        difference = max(relative_difference(nmf.base, reference.base), relative_difference(nmf.activation, reference.activation))
+
+        if difference > args.tolerance:
+            status = 'FAIL'
+            n_failures += 1
+        else:
+            status = 'ok'
+
+        print("{:>8} {:>6} {:>10.2f} {:>10.2f} {:>14.6e} {:>10.2e} {:>8}".format('BetaNMF', beta, 1000 * result['seconds_per_iteration'], result['bytes'] / 2**20, result['loss'], difference, status))
+
+    for beta in args.beta:
+        nmf = BetaNMF(n_bases=args.n_bases, beta=beta)
+        result = benchmark_nmf(nmf, target, iteration=args.iteration, seed=args.seed)
+        print("{:>8} {:>6} {:>10.2f} {:>10.2f} {:>14.6e} {:>10} {:>8}".format('BetaNMF', beta, 1000 * result['seconds_per_iteration'], result['bytes'] / 2**20, result['loss'], '-', '-'))
+
+    n_frames = target.shape[1] // args.batch_size
+    batch_target = target[:,:args.batch_size*n_frames].reshape(target.shape[0], args.batch_size, n_frames).transpose(1,0,2)
+    batch_target = np.ascontiguousarray(batch_target)
+
+    print("batch: {} x {} x {}".format(*batch_target.shape))
+    print("{:>6} {:>14} {:>14} {:>10} {:>8}".format('beta', 'batch ms/iter', 'loop ms/iter', 'diff', 'status'))
+
+    for beta in [2, 1, 0] + args.beta:
+        result = benchmark_batch_nmf(batch_target, n_bases=args.n_bases, beta=beta, iteration=args.iteration, seed=args.seed)
+
+        if result['difference'] > args.tolerance:
+            status = 'FAIL'
+            n_failures += 1
+        else:
+            status = 'ok'
+
+        print("{:>6} {:>14.2f} {:>14.2f} {:>10.2e} {:>8}".format(beta, 1000 * result['batch_seconds_per_iteration'], 1000 * result['loop_seconds_per_iteration'], result['difference'], status))
+
+    if n_failures > 0:
+        raise SystemExit("{} cases differ from the references by more than {}.".format(n_failures, args.tolerance))
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    print(args)
+    main(args)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Regression benchmark of single precision (complex64) against double precision (complex128).
+Usage: cd src; python -m benchmark.precision
+"""
+
+import argparse
+import time
+import numpy as np
+
+from algorithm.stft import stft, istft
+from criterion.sdr import permutation_invariant_sisdr
+from bss.iva import AuxLaplaceIVA
+from bss.ilrma import GaussILRMA, tILRMA
+from bss.fdica import NaturalGradLaplaceFDICA
+from benchmark.synthetic import generate_mixture
+
+__methods__ = ['AuxLaplaceIVA', 'GaussILRMA', 'tILRMA', 'NaturalGradLaplaceFDICA']
+
+parser = argparse.ArgumentParser(description="Regression benchmark of single precision against double precision")
+
+parser.add_argument('--n_sources', type=int, default=2, help='Number of sources (= number of channels).')
+parser.add_argument('--duration', type=float, default=10, help='Duration of mixture [s].')
+parser.add_argument('--fft_size', type=int, default=2048, help='FFT size.')
+parser.add_argument('--hop_size', type=int, default=1024, help='Hop size.')
+parser.add_argument('--iteration', type=int, default=50, help='Number of iterations.')
+parser.add_argument('--update_rule', type=str, default='IP', choices=['IP', 'IP2', 'ISS'], help='Update rule of AuxIVA and Gauss-ILRMA.')
+parser.add_argument('--accumulate_double', action='store_true', help='Accumulate weighted covariances in double precision.')
+parser.add_argument('--tolerance', type=float, default=0.5, help='Tolerance of SI-SDR degradation [dB].')
+parser.add_argument('--seed', type=int, default=111, help='Random seed.')
+
+def build_separator(method, update_rule='IP', reference_id=0):
+    if method == 'AuxLaplaceIVA':
+        separator = AuxLaplaceIVA(update_rule=update_rule, reference_id=reference_id)
+    elif method == 'GaussILRMA':
+        separator = GaussILRMA(n_bases=4, update_rule=update_rule, reference_id=reference_id)
+    elif method == 'tILRMA':
+        separator = tILRMA(n_bases=4, reference_id=reference_id)
+    elif method == 'NaturalGradLaplaceFDICA':
+        separator = NaturalGradLaplaceFDICA(reference_id=reference_id)
+    else:
+        raise ValueError("Not support method {}".format(method))
+
+    return separator
+
+def benchmark_precision(method, dtype, mixture, image, fft_size=2048, hop_size=1024, iteration=50, update_rule='IP', accumulate_double=False, reference_id=0, seed=111):
+    """
+    Args:
+        method <str>: one of __methods__.
+        dtype: np.complex64 or np.complex128.
+        mixture (n_channels, n_samples)
+        image (n_sources, n_channels, n_samples)
+    Returns:
+        result <dict>: seconds per iteration, SI-SDR [dB], and bytes of demixing filters and input.
+    """
+    np.random.seed(seed)
+
+    n_channels, n_samples = mixture.shape
+    X = stft(mixture, fft_size=fft_size, hop_size=hop_size).astype(dtype)
+
+    separator = build_separator(method, update_rule=update_rule, reference_id=reference_id)
+
+    kwargs = {'dtype': dtype}
+
+    if accumulate_double and hasattr(separator, 'accumulate_double'):
+        kwargs['accumulate_double'] = True
+
+    start = time.perf_counter()
+    Y = separator(X, iteration=iteration, **kwargs)
+    elapsed = time.perf_counter() - start
+
+    y = istft(Y.astype(np.complex128), fft_size=fft_size, hop_size=hop_size, length=n_samples)
+    sdr, _ = permutation_invariant_sisdr(y, image[:,reference_id])
+
+    result = {
+        'method': method,
+        'dtype': np.dtype(dtype).name,
+        'seconds_per_iteration': elapsed / iteration,
+        'sisdr': float(sdr.mean()),
+        'output_dtype': Y.dtype.name,
+        'bytes': int(separator.input.nbytes + separator.demix_filter.nbytes)
+    }
+
+    return result
+
+def main(args):
+    mixture, image = generate_mixture(n_sources=args.n_sources, duration=args.duration, seed=args.seed)
+
+    print("{:>24} {:>10} {:>10} {:>10} {:>10} {:>8}".format('method', 'dtype', 'ms/iter', 'SI-SDR', 'MB', 'status'))
+
+    n_failures = 0
+
+    for method in __methods__:
+        reference = None
+
+        for dtype in [np.complex128, np.complex64]:
+            result = benchmark_precision(method, dtype, mixture, image, fft_size=args.fft_size, hop_size=args.hop_size, iteration=args.iteration, update_rule=args.update_rule, accumulate_double=args.accumulate_double, seed=args.seed)
+
+            if reference is None:
+                reference = result
+                status = 'ref'
+            elif result['output_dtype'] != result['dtype'] or reference['sisdr'] - result['sisdr'] > args.tolerance:
+                status = 'FAIL'
+                n_failures += 1
+            else:
+                status = 'ok'
+
+            print("{:>24} {:>10} {:>10.2f} {:>10.2f} {:>10.2f} {:>8}".format(method, result['dtype'], 1000 * result['seconds_per_iteration'], result['sisdr'], result['bytes'] / 2**20, status))
+
+    if n_failures > 0:
+        raise SystemExit("{} methods degrade by more than {} dB in single precision.".format(n_failures, args.tolerance))
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    print(args)
+    main(args)
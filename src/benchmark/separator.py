@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of throughput, latency, and memory of separators on synthetic convolutive mixtures (no download is required).
+Every case runs in a fresh process, so that peak RSS is not affected by other cases.
+Usage: cd src; python -m benchmark.separator --out benchmark.json
+       cd src; python -m benchmark.separator --out benchmark-new.json --compare benchmark.json
+"""
+
+import argparse
+import os
+import sys
+import json
+import time
+import platform
+import itertools
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from bss.runner import blas_threads_environment
+
+__separators__ = [
+    'AuxLaplaceIVA', 'GradLaplaceIVA', 'NaturalGradLaplaceIVA',
+    'GaussILRMA', 'GaussILRMA-partitioning', 'tILRMA', 'ConsistentGaussILRMA',
+    'GradLaplaceFDICA', 'NaturalGradLaplaceFDICA'
+]
+__nmfs__ = ['EUCNMF', 'KLNMF', 'ISNMF']
+__beamformers__ = ['DSBF', 'MVDR']
+__methods__ = __separators__ + __nmfs__ + __beamformers__
+# Methods whose cost depends on the number of bases.
+__low_rank_methods__ = ['GaussILRMA', 'GaussILRMA-partitioning', 'tILRMA', 'ConsistentGaussILRMA'] + __nmfs__
+
+parser = argparse.ArgumentParser(description="Benchmark of throughput, latency, and memory of separators")
+
+parser.add_argument('--methods', type=str, nargs='+', default=__methods__, choices=__methods__, help='Methods to benchmark.')
+parser.add_argument('--n_sources', type=int, nargs='+', default=[2], help='Numbers of sources (= number of channels) to sweep.')
+parser.add_argument('--fft_size', type=int, nargs='+', default=[2048], help='FFT sizes to sweep. Hop size is fft_size // 2.')
+parser.add_argument('--duration', type=float, nargs='+', default=[10], help='Durations of mixture [s] to sweep.')
+parser.add_argument('--n_bases', type=int, nargs='+', default=[4], help='Numbers of bases of ILRMA and NMF to sweep.')
+parser.add_argument('--iteration', type=int, default=20, help='Number of iterations.')
+parser.add_argument('--repeat', type=int, default=1, help='Number of runs of each case. The fastest one is reported.')
+parser.add_argument('--n_threads', type=int, default=1, help='Number of BLAS threads.')
+parser.add_argument('--out', type=str, default=None, help='Path of JSON file to save results.')
+parser.add_argument('--compare', type=str, default=None, help='Path of JSON file of previous results to detect regressions.')
+parser.add_argument('--tolerance', type=float, default=0.2, help='Tolerance of relative slowdown of seconds per iteration.')
+parser.add_argument('--seed', type=int, default=111, help='Random seed.')
+
+def build_cases(methods, n_sources=[2], fft_size=[2048], duration=[10], n_bases=[4]):
+    """
+    Args:
+        methods <list<str>>: subset of __methods__.
+    Returns:
+        cases <list<dict>>: grid of methods and conditions. Methods which do not depend on the number of bases are not swept by n_bases.
+    """
+    cases = []
+
+    for method in methods:
+        _n_bases = n_bases if method in __low_rank_methods__ else [None]
+
+        for _n_sources, _fft_size, _duration, __n_bases in itertools.product(n_sources, fft_size, duration, _n_bases):
+            case = {
+                'method': method,
+                'n_sources': _n_sources,
+                'fft_size': _fft_size,
+                'duration': _duration,
+                'n_bases': __n_bases
+            }
+            cases.append(case)
+
+    return cases
+
+def case_key(case):
+    return (case['method'], case['n_sources'], case['fft_size'], case['duration'], case['n_bases'])
+
+def build_separator(method, n_bases=4, fft_size=2048, hop_size=1024, reference_id=0, steering_vector=None):
+    from bss.iva import AuxLaplaceIVA, GradLaplaceIVA, NaturalGradLaplaceIVA
+    from bss.ilrma import GaussILRMA, tILRMA, ConsistentGaussILRMA
+    from bss.fdica import GradLaplaceFDICA, NaturalGradLaplaceFDICA
+    from bss.beamform import DelaySumBeamformer, MVDRBeamformer
+    from algorithm.nmf import EUCNMF, KLNMF, ISNMF
+
+    if method == 'AuxLaplaceIVA':
+        separator = AuxLaplaceIVA(reference_id=reference_id)
+    elif method == 'GradLaplaceIVA':
+        separator = GradLaplaceIVA(reference_id=reference_id)
+    elif method == 'NaturalGradLaplaceIVA':
+        separator = NaturalGradLaplaceIVA(reference_id=reference_id)
+    elif method == 'GaussILRMA':
+        separator = GaussILRMA(n_bases=n_bases, reference_id=reference_id)
+    elif method == 'GaussILRMA-partitioning':
+        separator = GaussILRMA(n_bases=n_bases, partitioning=True, reference_id=reference_id)
+    elif method == 'tILRMA':
+        separator = tILRMA(n_bases=n_bases, reference_id=reference_id)
+    elif method == 'ConsistentGaussILRMA':
+        separator = ConsistentGaussILRMA(n_bases=n_bases, reference_id=reference_id, fft_size=fft_size, hop_size=hop_size)
+    elif method == 'GradLaplaceFDICA':
+        separator = GradLaplaceFDICA(reference_id=reference_id)
+    elif method == 'NaturalGradLaplaceFDICA':
+        separator = NaturalGradLaplaceFDICA(reference_id=reference_id)
+    elif method == 'EUCNMF':
+        separator = EUCNMF(n_bases=n_bases)
+    elif method == 'KLNMF':
+        separator = KLNMF(n_bases=n_bases)
+    elif method == 'ISNMF':
+        separator = ISNMF(n_bases=n_bases)
+    elif method == 'DSBF':
+        separator = DelaySumBeamformer(steering_vector=steering_vector, reference_id=reference_id)
+    elif method == 'MVDR':
+        separator = MVDRBeamformer(steering_vector=steering_vector, reference_id=reference_id)
+    else:
+        raise ValueError("Not support method {}".format(method))
+
+    return separator
+
+def estimate_steering_vector(image, fft_size=2048, hop_size=1024):
+    """
+    Oracle steering vectors given by principal eigenvectors of spatial covariances of source images.
+    Args:
+        image (n_sources, n_channels, n_samples)
+    Returns:
+        steering_vector (n_bins, n_channels, n_sources)
+    """
+    from algorithm.stft import stft
+
+    Z = stft(image, fft_size=fft_size, hop_size=hop_size) # (n_sources, n_channels, n_bins, n_frames)
+    Z = Z.transpose(0,2,1,3) # (n_sources, n_bins, n_channels, n_frames)
+    covariance = Z @ Z.transpose(0,1,3,2).conj() # (n_sources, n_bins, n_channels, n_channels)
+    _, eigvec = np.linalg.eigh(covariance)
+    steering_vector = eigvec[...,-1] # (n_sources, n_bins, n_channels)
+
+    return steering_vector.transpose(1,2,0)
+
+def peak_rss():
+    """
+    Returns:
+        peak_rss <int>: peak resident set size of this process in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS, and in kilobytes on Linux.
+    if sys.platform == 'darwin':
+        return peak
+
+    return 1024 * peak
+
+def benchmark_case(case, iteration=20, repeat=1, reference_id=0, seed=111):
+    """
+    Args:
+        case <dict>: see build_cases.
+    Returns:
+        result <dict>: case with seconds per iteration, real-time factor, SI-SDR [dB] (if applicable), and peak RSS in bytes.
+            `peak_rss_increase` is the increase of peak RSS during separation, which is a lower bound of memory used by separation.
+    """
+    from algorithm.stft import stft, istft
+    from criterion.sdr import permutation_invariant_sisdr
+    from benchmark.synthetic import generate_mixture
+
+    method, n_sources, fft_size, duration, n_bases = case_key(case)
+    hop_size = fft_size // 2
+
+    mixture, image = generate_mixture(n_sources=n_sources, duration=duration, seed=seed)
+    n_channels, n_samples = mixture.shape
+    X = stft(mixture, fft_size=fft_size, hop_size=hop_size)
+
+    steering_vector = None
+
+    if method in __beamformers__:
+        steering_vector = estimate_steering_vector(image, fft_size=fft_size, hop_size=hop_size)
+    if method in __nmfs__:
+        X = np.abs(X[reference_id])**2
+
+    n_iterations = 1 if method in __beamformers__ else iteration
+    elapsed = float('inf')
+    peak_rss_before = peak_rss()
+
+    for _ in range(repeat):
+        np.random.seed(seed)
+        separator = build_separator(method, n_bases=n_bases, fft_size=fft_size, hop_size=hop_size, reference_id=reference_id, steering_vector=steering_vector)
+
+        start = time.perf_counter()
+
+        if method in __nmfs__:
+            separator.update(X, iteration=n_iterations)
+            Y = None
+        elif method in __beamformers__:
+            Y = separator(X)
+        else:
+            Y = separator(X, iteration=n_iterations)
+
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    result = dict(case)
+    result.update({
+        'n_channels': n_channels,
+        'n_bins': fft_size // 2 + 1,
+        'n_frames': X.shape[-1],
+        'iteration': n_iterations,
+        'seconds': elapsed,
+        'seconds_per_iteration': elapsed / n_iterations,
+        'rtf': elapsed / duration,
+        'sisdr': None,
+        'peak_rss': peak_rss(),
+        'peak_rss_increase': peak_rss() - peak_rss_before
+    })
+
+    if Y is not None:
+        y = istft(Y, fft_size=fft_size, hop_size=hop_size, length=n_samples)
+        sdr, _ = permutation_invariant_sisdr(y, image[:,reference_id])
+        result['sisdr'] = float(sdr.mean())
+
+    return result
+
+def run(cases, iteration=20, repeat=1, n_threads=1, seed=111):
+    """
+    Args:
+        cases <list<dict>>: see build_cases.
+    Returns:
+        results <list<dict>>: see benchmark_case. Failed cases have 'error' instead of measurements.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = []
+
+    for case in cases:
+        # A fresh process per case isolates peak RSS.
+        with blas_threads_environment(n_threads), ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            future = executor.submit(benchmark_case, case, iteration=iteration, repeat=repeat, seed=seed)
+
+            try:
+                result = future.result()
+            except Exception as e:
+                result = dict(case)
+                result['error'] = repr(e)
+
+        results.append(result)
+        print_result(result)
+
+    return results
+
+def compare(results, references, tolerance=0.2):
+    """
+    Args:
+        results <list<dict>>: current results.
+        references <list<dict>>: previous results.
+        tolerance <float>: tolerance of relative slowdown of seconds per iteration.
+    Returns:
+        regressions <list<dict>>: cases slower than references by more than tolerance, with 'ratio' of seconds per iteration.
+    """
+    references = {case_key(reference): reference for reference in references if 'error' not in reference}
+    regressions = []
+
+    for result in results:
+        reference = references.get(case_key(result))
+
+        if reference is None or 'error' in result:
+            continue
+
+        ratio = result['seconds_per_iteration'] / reference['seconds_per_iteration']
+
+        if ratio > 1 + tolerance:
+            regression = dict(result)
+            regression['ratio'] = ratio
+            regressions.append(regression)
+
+    return regressions
+
+def collect_environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+def print_header():
+    print("{:>24} {:>3} {:>5} {:>6} {:>5} {:>10} {:>8} {:>8} {:>9}".format('method', 'C', 'F', 'T', 'K', 'ms/iter', 'RTF', 'SI-SDR', 'RSS [MB]'), flush=True)
+
+def print_result(result):
+    n_bases = '-' if result['n_bases'] is None else result['n_bases']
+
+    if 'error' in result:
+        print("{:>24} {:>3} {:>5} {:>6} {:>5} {}".format(result['method'], result['n_sources'], result['fft_size'], result['duration'], n_bases, result['error']), flush=True)
+        return
+
+    sisdr = '-' if result['sisdr'] is None else "{:.2f}".format(result['sisdr'])
+    print("{:>24} {:>3} {:>5} {:>6} {:>5} {:>10.2f} {:>8.4f} {:>8} {:>9.1f}".format(result['method'], result['n_sources'], result['n_bins'], result['n_frames'], n_bases, 1000 * result['seconds_per_iteration'], result['rtf'], sisdr, result['peak_rss'] / 2**20), flush=True)
+
+def main(args):
+    cases = build_cases(args.methods, n_sources=args.n_sources, fft_size=args.fft_size, duration=args.duration, n_bases=args.n_bases)
+
+    print_header()
+    results = run(cases, iteration=args.iteration, repeat=args.repeat, n_threads=args.n_threads, seed=args.seed)
+
+    if args.out is not None:
+        config = {key: value for key, value in vars(args).items() if key not in ['out', 'compare']}
+        output = {'environment': collect_environment(), 'config': config, 'results': results}
+
+        with open(args.out, 'w') as f:
+            json.dump(output, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            references = json.load(f)['results']
+
+        regressions = compare(results, references, tolerance=args.tolerance)
+
+        for regression in regressions:
+            print("Regression: {} (C={}, fft_size={}, duration={}, n_bases={}) is {:.2f} times slower.".format(regression['method'], regression['n_sources'], regression['fft_size'], regression['duration'], regression['n_bases'], regression['ratio']))
+
+        if len(regressions) > 0:
+            raise SystemExit("{} cases are slower than {} by more than {:.0f}%.".format(len(regressions), args.compare, 100 * args.tolerance))
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    print(args)
+    main(args)
@@ -0,0 +1,79 @@
+import numpy as np
+from scipy import signal as ss
+
+def generate_rir(n_samples, sr=16000, reverb=0.16, delay=0, rng=None):
+    """
+    Random room impulse response: direct path followed by exponentially decaying noise.
+    Args:
+        n_samples <int>: length of room impulse response.
+        reverb <float>: reverberation time (T60) [s].
+        delay <int>: delay of direct path in samples.
+    Returns:
+        rir (n_samples,)
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    t = np.arange(n_samples) / sr
+    decay = np.exp(- 3 * np.log(10) * t / reverb)
+    rir = 0.3 * rng.standard_normal(n_samples) * decay
+    rir[:delay] = 0
+    rir[delay] = 1
+
+    return rir
+
+def generate_source(n_samples, sr=16000, rng=None):
+    """
+    Speech-like source: nonstationary, super-Gaussian coloured noise.
+    Args:
+        n_samples <int>
+    Returns:
+        source (n_samples,)
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    excitation = rng.laplace(size=n_samples)
+    a = [1, - rng.uniform(0.5, 0.95)]
+    source = ss.lfilter([1], a, excitation)
+
+    n_segments = max(n_samples // (sr // 8), 1)
+    envelope = rng.uniform(0, 1, size=n_segments)**2
+    envelope = np.interp(np.arange(n_samples), np.linspace(0, n_samples - 1, n_segments), envelope)
+    source = source * envelope
+    source = source / np.abs(source).max()
+
+    return source
+
+def generate_mixture(n_sources=2, n_channels=None, duration=5.0, sr=16000, reverb=0.16, rir_duration=0.1, seed=None):
+    """
+    Synthetic convolutive mixture with random room impulse responses.
+    Args:
+        n_sources <int>
+        n_channels <int>: if None, n_channels = n_sources.
+        duration <float>: duration of mixture [s].
+        reverb <float>: reverberation time (T60) [s].
+        rir_duration <float>: length of room impulse responses [s].
+    Returns:
+        mixture (n_channels, n_samples)
+        image (n_sources, n_channels, n_samples): spatial images of sources.
+    """
+    if n_channels is None:
+        n_channels = n_sources
+
+    rng = np.random.default_rng(seed)
+    n_samples = int(duration * sr)
+    rir_samples = int(rir_duration * sr)
+
+    image = np.zeros((n_sources, n_channels, n_samples))
+
+    for source_idx in range(n_sources):
+        source = generate_source(n_samples, sr=sr, rng=rng)
+        for channel_idx in range(n_channels):
+            delay = rng.integers(0, 16)
+            rir = generate_rir(rir_samples, sr=sr, reverb=reverb, delay=delay, rng=rng)
+            image[source_idx, channel_idx] = ss.fftconvolve(source, rir)[:n_samples]
+
+    mixture = image.sum(axis=0)
+
+    return mixture, image
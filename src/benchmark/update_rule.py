@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of update rules of demixing filters (IP, IP2, ISS).
+Usage: cd src; python -m benchmark.update_rule
+"""
+
+import argparse
+import time
+import numpy as np
+
+from algorithm.stft import stft, istft
+from criterion.sdr import permutation_invariant_sisdr
+from bss.iva import AuxLaplaceIVA
+from bss.ilrma import GaussILRMA
+from benchmark.synthetic import generate_mixture
+
+parser = argparse.ArgumentParser(description="Benchmark of update rules (IP, IP2, ISS)")
+
+parser.add_argument('--n_sources', type=int, default=2, help='Number of sources (= number of channels).')
+parser.add_argument('--duration', type=float, default=10, help='Duration of mixture [s].')
+parser.add_argument('--fft_size', type=int, default=2048, help='FFT size.')
+parser.add_argument('--hop_size', type=int, default=1024, help='Hop size.')
+parser.add_argument('--iteration', type=int, default=50, help='Number of iterations.')
+parser.add_argument('--seed', type=int, default=111, help='Random seed.')
+
+def benchmark_update_rule(method, update_rule, mixture, image, fft_size=2048, hop_size=1024, iteration=50, reference_id=0, seed=111):
+    """
+    Args:
+        method <str>: 'AuxLaplaceIVA' or 'GaussILRMA'.
+        update_rule <str>: 'IP', 'IP2', or 'ISS'.
+        mixture (n_channels, n_samples)
+        image (n_sources, n_channels, n_samples)
+    Returns:
+        result <dict>: seconds per iteration and SI-SDR [dB].
+    """
+    np.random.seed(seed)
+
+    n_channels, n_samples = mixture.shape
+    X = stft(mixture, fft_size=fft_size, hop_size=hop_size)
+
+    if method == 'AuxLaplaceIVA':
+        separator = AuxLaplaceIVA(update_rule=update_rule, reference_id=reference_id)
+    elif method == 'GaussILRMA':
+        separator = GaussILRMA(n_bases=4, update_rule=update_rule, reference_id=reference_id)
+    else:
+        raise ValueError("Not support method {}".format(method))
+
+    start = time.perf_counter()
+    Y = separator(X, iteration=iteration)
+    elapsed = time.perf_counter() - start
+
+    y = istft(Y, fft_size=fft_size, hop_size=hop_size, length=n_samples)
+    sdr, _ = permutation_invariant_sisdr(y, image[:,reference_id])
+
+    result = {
+        'method': method,
+        'update_rule': update_rule,
+        'seconds_per_iteration': elapsed / iteration,
+        'sisdr': float(sdr.mean())
+    }
+
+    return result
+
+def main(args):
+    mixture, image = generate_mixture(n_sources=args.n_sources, duration=args.duration, seed=args.seed)
+
+    update_rules = ['IP', 'IP2', 'ISS'] if args.n_sources == 2 else ['IP', 'ISS']
+
+    print("{:>14} {:>5} {:>10} {:>10}".format('method', 'rule', 'ms/iter', 'SI-SDR'))
+
+    for method in ['AuxLaplaceIVA', 'GaussILRMA']:
+        for update_rule in update_rules:
+            result = benchmark_update_rule(method, update_rule, mixture, image, fft_size=args.fft_size, hop_size=args.hop_size, iteration=args.iteration, seed=args.seed)
+            print("{:>14} {:>5} {:>10.2f} {:>10.2f}".format(method, update_rule, 1000 * result['seconds_per_iteration'], result['sisdr']))
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    print(args)
+    main(args)
@@ -0,0 +1,108 @@
+import numpy as np
+
+from algorithm.precision import resolve_dtype, adjust_eps
+from algorithm.profiler import profile
+from criterion.stopping import build_stopping
+
+EPS=1e-12
+
+class IterativeBSSbase:
+    """
+    Base of iterative blind source separation (IVA, ILRMA, and FDICA), which runs the loop of iterations.
+    Options below can be given by `__call__(input, key=value)`, which sets them as attributes in `_reset`.
+        stopping: stopping criteria. See criterion.stopping.
+        loss_interval <int>: loss is computed every `loss_interval` iterations (never if 0).
+        exact_loss <bool>: if False, separators which support it compute loss from cached statistics instead of recomputing them.
+        dtype: precision of computation, e.g. np.complex64. If None, precision of input is used. See algorithm.precision.
+        accumulate_double <bool>: if True, weighted covariances are accumulated in double precision.
+        profiler <algorithm.profiler.Profiler>: recorder of wall time of stages. See algorithm.profiler.
+        warm_start <bool>: if True, demixing filters of the previous call are used as initial values instead of identity matrices,
+            provided that their shape matches the input.
+    """
+    def __init__(self, callback=None, eps=EPS):
+        self.callback = callback
+        self.eps = eps
+
+        self.input = None
+        self.loss = []
+
+        self.stopping = None
+        self.loss_interval = 1
+        self.exact_loss = True
+        self.dtype = None
+        self.accumulate_double = False
+        self.profiler = None
+        self.warm_start = False
+        self.demix_filter = None
+
+    def _reset(self, **kwargs):
+        assert self.input is not None, "Specify data!"
+
+        for key in kwargs.keys():
+            setattr(self, key, kwargs[key])
+
+        self.stopping = build_stopping(self.stopping)
+
+        if self.stopping is not None:
+            self.stopping.reset()
+
+        self.complex_dtype, self.real_dtype = resolve_dtype(self.dtype, input_dtype=self.input.dtype)
+        self._eps = adjust_eps(self.eps, self.real_dtype)
+        self.input = self.input.astype(self.complex_dtype, copy=False)
+
+        X = self.input
+
+        n_channels, n_bins, n_frames = X.shape
+        n_sources = n_channels # n_channels == n_sources
+
+        self.n_sources, self.n_channels = n_sources, n_channels
+        self.n_bins, self.n_frames = n_bins, n_frames
+
+        if self.warm_start and self.demix_filter is not None and self.demix_filter.shape == (n_bins, n_sources, n_channels):
+            self.demix_filter = self.demix_filter.astype(self.complex_dtype)
+        else:
+            W = np.eye(n_sources, n_channels, dtype=self.complex_dtype)
+            self.demix_filter = np.tile(W, reps=(n_bins, 1, 1))
+
+        self.estimation = self.separate(X, demix_filter=self.demix_filter)
+
+    def iterate(self, iteration=100):
+        """
+        Run `update_once` up to `iteration` times after `_reset`.
+        Loss is appended to `self.loss` every `loss_interval` iterations including the initial one, `callback(self)` is called
+        after every iteration, and iterations end when the stopping criteria are satisfied.
+        During the callback, `self.estimation` is a copy owned by the callback, so it can be kept as the estimate of the iteration.
+        """
+        if self.loss_interval > 0:
+            self._append_loss()
+
+        for idx in range(iteration):
+            with profile(self.profiler, 'iteration'):
+                self.update_once()
+
+            if self.loss_interval > 0 and (idx + 1) % self.loss_interval == 0:
+                self._append_loss()
+
+            if self.callback is not None:
+                # Estimation may be a buffer of workspace, which the next iteration overwrites in place.
+                estimation = self.estimation
+                self.estimation = estimation.copy()
+                self.callback(self)
+                self.estimation = estimation
+
+            if self.stopping is not None and self.stopping(self):
+                break
+
+    def _append_loss(self):
+        with profile(self.profiler, 'loss'):
+            loss = self.compute_negative_loglikelihood()
+        self.loss.append(loss)
+
+    def update_once(self):
+        raise NotImplementedError("Implement 'update_once' function.")
+
+    def separate(self, input, demix_filter):
+        raise NotImplementedError("Implement 'separate' function.")
+
+    def compute_negative_loglikelihood(self):
+        raise NotImplementedError("Implement 'compute_negative_loglikelihood' function.")
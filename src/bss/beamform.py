@@ -1,5 +1,7 @@
 import numpy as np
 
+from algorithm.precision import resolve_dtype, adjust_eps
+
 EPS=1e-12
 
 def delay_sum_beamform(input, steering_vector, reference_id=0):
@@ -43,30 +45,36 @@ def ml_beamform(input, steering_vector, covariance, reference_id=0, eps=EPS):
 
     return output
 
-def mvdr_beamform(input, steering_vector, reference_id=0, eps=EPS):
+def mvdr_beamform(input, steering_vector, covariance=None, reference_id=0, eps=EPS):
     """
     Args:
         input (n_channels, n_bins, n_frames)
         steering_vector (n_bins, n_channels, n_sources)
+        covariance (n_bins, n_channels, n_channels): if None, spatial covariance of input is used.
     Returns:
         output (n_sources, n_bins, n_frames)
     """
-    X = input.transpose(1,0,2)
-    R = np.mean(X[:,:,np.newaxis,:] * X[:,np.newaxis,:,:].conj(), axis=3) # (n_bins, n_channels, n_channels)
+    if covariance is None:
+        X = input.transpose(1,0,2)
+        R = np.mean(X[:,:,np.newaxis,:] * X[:,np.newaxis,:,:].conj(), axis=3) # (n_bins, n_channels, n_channels)
+    else:
+        R = covariance
     output = ml_beamform(input, steering_vector, covariance=R, reference_id=reference_id, eps=eps)
 
     return output
 
 
 class DelaySumBeamformer:
-    def __init__(self, steering_vector=None, reference_id=0):
+    def __init__(self, steering_vector=None, reference_id=0, dtype=None):
         """
         Args:
             steering_vector (n_bins, n_channels, n_sources)
             reference_id <int>
+            dtype: precision of computation, e.g. np.complex64. If None, precision of input is used. See algorithm.precision.
         """
         self.steering_vector = steering_vector
         self.reference_id = reference_id
+        self.dtype = dtype
     
     def __call__(self, input, steering_vector=None):
         """
@@ -83,21 +91,27 @@ class DelaySumBeamformer:
         elif self.steering_vector is None:
             raise ValueError("Specify steering vector.")
 
-        output = delay_sum_beamform(input, self.steering_vector, reference_id=self.reference_id)
+        complex_dtype, _ = resolve_dtype(self.dtype, input_dtype=input.dtype)
+        input = input.astype(complex_dtype, copy=False)
+        steering_vector = self.steering_vector.astype(complex_dtype, copy=False)
+
+        output = delay_sum_beamform(input, steering_vector, reference_id=self.reference_id)
         self.estimation = output
 
         return output
 
 class MVDRBeamformer:
-    def __init__(self, steering_vector, reference_id=0, eps=EPS):
+    def __init__(self, steering_vector, reference_id=0, eps=EPS, dtype=None):
         """
         Args:
             steering_vector (n_bins, n_channels, n_sources)
             reference_id <int>
+            dtype: precision of computation, e.g. np.complex64. If None, precision of input is used. See algorithm.precision.
         """
         self.steering_vector = steering_vector
         self.reference_id = reference_id
         self.eps = eps
+        self.dtype = dtype
     
     def __call__(self, input, steering_vector=None, covariance=None):
         """
@@ -114,7 +128,15 @@ class MVDRBeamformer:
         elif self.steering_vector is None:
             raise ValueError("Specify steering vector.")
 
-        output = mvdr_beamform(input, self.steering_vector, covariance=covariance, reference_id=self.reference_id, eps=self.eps)
+        complex_dtype, real_dtype = resolve_dtype(self.dtype, input_dtype=input.dtype)
+        input = input.astype(complex_dtype, copy=False)
+        steering_vector = self.steering_vector.astype(complex_dtype, copy=False)
+        eps = adjust_eps(self.eps, real_dtype)
+
+        if covariance is not None:
+            covariance = covariance.astype(complex_dtype, copy=False)
+
+        output = mvdr_beamform(input, steering_vector, covariance=covariance, reference_id=self.reference_id, eps=eps)
         self.estimation = output
 
         return output
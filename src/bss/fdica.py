@@ -1,37 +1,26 @@
 import numpy as np
-import itertools
 
 from algorithm.projection_back import projection_back
+from algorithm.permutation import PermutationSolver, apply_permutation
+from algorithm.profiler import profile
+from bss.base import IterativeBSSbase
 
 EPS=1e-12
 
-class FDICAbase:
-    def __init__(self, callback=None, eps=EPS):
-        self.callback = callback
-        self.eps = eps
-
-        self.input = None
-        self.criterion = None
-        self.loss = []
-
-    def _reset(self, **kwargs):
-        assert self.input is not None, "Specify data!"
-
-        for key in kwargs.keys():
-            setattr(self, key, kwargs[key])
-
-        X = self.input
+class FDICAbase(IterativeBSSbase):
+    def __init__(self, permutation='power', callback=None, eps=EPS):
+        """
+        Args:
+            permutation <str>, <list<str>>, or <PermutationSolver>: criteria of permutation alignment. See algorithm.permutation.PermutationSolver.
+        """
+        super().__init__(callback=callback, eps=eps)
 
-        n_channels, n_bins, n_frames = X.shape
-        n_sources = n_channels # n_channels == n_sources
+        if not isinstance(permutation, PermutationSolver):
+            permutation = PermutationSolver(criteria=permutation, eps=eps)
+        self.permutation_solver = permutation
 
-        self.n_sources, self.n_channels = n_sources, n_channels
-        self.n_bins, self.n_frames = n_bins, n_frames
+        self.criterion = None
 
-        W = np.eye(n_channels, dtype=np.complex128)
-        self.demix_filter = np.tile(W, reps=(n_bins, 1, 1))
-        self.estimation = self.separate(X, demix_filter=W)
-        
     def __call__(self, input, iteration=100, **kwargs):
         """
         Args:
@@ -43,18 +32,9 @@ class FDICAbase:
 
         self._reset(**kwargs)
 
-        loss = self.compute_negative_loglikelihood()
-        self.loss.append(loss)
-
-        for idx in range(iteration):
-            self.update_once()
-            loss = self.compute_negative_loglikelihood()
-            self.loss.append(loss)
-
-            if self.callback is not None:
-                self.callback(self)
+        self.iterate(iteration)
         
-        X, W = input, self.demix_filter
+        X, W = self.input, self.demix_filter
         output = self.separate(X, demix_filter=W)
 
         return output
@@ -77,46 +57,22 @@ class FDICAbase:
         return output
 
     def solve_permutation(self):
-        n_sources, n_bins, n_frames = self.n_sources, self.n_bins, self.n_frames
-        eps = self.eps
-
-        permutations = list(itertools.permutations(range(n_sources)))
-
         W = self.demix_filter # (n_bins, n_sources, n_chennels)
         Y = self.estimation # (n_sources, n_bins, n_frames)
 
-        P = np.abs(Y).transpose(1,0,2) # (n_bins, n_sources, n_frames)
-        norm = np.sqrt(np.sum(P**2, axis=1, keepdims=True))
-        norm[norm < eps] = eps
-        P = P / norm # (n_bins, n_sources, n_frames)
-        correlation = np.sum(P @ P.transpose(0,2,1), axis=(1,2)) # (n_sources,)
-        indices = np.argsort(correlation)
-
-        min_idx = indices[0]
-        P_criteria = P[min_idx] # (n_sources, n_frames)
-
-        for idx in range(1, n_bins):
-            min_idx = indices[idx]
-            P_max = None
-            perm_max = None
-            for perm in permutations:
-                P_perm = np.sum(P_criteria * P[min_idx, perm,:])
-                if P_max is None or P_perm > P_max:
-                    P_max = P_perm
-                    perm_max = perm
-            
-            P_criteria = P_criteria + P[min_idx,perm_max,:]
-            W[min_idx,:,:] = W[min_idx,perm_max,:]
+        permutation = self.permutation_solver(Y, demix_filter=W) # (n_bins, n_sources)
+        W, Y = apply_permutation(W, Y, permutation)
         
         self.demix_filter = W
+        self.estimation = Y
     
     def compute_negative_loglikelihood(self):
         raise NotImplementedError("Implement 'compute_negative_loglikelihood' function.")
 
 
 class GradFDICAbase(FDICAbase):
-    def __init__(self, lr=1e-1, reference_id=0, callback=None, eps=EPS):
-        super().__init__(callback=callback, eps=eps)
+    def __init__(self, lr=1e-1, reference_id=0, permutation='power', callback=None, eps=EPS):
+        super().__init__(permutation=permutation, callback=callback, eps=eps)
 
         self.lr = lr
         self.reference_id = reference_id
@@ -132,25 +88,18 @@ class GradFDICAbase(FDICAbase):
 
         self._reset(**kwargs)
 
-        loss = self.compute_negative_loglikelihood()
-        self.loss.append(loss)
-
-        for idx in range(iteration):
-            self.update_once()
-            loss = self.compute_negative_loglikelihood()
-            self.loss.append(loss)
-
-            if self.callback is not None:
-                self.callback(self)
+        self.iterate(iteration)
         
-        self.solve_permutation()
+        with profile(self.profiler, 'permutation'):
+            self.solve_permutation()
 
         reference_id = self.reference_id
-        X, W = input, self.demix_filter
+        X, W = self.input, self.demix_filter
         Y = self.separate(X, demix_filter=W)
 
-        scale = projection_back(Y, reference=X[reference_id])
-        output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
+        with profile(self.profiler, 'projection_back'):
+            scale = projection_back(Y, reference=X[reference_id])
+            output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
         self.estimation = output
 
         return output
@@ -159,13 +108,13 @@ class GradFDICAbase(FDICAbase):
         raise NotImplementedError("Implement 'compute_negative_loglikelihood' function.")
 
 class GradLaplaceFDICA(GradFDICAbase):
-    def __init__(self, lr=1e-1, reference_id=0, callback=None, eps=EPS):
-        super().__init__(lr=lr, reference_id=reference_id, callback=callback, eps=eps)
+    def __init__(self, lr=1e-1, reference_id=0, permutation='power', callback=None, eps=EPS):
+        super().__init__(lr=lr, reference_id=reference_id, permutation=permutation, callback=callback, eps=eps)
     
     def update_once(self):
         n_frames = self.n_frames
         lr = self.lr
-        eps = self.eps
+        eps = self._eps
 
         X = self.input
         W = self.demix_filter
@@ -198,8 +147,8 @@ class GradLaplaceFDICA(GradFDICAbase):
         return loss
 
 class NaturalGradLaplaceFDICA(GradFDICAbase):
-    def __init__(self, lr=1e-1, reference_id=0, is_holonomic=True, callback=None, eps=EPS):
-        super().__init__(lr=lr, reference_id=reference_id, callback=callback, eps=eps)
+    def __init__(self, lr=1e-1, reference_id=0, is_holonomic=True, permutation='power', callback=None, eps=EPS):
+        super().__init__(lr=lr, reference_id=reference_id, permutation=permutation, callback=callback, eps=eps)
 
         self.is_holonomic = is_holonomic
 
@@ -207,12 +156,12 @@ class NaturalGradLaplaceFDICA(GradFDICAbase):
         n_sources, n_channels = self.n_sources, self.n_channels
         n_frames = self.n_frames
         lr = self.lr
-        eps = self.eps
+        eps = self._eps
 
         X = self.input
         W = self.demix_filter
         Y = self.separate(X, demix_filter=W)
-        eye = np.eye(n_sources, n_channels, dtype=np.complex128)
+        eye = np.eye(n_sources, n_channels, dtype=self.complex_dtype)
 
         Y = Y.transpose(1,0,2) # (n_bins, n_sources, n_frames)
         Y_Hermite = Y.transpose(0,2,1).conj() # (n_bins, n_frames, n_sources)
@@ -1,52 +1,85 @@
 import numpy as np
 
-from algorithm.stft import stft, istft
+from algorithm.stft import stft, istft, ConsistencyProjection
 from algorithm.projection_back import projection_back
+from algorithm.covariance import MAX_CACHE_BYTES, WeightedCovariance
+from algorithm.update_rule import __update_rules__, update_by_ip, update_by_ip2, update_by_iss
+from algorithm.stability import StabilityCheck
+from algorithm.workspace import Workspace
+from algorithm.parallel import build_parallel, update_by_shards
+from algorithm.profiler import profile
+from algorithm.initialization import build_initializer
+from bss.base import IterativeBSSbase
 
 EPS=1e-12
 THRESHOLD=1e+12
 
-class ILRMAbase:
+class ILRMAbase(IterativeBSSbase):
     """
     Independent Low-rank Matrix Analysis
     """
-    def __init__(self, n_bases=10, partitioning=False, normalize=True, callback=None, eps=EPS):
-        self.callback = callback
-        self.eps = eps
-        self.input = None
+    def __init__(self, n_bases=10, partitioning=False, normalize=True, callback=None, eps=EPS, cache_outer_product=False, max_cache_bytes=MAX_CACHE_BYTES):
+        """
+        Args:
+            cache_outer_product <bool>: precompute per-frame outer products x x^H once in `_reset`.
+            max_cache_bytes <int>: memory budget of the cache. If exceeded, weighted covariances are computed on the fly.
+        """
+        super().__init__(callback=callback, eps=eps)
+
         self.n_bases = n_bases
-        self.loss = []
+        # With `warm_start=True`, NMF bases of the previous call are also used as initial values instead of random bases,
+        # provided that their shapes match the input. Activations are always initialized at random.
+        self.base = None
+        # Initialization of NMF can be given by `__call__(input, init='nndsvda')`, which is applied to power of the initial estimates
+        # (their sum over sources if partitioning=True). If None, bases and activations are initialized at random. See algorithm.initialization.
+        self.init = None
 
         self.partitioning = partitioning
         self.normalize = normalize
+
+        self.cache_outer_product = cache_outer_product
+        self.max_cache_bytes = max_cache_bytes
     
     def _reset(self, **kwargs):
-        assert self.input is not None, "Specify data!"
-
-        for key in kwargs.keys():
-            setattr(self, key, kwargs[key])
+        super()._reset(**kwargs)
 
         n_bases = self.n_bases
+        n_sources, n_bins, n_frames = self.n_sources, self.n_bins, self.n_frames
 
         X = self.input
 
-        n_channels, n_bins, n_frames = X.shape
-        n_sources = n_channels # n_channels == n_sources
+        accumulate_dtype = np.complex128 if self.accumulate_double else None
+        self.weighted_covariance = WeightedCovariance(X, cache=self.cache_outer_product, max_bytes=self.max_cache_bytes, accumulate_dtype=accumulate_dtype)
 
-        self.n_sources, self.n_channels = n_sources, n_channels
-        self.n_bins, self.n_frames = n_bins, n_frames
+        if self.partitioning:
+            if self.warm_start and self.base is not None and self.base.shape == (n_bins, n_bases) and self.latent.shape == (n_sources, n_bases):
+                self.latent = self.latent.astype(self.real_dtype)
+                self.base = self.base.astype(self.real_dtype)
+                self.activation = np.random.rand(n_bases, n_frames).astype(self.real_dtype)
+            else:
+                self.latent = np.ones((n_sources, n_bases), dtype=self.real_dtype) / n_sources
+                self.base, self.activation = self._initialize_nmf(n_bases)
+        else:
+            if self.warm_start and self.base is not None and self.base.shape == (n_sources, n_bins, n_bases):
+                self.base = self.base.astype(self.real_dtype)
+                self.activation = np.random.rand(n_sources, n_bases, n_frames).astype(self.real_dtype)
+            else:
+                self.base, self.activation = self._initialize_nmf(n_bases)
 
-        W = np.eye(n_sources, n_channels, dtype=np.complex128)
-        self.demix_filter = np.tile(W, reps=(n_bins, 1, 1))
-        self.estimation = self.separate(X, demix_filter=W)
+    def _initialize_nmf(self, n_bases):
+        """
+        Returns:
+            base (n_bins, n_bases) if partitioning=True, otherwise (n_sources, n_bins, n_bases)
+            activation (n_bases, n_frames) if partitioning=True, otherwise (n_sources, n_bases, n_frames)
+        """
+        target = np.abs(self.estimation)**2
 
         if self.partitioning:
-            self.latent = np.ones((n_sources, n_bases), dtype=np.float64) / n_sources
-            self.base = np.random.rand(n_bins, n_bases)
-            self.activation = np.random.rand(n_bases, n_frames)
-        else:
-            self.base = np.random.rand(n_sources, n_bins, n_bases)
-            self.activation = np.random.rand(n_sources, n_bases, n_frames)
+            target = target.sum(axis=0)
+
+        base, activation = build_initializer(self.init)(target, n_bases)
+
+        return base.astype(self.real_dtype), activation.astype(self.real_dtype)
         
     def __call__(self, input, iteration=100, **kwargs):
         """
@@ -59,19 +92,9 @@ class ILRMAbase:
 
         self._reset(**kwargs)
 
-        loss = self.compute_negative_loglikelihood()    
-        self.loss.append(loss)
-
-        for idx in range(iteration):
-            self.update_once()
-
-            loss = self.compute_negative_loglikelihood()
-            self.loss.append(loss)
-
-            if self.callback is not None:
-                self.callback(self)
+        self.iterate(iteration)
         
-        X, W = input, self.demix_filter
+        X, W = self.input, self.demix_filter
         output = self.separate(X, demix_filter=W)
 
         return output
@@ -79,16 +102,17 @@ class ILRMAbase:
     def update_once(self):
         raise NotImplementedError("Implement 'update_once' function")
     
-    def separate(self, input, demix_filter):
+    def separate(self, input, demix_filter, out=None):
         """
         Args:
             input (n_channels, n_bins, n_frames): 
             demix_filter (n_bins, n_sources, n_channels): 
+            out (n_bins, n_sources, n_frames): buffer to write the estimation into. If None, it is allocated.
         Returns:
             output (n_channels, n_bins, n_frames): 
         """
         input = input.transpose(1,0,2)
-        estimation = demix_filter @ input
+        estimation = np.matmul(demix_filter, input, out=out)
         output = estimation.transpose(1,0,2)
 
         return output
@@ -101,19 +125,45 @@ class GaussILRMA(ILRMAbase):
     Reference: "Determined Blind Source Separation Unifying Independent Vector Analysis and Nonnegative Matrix Factorization"
     See https://ieeexplore.ieee.org/document/7486081
     """
-    def __init__(self, n_bases=10, partitioning=False, normalize='power', reference_id=0, callback=None, eps=EPS, threshold=THRESHOLD):
+    def __init__(self, n_bases=10, partitioning=False, normalize='power', reference_id=0, update_rule='IP', callback=None, eps=EPS, threshold=THRESHOLD, stability='norm', cache_outer_product=False, max_cache_bytes=MAX_CACHE_BYTES):
         """
         Args:
             normalize <str>: 'power': power based normalization, or 'projection-back': projection back based normalization.
+            update_rule <str>: 'IP', 'IP2' (only for 2 sources), or 'ISS'.
             threshold <float>: threshold for condition number when computing (WU)^{-1}.
+            stability <str> or <StabilityCheck>: 'cond', 'norm', or 'hadamard'. See algorithm.stability.StabilityCheck.
         """
-        super().__init__(n_bases=n_bases, partitioning=partitioning, normalize=normalize, callback=callback, eps=eps)
+        super().__init__(n_bases=n_bases, partitioning=partitioning, normalize=normalize, callback=callback, eps=eps, cache_outer_product=cache_outer_product, max_cache_bytes=max_cache_bytes)
+
+        if update_rule not in __update_rules__:
+            raise ValueError("Not support {} update rule. Choose from {}.".format(update_rule, __update_rules__))
 
         self.reference_id = reference_id
+        self.update_rule = update_rule
         self.threshold = threshold
 
+        if isinstance(stability, str):
+            stability = StabilityCheck(method=stability, threshold=threshold)
+        self.stability_check = stability
+
+        # Spatial updates are sharded over bins as in AuxIVA by `__call__(input, parallel=n_threads)`. See algorithm.parallel.update_by_shards.
+        self.parallel = None
+
         # TODO: domain
     
+    def _reset(self, **kwargs):
+        super()._reset(**kwargs)
+
+        self.parallel = build_parallel(self.parallel)
+        self.stability_check.reset()
+        self.shard_stability_checks = []
+        self.logdet = np.log(np.abs(np.linalg.det(self.demix_filter))) # log|det W| of initial filters, updated by update rules.
+        # |Y|^2 of the current estimation and weights 1/R of the current source model, which are shared by updates and cheap loss.
+        # None means that they are stale.
+        self.source_power, self.source_weight = None, None
+        # Buffers of (n_sources, n_bins, n_frames) reused across iterations, so that steady-state iterations allocate no large array.
+        self.workspace = Workspace()
+    
     def __call__(self, input, iteration=100, **kwargs):
         """
         Args:
@@ -125,207 +175,297 @@ class GaussILRMA(ILRMAbase):
 
         self._reset(**kwargs)
 
-        loss = self.compute_negative_loglikelihood()    
-        self.loss.append(loss)
-
-        for idx in range(iteration):
-            self.update_once()
-
-            loss = self.compute_negative_loglikelihood()
-            self.loss.append(loss)
-
-            if self.callback is not None:
-                self.callback(self)
+        self.iterate(iteration)
         
         reference_id = self.reference_id
-        X, W = input, self.demix_filter
+        X, W = self.input, self.demix_filter
         Y = self.separate(X, demix_filter=W)
 
-        scale = projection_back(Y, reference=X[reference_id])
-        output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
+        with profile(self.profiler, 'projection_back'):
+            scale = projection_back(Y, reference=X[reference_id])
+            output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
         self.estimation = output
 
         return output
 
     def update_once(self):
-        eps = self.eps
+        eps = self._eps
 
-        self.update_source_model()
-        self.update_space_model()
+        with profile(self.profiler, 'update_source_model'):
+            self.update_source_model()
+        with profile(self.profiler, 'update_space_model'):
+            self.update_space_model()
 
-        X, W = self.input, self.demix_filter
+        X = self.input
         T = self.base
 
-        Y = self.separate(X, demix_filter=W)
+        Y = self.separate_into_workspace()
         self.estimation = Y
         
-        if self.normalize:
-            if self.normalize == 'power':
-                P = np.abs(Y)**2
-                aux = np.sqrt(P.mean(axis=(1,2))) # (n_sources,)
-                aux[aux < eps] = eps
-
-                # Normalize
-                W = W / aux[np.newaxis,:,np.newaxis]
-                Y = Y / aux[:,np.newaxis,np.newaxis]
-
-                if self.partitioning:
-                    Z = self.latent
+        with profile(self.profiler, 'normalize'):
+            if self.normalize:
+                if self.normalize == 'power':
+                    W = self.demix_filter
+                    P = self.compute_power(Y)
+                    aux = np.sqrt(P.mean(axis=(1,2))) # (n_sources,)
+                    aux[aux < eps] = eps
+
+                    # Normalize
+                    W /= aux[np.newaxis,:,np.newaxis]
+                    Y /= aux[:,np.newaxis,np.newaxis]
+                    P /= aux[:,np.newaxis,np.newaxis]**2
+                    self.logdet -= np.sum(np.log(aux))
+                    self.source_power = P
+
+                    # Source model of each source is divided by aux^2 below, with or without partitioning function.
+                    if self.source_weight is not None:
+                        self.source_weight *= aux[:,np.newaxis,np.newaxis]**2
+
+                    if self.partitioning:
+                        Z = self.latent
                     
-                    Zaux = Z / (aux[:,np.newaxis]**2) # (n_sources, n_bases)
-                    Zauxsum = np.sum(Zaux, axis=0) # (n_bases,)
-                    T = T * Zauxsum # (n_bins, n_bases)
-                    Z = Zaux / Zauxsum # (n_sources, n_bases)
-                    self.latent = Z
+                        Zaux = Z / (aux[:,np.newaxis]**2) # (n_sources, n_bases)
+                        Zauxsum = np.sum(Zaux, axis=0) # (n_bases,)
+                        T *= Zauxsum # (n_bins, n_bases)
+                        Z = Zaux / Zauxsum # (n_sources, n_bases)
+                        self.latent = Z
+                    else:
+                        T /= aux[:,np.newaxis,np.newaxis]**2
+                elif self.normalize == 'projection-back':
+                    if self.partitioning:
+                        raise NotImplementedError("Not support 'projection-back' based normalization for partitioninig function. Choose 'power' based normalization.")
+                    scale = projection_back(Y, reference=X[self.reference_id])
+                    Y = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
+                    X = X.transpose(1,0,2) # (n_bins, n_channels, n_frames)
+                    X_Hermite = X.transpose(0,2,1).conj() # (n_bins, n_frames, n_channels)
+                    W = Y.transpose(1,0,2) @ X_Hermite @ np.linalg.inv(X @ X_Hermite) # (n_bins, n_sources, n_channels)
+                    self.logdet = np.log(np.abs(np.linalg.det(W)))
                 else:
-                    T = T / (aux[:,np.newaxis,np.newaxis]**2)
-            elif self.normalize == 'projection-back':
-                if self.partitioning:
-                    raise NotImplementedError("Not support 'projection-back' based normalization for partitioninig function. Choose 'power' based normalization.")
-                scale = projection_back(Y, reference=X[self.reference_id])
-                Y = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
-                X = X.transpose(1,0,2) # (n_bins, n_channels, n_frames)
-                X_Hermite = X.transpose(0,2,1).conj() # (n_bins, n_frames, n_channels)
-                W = Y.transpose(1,0,2) @ X_Hermite @ np.linalg.inv(X @ X_Hermite) # (n_bins, n_sources, n_channels)
-            else:
-                raise ValueError("Not support normalization based on {}. Choose 'power' or 'projection-back'".format(self.normalize))
+                    raise ValueError("Not support normalization based on {}. Choose 'power' or 'projection-back'".format(self.normalize))
 
-            self.demix_filter = W
-            self.estimation = Y
-            self.base = T
+                self.demix_filter = W
+                self.estimation = Y
+                self.base = T
+
+    def separate_into_workspace(self, name='estimation'):
+        """
+        Separate input by the current demixing filters into the buffer `name` of workspace.
+        Returns:
+            output (n_sources, n_bins, n_frames): view of the buffer, which is overwritten by the next request of `name`.
+        """
+        X, W = self.input, self.demix_filter
+        out = self.workspace(name, (self.n_bins, self.n_sources, self.n_frames), self.complex_dtype)
+
+        return self.separate(X, demix_filter=W, out=out)
+
+    def compute_power(self, input, name='power'):
+        """
+        Args:
+            input (n_sources, n_bins, n_frames)
+        Returns:
+            output (n_sources, n_bins, n_frames): |input|^2 in the buffer `name` of workspace.
+        """
+        output = self.workspace(name, input.shape, self.real_dtype)
+        np.abs(input, out=output)
+        np.square(output, out=output)
+
+        return output
+
+    def compute_source_model(self, name='model'):
+        """
+        Returns:
+            output (n_sources, n_bins, n_frames): variances of sources floored by eps in the buffer `name` of workspace.
+        """
+        eps = self._eps
+        workspace = self.workspace
+        n_sources, n_bins, n_frames = self.n_sources, self.n_bins, self.n_frames
+
+        T, V = self.base, self.activation
+        output = workspace(name, (n_sources, n_bins, n_frames), self.real_dtype)
+
+        if self.partitioning:
+            Z = self.latent
+            ZT = workspace('ZT', (n_sources, n_bins, self.n_bases), self.real_dtype)
+            np.multiply(Z[:,np.newaxis,:], T[np.newaxis,:,:], out=ZT)
+            np.matmul(ZT, V, out=output)
+        else:
+            np.matmul(T, V, out=output)
+
+        np.maximum(output, eps, out=output)
+
+        return output
+
+    def _compute_division(self, power, model, division, model_inverse):
+        """
+        Floor `model` by eps in place, and write P / model^2 and 1 / model into `division` and `model_inverse`.
+        """
+        eps = self._eps
+
+        np.maximum(model, eps, out=model)
+        np.reciprocal(model, out=model_inverse)
+        np.multiply(model, model, out=division)
+        np.divide(power, division, out=division)
     
     def update_source_model(self):
-        eps = self.eps
+        eps = self._eps
+        workspace = self.workspace
+        n_sources, n_bins, n_frames = self.n_sources, self.n_bins, self.n_frames
+        n_bases = self.n_bases
+        real_dtype = self.real_dtype
 
-        X, W = self.input, self.demix_filter
-        Y = self.separate(X, demix_filter=W)
-        P = np.abs(Y)**2
+        # Estimation is kept consistent with demixing filters by update_once, or replaced by its projection in ConsistentGaussILRMA.
+        P = self.source_power
+
+        if P is None:
+            P = self.compute_power(self.estimation)
+
+        # Every temporary of (n_sources, n_bins, n_frames) or (n_sources, n_bins, n_bases) is written into workspace.
+        TV = workspace('TV', (n_sources, n_bins, n_frames), real_dtype)
+        TV_inverse = workspace('TV_inverse', (n_sources, n_bins, n_frames), real_dtype)
+        division = workspace('division', (n_sources, n_bins, n_frames), real_dtype)
+        numerator = workspace('numerator', (n_sources, n_bins, n_bases), real_dtype)
+        denominator = workspace('denominator', (n_sources, n_bins, n_bases), real_dtype)
         
         if self.partitioning:
             Z = self.latent # (n_sources, n_bases)
             T, V = self.base, self.activation
-
-            TV = T[:,:,np.newaxis] * V[np.newaxis,:,:] # (n_bins, n_bases, n_frames)
-            ZT = Z[:,np.newaxis,:] * T[np.newaxis,:,:] # (n_sources, n_bins, n_bases)
-            ZTV = ZT @ V[np.newaxis,:,:] # (n_sources, n_bins, n_frames)
-            ZTV[ZTV < eps] = eps
-            division, ZTV_inverse = P / (ZTV**2), 1 / ZTV # (n_sources, n_bins, n_frames)
-            numerator = np.sum(division[:,:,np.newaxis,:,] * TV, axis=(1,3)) # (n_sources, n_bases)
-            denominator = np.sum(ZTV_inverse[:,:,np.newaxis,:,] * TV, axis=(1,3)) # (n_sources, n_bases)
-            denominator[denominator < eps] = eps
-            Z = np.sqrt(numerator / denominator) # (n_sources, n_bases)
+            ZT = workspace('ZT', (n_sources, n_bins, n_bases), real_dtype)
+            V_transpose = V.transpose(1,0)
+
+            # Sums over (n_bins, n_bases, n_frames) are contracted by matrix products one axis at a time,
+            # so no tensor of (n_sources, n_bins, n_bases, n_frames) is created.
+
+            # Update latent variables
+            np.multiply(Z[:,np.newaxis,:], T[np.newaxis,:,:], out=ZT) # (n_sources, n_bins, n_bases)
+            self._compute_division(P, np.matmul(ZT, V, out=TV), division, TV_inverse) # (n_sources, n_bins, n_frames)
+            np.multiply(np.matmul(division, V_transpose, out=numerator), T, out=numerator)
+            np.multiply(np.matmul(TV_inverse, V_transpose, out=denominator), T, out=denominator)
+            _numerator = np.sum(numerator, axis=1) # (n_sources, n_bases)
+            _denominator = np.sum(denominator, axis=1) # (n_sources, n_bases)
+            _denominator[_denominator < eps] = eps
+            Z = np.sqrt(_numerator / _denominator) # (n_sources, n_bases)
             Z = Z / Z.sum(axis=0) # (n_sources, n_bases)
 
             # Update bases
-            ZT = Z[:,np.newaxis,:] * T[np.newaxis,:,:] # (n_sources, n_bins, n_bases)
-            ZTV = ZT @ V[np.newaxis,:,:] # (n_sources, n_bins, n_frames)
-            ZTV[ZTV < eps] = eps
-            division, ZTV_inverse = P / (ZTV**2), 1 / ZTV # (n_sources, n_bins, n_frames)
-            ZV = Z[:,:,np.newaxis] * V[np.newaxis,:,:] # (n_sources, n_bases, n_frames)
-            numerator = np.sum(division[:,:,np.newaxis,:] * ZV[:,np.newaxis,:,:], axis=(0,3)) # (n_bins, n_bases)
-            denominator = np.sum(ZTV_inverse[:,:,np.newaxis,:] * ZV[:,np.newaxis,:,:], axis=(0,3)) # (n_bins, n_bases)
-            denominator[denominator < eps] = eps
-            T = T * np.sqrt(numerator / denominator) # (n_bins, n_bases)
+            np.multiply(Z[:,np.newaxis,:], T[np.newaxis,:,:], out=ZT) # (n_sources, n_bins, n_bases)
+            self._compute_division(P, np.matmul(ZT, V, out=TV), division, TV_inverse) # (n_sources, n_bins, n_frames)
+            np.multiply(np.matmul(division, V_transpose, out=numerator), Z[:,np.newaxis,:], out=numerator)
+            np.multiply(np.matmul(TV_inverse, V_transpose, out=denominator), Z[:,np.newaxis,:], out=denominator)
+            _numerator = np.sum(numerator, axis=0) # (n_bins, n_bases)
+            _denominator = np.sum(denominator, axis=0) # (n_bins, n_bases)
+            _denominator[_denominator < eps] = eps
+            T *= np.sqrt(_numerator / _denominator) # (n_bins, n_bases)
 
             # Update activations
-            ZT = Z[:,np.newaxis,:] * T[np.newaxis,:,:] # (n_sources, n_bins, n_bases)
-            ZTV = ZT @ V[np.newaxis,:,:] # (n_sources, n_bins, n_frames)
-            ZTV[ZTV < eps] = eps
-            division, ZTV_inverse = P / (ZTV**2), 1 / ZTV # (n_sources, n_bins, n_frames)
-            ZT = Z[:,np.newaxis,:] * T[np.newaxis,:,:] # (n_sources, n_bins, n_bases)
-            numerator = np.sum(division[:,:,np.newaxis,:] * ZT[:,:,:,np.newaxis], axis=(0,1)) # (n_bases, n_frames)
-            denominator = np.sum(ZTV_inverse[:,:,np.newaxis,:] * ZT[:,:,:,np.newaxis], axis=(0,1)) # (n_bases, n_frames)
-            denominator[denominator < eps] = eps
-            V = V * np.sqrt(numerator / denominator) # (n_bins, n_bases)
+            np.multiply(Z[:,np.newaxis,:], T[np.newaxis,:,:], out=ZT) # (n_sources, n_bins, n_bases)
+            self._compute_division(P, np.matmul(ZT, V, out=TV), division, TV_inverse) # (n_sources, n_bins, n_frames)
+            ZT_transpose = ZT.reshape(n_sources * n_bins, n_bases).transpose(1,0) # (n_bases, n_sources * n_bins)
+            _numerator = ZT_transpose @ division.reshape(n_sources * n_bins, n_frames) # (n_bases, n_frames)
+            _denominator = ZT_transpose @ TV_inverse.reshape(n_sources * n_bins, n_frames) # (n_bases, n_frames)
+            _denominator[_denominator < eps] = eps
+            V *= np.sqrt(_numerator / _denominator) # (n_bases, n_frames)
 
             self.latent = Z
-            self.base, self.activation = T, V
         else:
             T, V = self.base, self.activation
+            TTV = workspace('TTV', (n_sources, n_bases, n_frames), real_dtype)
+            TTdivision = workspace('TTdivision', (n_sources, n_bases, n_frames), real_dtype)
 
             # Update bases
             V_transpose = V.transpose(0,2,1)
-            TV = T @ V
-            TV[TV < eps] = eps
-            division, TV_inverse = P / (TV**2), 1 / TV
-            TVV = TV_inverse @ V_transpose
-            TVV[TVV < eps] = eps
-            T = T * np.sqrt(division @ V_transpose / TVV)
+            self._compute_division(P, np.matmul(T, V, out=TV), division, TV_inverse)
+            TVV = np.matmul(TV_inverse, V_transpose, out=denominator)
+            np.maximum(TVV, eps, out=TVV)
+            np.matmul(division, V_transpose, out=numerator)
+            np.divide(numerator, TVV, out=numerator)
+            T *= np.sqrt(numerator, out=numerator)
             
             # Update activations
             T_transpose = T.transpose(0,2,1)
-            TV = T @ V
-            TV[TV < eps] = eps
-            division, TV_inverse = P / (TV**2), 1 / TV
-            TTV = T_transpose @ TV_inverse
-            TTV[TTV < eps] = eps
-            V = V * np.sqrt(T_transpose @ division / TTV)
+            self._compute_division(P, np.matmul(T, V, out=TV), division, TV_inverse)
+            np.matmul(T_transpose, TV_inverse, out=TTV)
+            np.maximum(TTV, eps, out=TTV)
+            np.matmul(T_transpose, division, out=TTdivision)
+            np.divide(TTdivision, TTV, out=TTdivision)
+            V *= np.sqrt(TTdivision, out=TTdivision)
 
-            self.base, self.activation = T, V
+        self.source_weight = None
 
     def update_space_model(self):
-        n_sources, n_channels = self.n_sources, self.n_channels
-        n_bins = self.n_bins
-        eps, threshold = self.eps, self.threshold
+        R = self.compute_source_model(name='weight') # (n_sources, n_bins, n_frames)
+        np.reciprocal(R, out=R)
 
-        X, W = self.input, self.demix_filter
-        
-        if self.partitioning:
-            Z = self.latent
-            T, V = self.base, self.activation
-            ZTV = np.sum(Z[:,np.newaxis,:,np.newaxis] * T[:,:,np.newaxis] * V[np.newaxis,:,:], axis=2) # (n_sources, n_bins, n_frames)
-            R = ZTV[...,np.newaxis, np.newaxis] # (n_sources, n_bins, n_frames, 1, 1)
-        else:
-            T, V = self.base, self.activation
-            TV = T @ V
-            R = TV[...,np.newaxis, np.newaxis] # (n_sources, n_bins, n_frames, 1, 1)
-        
-        X = X.transpose(1,2,0) # (n_bins, n_frames, n_channels)
-        X = X[...,np.newaxis]
-        X_Hermite = X.transpose(0,1,3,2).conj()
-        XX = X @ X_Hermite # (n_bins, n_frames, n_channels, n_channels)
-        R[R < eps] = eps
-        U = XX / R
-        U = U.mean(axis=2) # (n_sources, n_bins, n_channels, n_channels)
-        E = np.eye(n_sources, n_channels)
-        E = np.tile(E, reps=(n_bins,1,1)) # (n_bins, n_sources, n_channels)
+        self.update_demix_filter(R)
 
-        for source_idx in range(n_sources):
-            # W: (n_bins, n_sources, n_channels), U: (n_sources, n_bins, n_channels, n_channels)
-            w_n_Hermite = W[:,source_idx,:] # (n_bins, n_channels)
-            U_n = U[source_idx] # (n_bins, n_channels, n_channels)
-            WU = W @ U_n # (n_bins, n_sources, n_channels)
-            condition = np.linalg.cond(WU) < threshold # (n_bins,)
-            condition = condition[:,np.newaxis] # (n_bins, 1)
-            e_n = E[:,source_idx,:]
-            w_n = np.linalg.solve(WU, e_n)
-            wUw = w_n[:,np.newaxis,:].conj() @ U_n @ w_n[:,:,np.newaxis]
-            denominator = np.sqrt(wUw[...,0])
-            w_n_Hermite = np.where(condition, w_n.conj() / denominator, w_n_Hermite)
-            # if condition number is too big, `denominator[denominator < eps] = eps` may diverge of cost function.
-            W[:,source_idx,:] = w_n_Hermite
+        # Power is stale after the update of demixing filters. Weights are still valid, but kept only for cheap loss.
+        self.source_power = None
+        self.source_weight = None if self.exact_loss else R
+
+    def update_demix_filter(self, weight):
+        """
+        Update demixing filters by `self.update_rule` given weights of auxiliary function.
+        Args:
+            weight (n_sources, n_bins, n_frames)
+        """
+        W = self.demix_filter
+        out = self.workspace('estimation', (self.n_bins, self.n_sources, self.n_frames), self.complex_dtype)
+
+        update_bins = lambda bins, stability_check: self._update_demix_filter_bins(weight, bins, stability_check, out=out)
+        self.shard_stability_checks = update_by_shards(self.parallel, update_bins, self.n_bins, self.stability_check, shard_stability_checks=self.shard_stability_checks, gather_stability=(self.update_rule == 'IP'))
 
         self.demix_filter = W
 
-    def compute_negative_loglikelihood(self):
-        n_frames = self.n_frames
-        eps = self.eps
+    def _update_demix_filter_bins(self, weight, bins, stability_check, out):
+        """
+        Update demixing filters of a range of bins in place.
+        Args:
+            weight (n_sources, n_bins, n_frames)
+            bins <slice>: range of bins.
+            stability_check <StabilityCheck>: used only by this range.
+            out (n_bins, n_sources, n_frames): buffer of estimation used by ISS.
+        """
+        eps = self._eps
 
         X, W = self.input, self.demix_filter
-        Y = self.separate(X, demix_filter=W)
+        W, logdet = W[bins], self.logdet[bins]
+        weight = weight[:,bins]
 
-        P = np.abs(Y)**2 # (n_sources, n_bins, n_frames)
+        if self.update_rule == 'ISS':
+            Y = self.separate(X[:,bins], demix_filter=W, out=out[bins])
+            update_by_iss(W, Y, weight=weight, eps=eps, logdet=logdet)
+        else:
+            U = self.weighted_covariance(weight, bins=bins) # (n_sources, n_bins, n_channels, n_channels)
 
-        if self.partitioning:
-            Z = self.latent
-            T, V = self.base, self.activation
-            R = np.sum(Z[:,np.newaxis,:,np.newaxis] * T[:,:,np.newaxis] * V[np.newaxis,:,:], axis=2) # (n_sources, n_bins, n_frames)
+            if self.update_rule == 'IP':
+                update_by_ip(W, U, stability_check=stability_check, logdet=logdet)
+            else:
+                update_by_ip2(W, U, eps=eps, logdet=logdet)
+
+    def compute_negative_loglikelihood(self):
+        n_frames = self.n_frames
+
+        W = self.demix_filter
+
+        if self.exact_loss:
+            Y = self.separate_into_workspace(name='loss_estimation')
+            logdet = np.log(np.abs(np.linalg.det(W)))
+            P, weight = None, None
         else:
-            T, V = self.base, self.activation
-            R = T @ V # (n_sources, n_bins, n_frames)
+            # Estimation and log|det W| are kept up to date by update_once, and so are power and weights unless they are None.
+            Y, logdet = self.estimation, self.logdet
+            P, weight = self.source_power, self.source_weight
+
+        if P is None:
+            P = self.compute_power(Y, name='loss_power') # (n_sources, n_bins, n_frames)
         
-        R[R < eps] = eps
-        loss = np.sum(P / R + np.log(R)) - 2 * n_frames * np.sum(np.log(np.abs(np.linalg.det(W))))
+        if weight is None:
+            R = self.compute_source_model(name='loss_model') # (n_sources, n_bins, n_frames)
+            weight = np.reciprocal(R, out=R)
+
+        # Cached power and weights are read only, so results are written into buffers of loss.
+        P_R = np.multiply(P, weight, out=self.workspace('loss_power', P.shape, self.real_dtype))
+        log_R = np.log(weight, out=self.workspace('loss_model', weight.shape, self.real_dtype))
+        loss = np.sum(P_R) - np.sum(log_R) - 2 * n_frames * np.sum(logdet)
 
         return loss
 
@@ -334,14 +474,14 @@ class tILRMA(ILRMAbase):
     Reference: "Independent low-rank matrix analysis based on complex student's t-distribution for blind audio source separation"
     See: https://ieeexplore.ieee.org/document/8168129
     """
-    def __init__(self, n_bases=10, nu=1.0, partitioning=False, normalize='power', reference_id=0, callback=None, eps=EPS):
+    def __init__(self, n_bases=10, nu=1.0, partitioning=False, normalize='power', reference_id=0, callback=None, eps=EPS, cache_outer_product=False, max_cache_bytes=MAX_CACHE_BYTES):
         """
         Args:
             nu: degree of freedom. nu = 1: Cauchy distribution, nu -> infty: Gaussian distribution.
             normalize <str>: 'power': power based normalization, or 'projection-back': projection back based normalization.
             threshold <float>: threshold for condition number when computing (WU)^{-1}.
         """
-        super().__init__(n_bases=n_bases, partitioning=partitioning, normalize=normalize, callback=callback, eps=eps)
+        super().__init__(n_bases=n_bases, partitioning=partitioning, normalize=normalize, callback=callback, eps=eps, cache_outer_product=cache_outer_product, max_cache_bytes=max_cache_bytes)
 
         self.nu = nu
         self.reference_id = reference_id
@@ -359,66 +499,59 @@ class tILRMA(ILRMAbase):
 
         self._reset(**kwargs)
 
-        loss = self.compute_negative_loglikelihood()    
-        self.loss.append(loss)
-
-        for idx in range(iteration):
-            self.update_once()
-
-            loss = self.compute_negative_loglikelihood()
-            self.loss.append(loss)
-
-            if self.callback is not None:
-                self.callback(self)
+        self.iterate(iteration)
         
         reference_id = self.reference_id
-        X, W = input, self.demix_filter
+        X, W = self.input, self.demix_filter
         Y = self.separate(X, demix_filter=W)
 
-        scale = projection_back(Y, reference=X[reference_id])
-        output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
+        with profile(self.profiler, 'projection_back'):
+            scale = projection_back(Y, reference=X[reference_id])
+            output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
         self.estimation = output
 
         return output
     
     def update_once(self):
-        eps = self.eps
+        eps = self._eps
 
         # self.update_source_model()
-        self.update_space_model()
+        with profile(self.profiler, 'update_space_model'):
+            self.update_space_model()
 
         X, W = self.input, self.demix_filter
         Y = self.separate(X, demix_filter=W)
         self.estimation = Y
         
-        if self.normalize:
-            P = np.abs(Y)**2
-            aux = np.sqrt(P.mean(axis=(1,2))) # (n_sources,)
-            aux[aux < eps] = eps
+        with profile(self.profiler, 'normalize'):
+            if self.normalize:
+                P = np.abs(Y)**2
+                aux = np.sqrt(P.mean(axis=(1,2))) # (n_sources,)
+                aux[aux < eps] = eps
 
-            # Normalize
-            W = W / aux[np.newaxis,:,np.newaxis]
-            Y = Y / aux[:,np.newaxis,np.newaxis]
+                # Normalize
+                W = W / aux[np.newaxis,:,np.newaxis]
+                Y = Y / aux[:,np.newaxis,np.newaxis]
 
-            if self.partitioning:
-                Z = self.latent
-                T = self.base
-                Zaux = Z / (aux[:,np.newaxis]**2) # (n_sources, n_bases)
-                Zauxsum = np.sum(Zaux, axis=0) # (n_bases,)
-                T = T * Zauxsum # (n_bins, n_bases)
-                Z = Zaux / Zauxsum # (n_sources, n_bases)
-                self.latent = Z
-                self.base = T
-            else:
-                T = self.base
-                T = T / (aux[:,np.newaxis,np.newaxis]**2)
-                self.base = T
+                if self.partitioning:
+                    Z = self.latent
+                    T = self.base
+                    Zaux = Z / (aux[:,np.newaxis]**2) # (n_sources, n_bases)
+                    Zauxsum = np.sum(Zaux, axis=0) # (n_bases,)
+                    T = T * Zauxsum # (n_bins, n_bases)
+                    Z = Zaux / Zauxsum # (n_sources, n_bases)
+                    self.latent = Z
+                    self.base = T
+                else:
+                    T = self.base
+                    T = T / (aux[:,np.newaxis,np.newaxis]**2)
+                    self.base = T
             
-            self.demix_filter = W
-            self.estimation = Y
+                self.demix_filter = W
+                self.estimation = Y
 
     def update_source_model(self):
-        eps = self.eps
+        eps = self._eps
 
         X, W = self.input, self.demix_filter
         Y = self.separate(X, demix_filter=W)
@@ -493,7 +626,7 @@ class tILRMA(ILRMAbase):
     def update_space_model(self):
         n_sources = self.n_sources
         nu = self.nu
-        eps = self.eps
+        eps = self._eps
 
         X, W = self.input, self.demix_filter
         Y = self.separate(X, demix_filter=W)
@@ -503,22 +636,14 @@ class tILRMA(ILRMAbase):
         if self.partitioning:
             Z = self.latent
             T, V = self.base, self.activation
-            ZTV = np.sum(Z[:,np.newaxis,:,np.newaxis] * T[:,:,np.newaxis] * V[np.newaxis,:,:], axis=2) # (n_sources, n_bins, n_frames)
-            R = ZTV[...,np.newaxis, np.newaxis] # (n_sources, n_bins, n_frames, 1, 1)
+            R = (Z[:,np.newaxis,:] * T[np.newaxis,:,:]) @ V # (n_sources, n_bins, n_frames)
         else:
             T, V = self.base, self.activation
-            TV = T @ V
-            R = TV[...,np.newaxis, np.newaxis] # (n_sources, n_bins, n_frames, 1, 1)
+            R = T @ V # (n_sources, n_bins, n_frames)
         
         R[R < eps] = eps
-        Xi = (nu * R + 2 * P[..., np.newaxis, np.newaxis]) / (nu + 2)
-
-        X = X.transpose(1,2,0) # (n_bins, n_frames, n_channels)
-        X = X[...,np.newaxis]
-        X_Hermite = X.transpose(0,1,3,2).conj()
-        XX = X @ X_Hermite # (n_bins, n_frames, n_channels, n_channels)
-        U = XX / Xi
-        U = U.mean(axis=2) # (n_sources, n_bins, n_channels, n_channels)
+        Xi = (nu * R + 2 * P) / (nu + 2) # (n_sources, n_bins, n_frames)
+        U = self.weighted_covariance(1/Xi) # (n_sources, n_bins, n_channels, n_channels)
 
         for source_idx in range(n_sources):
             # W: (n_bins, n_sources, n_channels), U: (n_sources, n_bins, n_channels, n_channels)
@@ -536,7 +661,7 @@ class tILRMA(ILRMAbase):
     def compute_negative_loglikelihood(self):
         n_frames = self.n_frames
         nu = self.nu
-        eps = self.eps
+        eps = self._eps
 
         W = self.demix_filter
         Y = self.estimation
@@ -546,7 +671,7 @@ class tILRMA(ILRMAbase):
         if self.partitioning:
             Z = self.latent
             T, V = self.base, self.activation
-            R = np.sum(Z[:,np.newaxis,:,np.newaxis] * T[:,:,np.newaxis] * V[np.newaxis,:,:], axis=2) # (n_sources, n_bins, n_frames)
+            R = (Z[:,np.newaxis,:] * T[np.newaxis,:,:]) @ V # (n_sources, n_bins, n_frames)
         else:
             T, V = self.base, self.activation
             R = T @ V # (n_sources, n_bins, n_frames)
@@ -578,24 +703,15 @@ class KLILRMA(ILRMAbase):
 
         self._reset(**kwargs)
 
-        loss = self.compute_negative_loglikelihood()    
-        self.loss.append(loss)
-
-        for idx in range(iteration):
-            self.update_once()
-
-            loss = self.compute_negative_loglikelihood()
-            self.loss.append(loss)
-
-            if self.callback is not None:
-                self.callback(self)
+        self.iterate(iteration)
         
         reference_id = self.reference_id
-        X, W = input, self.demix_filter
+        X, W = self.input, self.demix_filter
         Y = self.separate(X, demix_filter=W)
 
-        scale = projection_back(Y, reference=X[reference_id])
-        output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
+        with profile(self.profiler, 'projection_back'):
+            scale = projection_back(Y, reference=X[reference_id])
+            output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
         self.estimation = output
 
         return output
@@ -621,13 +737,15 @@ class ConsistentGaussILRMA(GaussILRMA):
     Reference: "Consistent independent low-rank matrix analysis for determined blind source separation"
     See https://asp-eurasipjournals.springeropen.com/articles/10.1186/s13634-020-00704-4
     """
-    def __init__(self, n_bases=10, partitioning=False, reference_id=0, fft_size=None, hop_size=None, callback=None, eps=EPS, threshold=THRESHOLD):
+    def __init__(self, n_bases=10, partitioning=False, reference_id=0, fft_size=None, hop_size=None, update_rule='IP', callback=None, eps=EPS, threshold=THRESHOLD, stability='norm', cache_outer_product=False, max_cache_bytes=MAX_CACHE_BYTES):
         """
         Args:
             normalize <str>: 'power': power based normalization, or 'projection-back': projection back based normalization.
+            update_rule <str>: 'IP', 'IP2' (only for 2 sources), or 'ISS'.
             threshold <float>: threshold for condition number when computing (WU)^{-1}.
+            stability <str> or <StabilityCheck>: 'cond', 'norm', or 'hadamard'. See algorithm.stability.StabilityCheck.
         """
-        super().__init__(n_bases=n_bases, partitioning=partitioning, normalize=False, reference_id=reference_id, threshold=threshold, callback=callback, eps=eps)
+        super().__init__(n_bases=n_bases, partitioning=partitioning, normalize=False, reference_id=reference_id, update_rule=update_rule, threshold=threshold, stability=stability, callback=callback, eps=eps, cache_outer_product=cache_outer_product, max_cache_bytes=max_cache_bytes)
 
         if fft_size is None:
             raise ValueError("Specify `fft_size`.")
@@ -636,6 +754,7 @@ class ConsistentGaussILRMA(GaussILRMA):
             hop_size = fft_size // 2
         
         self.fft_size, self.hop_size = fft_size, hop_size
+        self.consistency_projection = ConsistencyProjection(fft_size, hop_size=hop_size)
 
     def __call__(self, input, iteration=100, **kwargs):
         """
@@ -648,50 +767,240 @@ class ConsistentGaussILRMA(GaussILRMA):
 
         self._reset(**kwargs)
 
-        loss = self.compute_negative_loglikelihood()    
-        self.loss.append(loss)
-
-        for idx in range(iteration):
-            self.update_once()
-
-            loss = self.compute_negative_loglikelihood()
-            self.loss.append(loss)
-
-            if self.callback is not None:
-                self.callback(self)
+        self.iterate(iteration)
         
         reference_id = self.reference_id
-        X, W = input, self.demix_filter
+        X, W = self.input, self.demix_filter
         Y = self.separate(X, demix_filter=W)
 
-        scale = projection_back(Y, reference=X[reference_id])
-        output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
+        with profile(self.profiler, 'projection_back'):
+            scale = projection_back(Y, reference=X[reference_id])
+            output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
         self.estimation = output
 
         return output
     
     def update_once(self):
-        y = istft(self.estimation, fft_size=self.fft_size, hop_size=self.hop_size)
-        self.estimation = stft(y, fft_size=self.fft_size, hop_size=self.hop_size)
+        with profile(self.profiler, 'consistency_projection'):
+            self.estimation = self.consistency_projection(self.estimation)
+            self.source_power = None
 
-        self.update_source_model()
-        self.update_space_model()
+        with profile(self.profiler, 'update_source_model'):
+            self.update_source_model()
+        with profile(self.profiler, 'update_space_model'):
+            self.update_space_model()
 
         X, W = self.input, self.demix_filter
         T = self.base
         Y = self.separate(X, demix_filter=W)
 
-        if self.partitioning:
-            raise NotImplementedError("Not support 'projection-back' based normalization for partitioninig function. Choose 'power' based normalization.")
-        scale = projection_back(Y, reference=X[self.reference_id])
-        transposed_scale = scale.transpose(1,0) # (n_sources, n_bins) -> (n_bins, n_sources)
-        W = W * transposed_scale[...,np.newaxis] # (n_bins, n_sources, n_channels)
+        with profile(self.profiler, 'normalize'):
+            if self.partitioning:
+                raise NotImplementedError("Not support 'projection-back' based normalization for partitioninig function. Choose 'power' based normalization.")
+            scale = projection_back(Y, reference=X[self.reference_id])
+            transposed_scale = scale.transpose(1,0) # (n_sources, n_bins) -> (n_bins, n_sources)
+            W = W * transposed_scale[...,np.newaxis] # (n_bins, n_sources, n_channels)
+            Y = self.separate(X, demix_filter=W)
+            T = T * np.abs(scale[...,np.newaxis])**2
+            self.logdet += np.sum(np.log(np.abs(scale)), axis=0)
+
+            if self.source_weight is not None:
+                self.source_weight /= np.abs(scale[...,np.newaxis])**2
+
+            self.demix_filter = W
+            self.estimation = Y
+            self.base = T
+
+class BatchGaussILRMA(GaussILRMA):
+    """
+    Gauss-ILRMA for a batch of mixtures.
+    Mixtures are stacked along the frequency axis for the spatial model, and along the leading axis for NMF,
+    so that every update runs as a single stacked operation over the batch.
+    Mixtures of different lengths are zero-padded and specified by frame masks.
+    """
+    def __init__(self, n_bases=10, partitioning=False, normalize='power', reference_id=0, update_rule='IP', callback=None, eps=EPS, threshold=THRESHOLD, stability='norm', cache_outer_product=False, max_cache_bytes=MAX_CACHE_BYTES):
+        super().__init__(n_bases=n_bases, partitioning=partitioning, normalize=normalize, reference_id=reference_id, update_rule=update_rule, callback=callback, eps=eps, threshold=threshold, stability=stability, cache_outer_product=cache_outer_product, max_cache_bytes=max_cache_bytes)
+
+        if partitioning:
+            raise NotImplementedError("Not support partitioning function for batch processing.")
+        if normalize and normalize != 'power':
+            raise NotImplementedError("Not support normalization based on {} for batch processing. Choose 'power' based normalization.".format(normalize))
+
+    def _reset(self, **kwargs):
+        # Normalization, weights, and loss of each mixture divide by its number of valid frames.
+        if np.any(self.n_valid_frames == 0):
+            raise ValueError("Each mixture needs at least one valid frame, but mask of items {} has none.".format(np.flatnonzero(self.n_valid_frames == 0).tolist()))
+
+        super()._reset(**kwargs)
+
+    def _initialize_nmf(self, n_bases):
+        """
+        Returns:
+            base (batch_size, n_sources, n_bins, n_bases): initialized at random.
+            activation (batch_size, n_sources, n_bases, n_frames): initialized at random.
+        """
+        batch_size = self.batch_size
+        n_sources, n_bins, n_frames = self.n_sources, self.n_bins // batch_size, self.n_frames
+
+        base = np.random.rand(batch_size, n_sources, n_bins, n_bases).astype(self.real_dtype)
+        activation = np.random.rand(batch_size, n_sources, n_bases, n_frames).astype(self.real_dtype)
+
+        return base, activation
+
+    def __call__(self, input, mask=None, iteration=100, **kwargs):
+        """
+        Args:
+            input (batch_size, n_channels, n_bins, n_frames)
+            mask (batch_size, n_frames): True for valid frames. If None, all frames are valid.
+        Returns:
+            output (batch_size, n_sources, n_bins, n_frames): masked frames are filled with 0.
+        Per-item loss of each iteration is appended to `self.loss` as (batch_size,).
+        """
+        batch_size, n_channels, n_bins, n_frames = input.shape
+
+        if mask is None:
+            mask = np.ones((batch_size, n_frames), dtype=bool)
+        
+        mask = mask.astype(bool)
+        input = input * mask[:,np.newaxis,np.newaxis,:]
+
+        self.batch_size = batch_size
+        self.mask = mask
+        self.n_valid_frames = mask.sum(axis=1) # (batch_size,)
+
+        self.input = input.transpose(1,0,2,3).reshape(n_channels, batch_size * n_bins, n_frames)
+
+        self._reset(**kwargs)
+
+        self.iterate(iteration)
+        
+        reference_id = self.reference_id
+        X, W = self.input, self.demix_filter
         Y = self.separate(X, demix_filter=W)
-        T = T * np.abs(scale[...,np.newaxis])**2
 
-        self.demix_filter = W
+        with profile(self.profiler, 'projection_back'):
+            scale = projection_back(Y, reference=X[reference_id])
+            output = Y * scale[...,np.newaxis] # (n_sources, batch_size * n_bins, n_frames)
+        self.estimation = output
+
+        n_sources = output.shape[0]
+        output = output.reshape(n_sources, batch_size, n_bins, n_frames).transpose(1,0,2,3) # (batch_size, n_sources, n_bins, n_frames)
+
+        return output
+
+    def update_once(self):
+        eps = self._eps
+        batch_size, mask = self.batch_size, self.mask
+
+        with profile(self.profiler, 'update_source_model'):
+            self.update_source_model()
+        with profile(self.profiler, 'update_space_model'):
+            self.update_space_model()
+
+        X, W = self.input, self.demix_filter
+        Y = self.separate(X, demix_filter=W)
         self.estimation = Y
-        self.base = T
+        
+        with profile(self.profiler, 'normalize'):
+            if self.normalize:
+                n_sources, n_bins, n_frames = Y.shape
+                T = self.base
+
+                P = np.abs(Y)**2
+                P = P.reshape(n_sources, batch_size, n_bins // batch_size, n_frames)
+                aux = np.sqrt(P.sum(axis=(2,3)) / (n_bins // batch_size * self.n_valid_frames)).astype(self.real_dtype) # (n_sources, batch_size)
+                aux[aux < eps] = eps
+                aux_bins = np.repeat(aux, n_bins // batch_size, axis=1) # (n_sources, batch_size * n_bins)
+
+                # Normalize
+                W = W / aux_bins.transpose(1,0)[:,:,np.newaxis]
+                Y = Y / aux_bins[:,:,np.newaxis]
+                T = T / (aux.transpose(1,0)[:,:,np.newaxis,np.newaxis]**2)
+
+                self.demix_filter = W
+                self.estimation = Y
+                self.base = T
+
+    def _batch_power(self):
+        """
+        Returns:
+            power (batch_size, n_sources, n_bins, n_frames): masked frames are filled with 0.
+        """
+        batch_size, mask = self.batch_size, self.mask
+
+        X, W = self.input, self.demix_filter
+        Y = self.separate(X, demix_filter=W)
+        n_sources, n_bins, n_frames = Y.shape
+
+        P = np.abs(Y)**2
+        P = P.reshape(n_sources, batch_size, n_bins // batch_size, n_frames).transpose(1,0,2,3)
+
+        return P * mask[:,np.newaxis,np.newaxis,:]
+    
+    def update_source_model(self):
+        eps = self._eps
+        mask = self.mask[:,np.newaxis,np.newaxis,:] # (batch_size, 1, 1, n_frames)
+
+        P = self._batch_power() # (batch_size, n_sources, n_bins, n_frames)
+        T, V = self.base, self.activation
+
+        # Update bases
+        V_transpose = V.transpose(0,1,3,2)
+        TV = T @ V
+        TV[TV < eps] = eps
+        division, TV_inverse = P / (TV**2), mask / TV
+        TVV = TV_inverse @ V_transpose
+        TVV[TVV < eps] = eps
+        T = T * np.sqrt(division @ V_transpose / TVV)
+        
+        # Update activations
+        T_transpose = T.transpose(0,1,3,2)
+        TV = T @ V
+        TV[TV < eps] = eps
+        division, TV_inverse = P / (TV**2), mask / TV
+        TTV = T_transpose @ TV_inverse
+        TTV[TTV < eps] = eps
+        V = V * np.sqrt(T_transpose @ division / TTV)
+
+        self.base, self.activation = T, V
+
+    def update_space_model(self):
+        eps = self._eps
+        batch_size, mask = self.batch_size, self.mask
+
+        T, V = self.base, self.activation
+        R = T @ V # (batch_size, n_sources, n_bins, n_frames)
+        R[R < eps] = eps
+
+        # Masked frames are excluded, and frames are averaged by the number of valid frames of each mixture.
+        n_frames = R.shape[-1]
+        scale = (n_frames / self.n_valid_frames).astype(self.real_dtype) # (batch_size,)
+        weight = mask[:,np.newaxis,np.newaxis,:] * scale[:,np.newaxis,np.newaxis,np.newaxis] / R # (batch_size, n_sources, n_bins, n_frames)
+        n_sources = weight.shape[1]
+        weight = weight.transpose(1,0,2,3).reshape(n_sources, -1, n_frames) # (n_sources, batch_size * n_bins, n_frames)
+
+        self.update_demix_filter(weight)
+
+    def compute_negative_loglikelihood(self):
+        """
+        Returns:
+            loss (batch_size,)
+        """
+        eps = self._eps
+        batch_size, mask = self.batch_size, self.mask
+
+        W = self.demix_filter
+        P = self._batch_power() # (batch_size, n_sources, n_bins, n_frames)
+
+        T, V = self.base, self.activation
+        R = T @ V # (batch_size, n_sources, n_bins, n_frames)
+        R[R < eps] = eps
+
+        loss = np.sum(mask[:,np.newaxis,np.newaxis,:] * (P / R + np.log(R)), axis=(1,2,3)) # (batch_size,)
+        logdet = np.log(np.abs(np.linalg.det(W))) # (batch_size * n_bins,)
+        loss = loss - 2 * self.n_valid_frames * logdet.reshape(batch_size, -1).sum(axis=1)
+
+        return loss
 
 def _convolve_mird(titles, reverb=0.160, degrees=[0], mic_intervals=[8,8,8,8,8,8,8], mic_indices=[0], samples=None):
     intervals = '-'.join([str(interval) for interval in mic_intervals])
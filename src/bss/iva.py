@@ -1,36 +1,22 @@
 import numpy as np
 
 from algorithm.projection_back import projection_back
+from algorithm.covariance import MAX_CACHE_BYTES, weighted_covariance, WeightedCovariance
+from algorithm.update_rule import __update_rules__, update_by_ip, update_by_ip2, update_by_iss, update_by_iss_covariance
+from algorithm.stability import StabilityCheck
+from algorithm.precision import resolve_dtype, adjust_eps
+from algorithm.workspace import Workspace
+from algorithm.parallel import build_parallel, update_by_shards
+from algorithm.profiler import profile
+from bss.base import IterativeBSSbase
 
 EPS=1e-12
 THRESHOLD=1e+12
 
-class IVAbase:
+class IVAbase(IterativeBSSbase):
     def __init__(self, callback=None, eps=EPS):
-        self.callback = callback
-        self.eps = eps
-
-        self.input = None
-        self.loss = []
-    
-    def _reset(self, **kwargs):
-        assert self.input is not None, "Specify data!"
-
-        for key in kwargs.keys():
-            setattr(self, key, kwargs[key])
-
-        X = self.input
-
-        n_channels, n_bins, n_frames = X.shape
-        n_sources = n_channels # n_channels == n_sources
-
-        self.n_sources, self.n_channels = n_sources, n_channels
-        self.n_bins, self.n_frames = n_bins, n_frames
+        super().__init__(callback=callback, eps=eps)
 
-        W = np.eye(n_channels, dtype=np.complex128)
-        self.demix_filter = np.tile(W, reps=(n_bins, 1, 1))
-        self.estimation = self.separate(X, demix_filter=W)
-        
     def __call__(self, input, iteration=100, **kwargs):
         """
         Args:
@@ -42,19 +28,9 @@ class IVAbase:
 
         self._reset(**kwargs)
 
-        loss = self.compute_negative_loglikelihood()
-        self.loss.append(loss)
-
-        for idx in range(iteration):
-            self.update_once()
-
-            loss = self.compute_negative_loglikelihood()
-            self.loss.append(loss)
-
-            if self.callback is not None:
-                self.callback(self)
+        self.iterate(iteration)
         
-        X, W = input, self.demix_filter
+        X, W = self.input, self.demix_filter
         output = self.separate(X, demix_filter=W)
 
         return output
@@ -62,16 +38,17 @@ class IVAbase:
     def update_once(self):
         raise NotImplementedError("Implement 'update_once' function")
     
-    def separate(self, input, demix_filter):
+    def separate(self, input, demix_filter, out=None):
         """
         Args:
             input (n_channels, n_bins, n_frames): 
             demix_filter (n_bins, n_sources, n_channels): 
+            out (n_bins, n_sources, n_frames): buffer to write the estimation into. If None, it is allocated.
         Returns:
             output (n_channels, n_bins, n_frames): 
         """
         input = input.transpose(1,0,2)
-        estimation = demix_filter @ input
+        estimation = np.matmul(demix_filter, input, out=out)
         output = estimation.transpose(1,0,2)
 
         return output
@@ -97,23 +74,15 @@ class GradIVAbase(IVAbase):
 
         self._reset(**kwargs)
 
-        loss = self.compute_negative_loglikelihood()
-        self.loss.append(loss)
-
-        for idx in range(iteration):
-            self.update_once()
-            loss = self.compute_negative_loglikelihood()
-            self.loss.append(loss)
-
-            if self.callback is not None:
-                self.callback(self)
+        self.iterate(iteration)
 
         reference_id = self.reference_id
-        X, W = input, self.demix_filter
+        X, W = self.input, self.demix_filter
         Y = self.separate(X, demix_filter=W)
 
-        scale = projection_back(Y, reference=X[reference_id])
-        output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
+        with profile(self.profiler, 'projection_back'):
+            scale = projection_back(Y, reference=X[reference_id])
+            output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
         self.estimation = output
 
         return output
@@ -134,7 +103,7 @@ class GradLaplaceIVA(GradIVAbase):
     def update_once(self):
         n_frames = self.n_frames
         lr = self.lr
-        eps = self.eps
+        eps = self._eps
 
         X = self.input
         W = self.demix_filter
@@ -179,12 +148,12 @@ class NaturalGradLaplaceIVA(GradIVAbase):
         n_sources, n_channels = self.n_sources, self.n_channels
         n_frames = self.n_frames
         lr = self.lr
-        eps = self.eps
+        eps = self._eps
 
         X = self.input
         W = self.demix_filter
         Y = self.separate(X, demix_filter=W)
-        eye = np.eye(n_sources, n_channels, dtype=np.complex128)
+        eye = np.eye(n_sources, n_channels, dtype=self.complex_dtype)
 
         Y = Y.transpose(1,0,2) # (n_bins, n_sources, n_frames)
         Y_Hermite = Y.transpose(0,2,1).conj() # (n_bins, n_frames, n_sources)
@@ -212,11 +181,46 @@ class NaturalGradLaplaceIVA(GradIVAbase):
 
 
 class AuxIVAbase(IVAbase):
-    def __init__(self, reference_id=0, callback=None, eps=EPS, threshold=THRESHOLD):
+    def __init__(self, reference_id=0, update_rule='IP', callback=None, eps=EPS, threshold=THRESHOLD, stability='norm', cache_outer_product=False, max_cache_bytes=MAX_CACHE_BYTES):
+        """
+        Args:
+            update_rule <str>: 'IP', 'IP2' (only for 2 sources), or 'ISS'.
+            threshold <float>: threshold for condition number when computing (WU)^{-1}.
+            stability <str> or <StabilityCheck>: 'cond', 'norm', or 'hadamard'. See algorithm.stability.StabilityCheck.
+            cache_outer_product <bool>: precompute per-frame outer products x x^H once in `_reset`.
+            max_cache_bytes <int>: memory budget of the cache. If exceeded, weighted covariances are computed on the fly.
+        """
         super().__init__(callback=callback, eps=eps)
 
+        if update_rule not in __update_rules__:
+            raise ValueError("Not support {} update rule. Choose from {}.".format(update_rule, __update_rules__))
+
         self.reference_id = reference_id
+        self.update_rule = update_rule
         self.threshold = threshold
+
+        if isinstance(stability, str):
+            stability = StabilityCheck(method=stability, threshold=threshold)
+        self.stability_check = stability
+
+        self.cache_outer_product = cache_outer_product
+        self.max_cache_bytes = max_cache_bytes
+        # Bins of spatial updates are processed by shards in parallel if `parallel` is given by `__call__(input, parallel=...)`,
+        # e.g. the number of threads or BinShardExecutor. See algorithm.parallel.
+        self.parallel = None
+    
+    def _reset(self, **kwargs):
+        super()._reset(**kwargs)
+
+        self.parallel = build_parallel(self.parallel)
+        self.stability_check.reset()
+        self.shard_stability_checks = []
+        accumulate_dtype = np.complex128 if self.accumulate_double else None
+        self.weighted_covariance = WeightedCovariance(self.input, cache=self.cache_outer_product, max_bytes=self.max_cache_bytes, accumulate_dtype=accumulate_dtype)
+        self.logdet = np.log(np.abs(np.linalg.det(self.demix_filter))) # log|det W| of initial filters, updated by update rules.
+        self.source_norm = None
+        # Buffers of (n_sources, n_bins, n_frames) reused across iterations.
+        self.workspace = Workspace()
     
     def __call__(self, input, iteration=100, **kwargs):
         """
@@ -229,23 +233,15 @@ class AuxIVAbase(IVAbase):
 
         self._reset(**kwargs)
 
-        loss = self.compute_negative_loglikelihood()
-        self.loss.append(loss)
-
-        for idx in range(iteration):
-            self.update_once()
-            loss = self.compute_negative_loglikelihood()
-            self.loss.append(loss)
-
-            if self.callback is not None:
-                self.callback(self)
+        self.iterate(iteration)
 
         reference_id = self.reference_id
-        X, W = input, self.demix_filter
+        X, W = self.input, self.demix_filter
         Y = self.separate(X, demix_filter=W)
 
-        scale = projection_back(Y, reference=X[reference_id])
-        output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
+        with profile(self.profiler, 'projection_back'):
+            scale = projection_back(Y, reference=X[reference_id])
+            output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
         self.estimation = output
 
         return output
@@ -253,59 +249,99 @@ class AuxIVAbase(IVAbase):
     def update_once(self):
         raise NotImplementedError("Implement 'update_once' function.")
 
+    def update_demix_filter(self, weight):
+        """
+        Update demixing filters by `self.update_rule` given weights of auxiliary function.
+        Args:
+            weight (n_sources, n_bins, n_frames): broadcastable, e.g. (n_sources, 1, n_frames).
+        """
+        W, Y = self.demix_filter, self.estimation
+
+        if self.update_rule != 'ISS':
+            out = self.workspace('estimation', (self.n_bins, self.n_sources, self.n_frames), W.dtype)
+            Y = out.transpose(1,0,2)
+        else:
+            out = None
+
+        update_bins = lambda bins, stability_check: self._update_demix_filter_bins(weight, bins, stability_check, out=out)
+        self.shard_stability_checks = update_by_shards(self.parallel, update_bins, self.n_bins, self.stability_check, shard_stability_checks=self.shard_stability_checks, gather_stability=(self.update_rule == 'IP'))
+        
+        self.demix_filter = W
+        self.estimation = Y
+        self.source_norm = None
+
+    def _update_demix_filter_bins(self, weight, bins, stability_check, out=None):
+        """
+        Update demixing filters of a range of bins in place.
+        Args:
+            weight (n_sources, n_bins, n_frames): broadcastable, e.g. (n_sources, 1, n_frames).
+            bins <slice>: range of bins.
+            stability_check <StabilityCheck>: used only by this range.
+            out (n_bins, n_sources, n_frames): buffer of estimation by IP and IP2. ISS updates `self.estimation` in place.
+        """
+        eps = self._eps
+
+        X, W, Y = self.input, self.demix_filter, self.estimation
+        W, logdet = W[bins], self.logdet[bins]
+
+        if weight.shape[1] > 1:
+            weight = weight[:,bins]
+
+        if self.update_rule == 'ISS':
+            update_by_iss(W, Y[:,bins], weight=weight, eps=eps, logdet=logdet)
+        else:
+            U = self.weighted_covariance(weight, bins=bins) # (n_sources, n_bins, n_channels, n_channels)
+
+            if self.update_rule == 'IP':
+                update_by_ip(W, U, stability_check=stability_check, logdet=logdet)
+            else:
+                update_by_ip2(W, U, eps=eps, logdet=logdet)
+
+            self.separate(X[:,bins], demix_filter=W, out=out[bins])
+
     def compute_negative_loglikelihood(self):
         raise NotImplementedError("Implement 'compute_negative_loglikelihood' function.")
 
 
 class AuxLaplaceIVA(AuxIVAbase):
-    def __init__(self, reference_id=0, callback=None, eps=EPS, threshold=THRESHOLD):
-        super().__init__(reference_id=reference_id, callback=callback, eps=eps, threshold=threshold)
+    def __init__(self, reference_id=0, update_rule='IP', callback=None, eps=EPS, threshold=THRESHOLD, stability='norm', cache_outer_product=False, max_cache_bytes=MAX_CACHE_BYTES):
+        super().__init__(reference_id=reference_id, update_rule=update_rule, callback=callback, eps=eps, threshold=threshold, stability=stability, cache_outer_product=cache_outer_product, max_cache_bytes=max_cache_bytes)
     
     def update_once(self):
-        n_sources, n_channels = self.n_sources, self.n_channels
-        n_bins = self.n_bins
-        eps, threshold = self.eps, self.threshold
+        with profile(self.profiler, 'update_source_model'):
+            R = self.compute_source_norm() # (n_sources, 1, n_frames)
 
-        X, W = self.input, self.demix_filter
-        Y = self.estimation
-        
-        X = X.transpose(1,2,0) # (n_bins, n_frames, n_channels)
-        X = X[...,np.newaxis]
-        X_Hermite = X.transpose(0,1,3,2).conj()
-        XX = X @ X_Hermite # (n_bins, n_frames, n_channels, n_channels)
-        P = np.abs(Y)**2 # (n_sources, n_bins, n_frames)
-        R = np.sqrt(P.sum(axis=1))[:,np.newaxis,:,np.newaxis,np.newaxis] # (n_sources, 1, n_frames, 1, 1)
-        U = XX / R # (n_sources, n_bins, n_frames, n_channels, n_channels)
-        U = U.mean(axis=2) # (n_sources, n_bins, n_channels, n_channels)
-        E = np.eye(n_sources, n_channels)
-        E = np.tile(E, reps=(n_bins,1,1)) # (n_bins, n_sources, n_channels)
-
-        for source_idx in range(n_sources):
-            # W: (n_bins, n_sources, n_channels), U: (n_sources, n_bins, n_channels, n_channels)
-            w_n_Hermite = W[:,source_idx,:] # (n_bins, n_channels)
-            U_n = U[source_idx] # (n_bins, n_channels, n_channels)
-            WU = W @ U_n # (n_bins, n_sources, n_channels)
-            condition = np.linalg.cond(WU) < threshold # (n_bins,)
-            condition = condition[:,np.newaxis] # (n_bins, 1)
-            e_n = E[:,source_idx,:]
-            w_n = np.linalg.solve(WU, e_n)
-            wUw = w_n[:,np.newaxis,:].conj() @ U_n @ w_n[:,:,np.newaxis]
-            denominator = np.sqrt(wUw[...,0])
-            w_n_Hermite = np.where(condition, w_n.conj() / denominator, w_n_Hermite)
-            # if condition number is too big, `denominator[denominator < eps] = eps` may occur divergence of cost function.
-            W[:,source_idx,:] = w_n_Hermite
-        
-        self.demix_filter = W
+        with profile(self.profiler, 'update_space_model'):
+            self.update_demix_filter(1/R)
 
-        X = self.input
-        Y = self.separate(X, demix_filter=W)
-        
-        self.estimation = Y
+    def compute_source_norm(self):
+        """
+        Returns:
+            R (n_sources, 1, n_frames): l2 norm of each source over bins, which is shared by update and cheap loss.
+        """
+        if self.source_norm is None:
+            Y = self.estimation
+            P = self.workspace('power', Y.shape, self.real_dtype)
+            np.abs(Y, out=P)
+            np.square(P, out=P) # (n_sources, n_bins, n_frames)
+            self.source_norm = np.sqrt(P.sum(axis=1))[:,np.newaxis,:] # (n_sources, 1, n_frames)
+
+        return self.source_norm
     
     def compute_negative_loglikelihood(self):
+        if not self.exact_loss:
+            # Estimation and log|det W| are kept up to date by update rules.
+            R = self.compute_source_norm()
+            loss = 2 * np.sum(R, axis=0).mean() - 2 * self.logdet.sum()
+
+            return loss
+
         X, W = self.input, self.demix_filter
-        Y = self.separate(X, demix_filter=W)
-        P = np.sum(np.abs(Y)**2, axis=1)
+        Y = self.separate(X, demix_filter=W, out=self.workspace('loss_estimation', (self.n_bins, self.n_sources, self.n_frames), W.dtype))
+        P = self.workspace('loss_power', Y.shape, self.real_dtype)
+        np.abs(Y, out=P)
+        np.square(P, out=P)
+        P = np.sum(P, axis=1)
         loss = 2 * np.sum(np.sqrt(P), axis=0).mean() - 2 * np.log(np.abs(np.linalg.det(W))).sum()
 
         return loss
@@ -318,6 +354,230 @@ class AuxGaussIVA(AuxIVAbase):
         raise NotImplementedError("in progress...")
 
 
+class BatchAuxLaplaceIVA(AuxLaplaceIVA):
+    """
+    AuxIVA for a batch of mixtures.
+    Mixtures are stacked along the frequency axis, so that every update runs as a single stacked operation over the batch.
+    Mixtures of different lengths are zero-padded and specified by frame masks.
+    """
+    def __init__(self, reference_id=0, update_rule='IP', callback=None, eps=EPS, threshold=THRESHOLD, stability='norm', cache_outer_product=False, max_cache_bytes=MAX_CACHE_BYTES):
+        super().__init__(reference_id=reference_id, update_rule=update_rule, callback=callback, eps=eps, threshold=threshold, stability=stability, cache_outer_product=cache_outer_product, max_cache_bytes=max_cache_bytes)
+
+    def _reset(self, **kwargs):
+        # Frames of each mixture are averaged by the number of its valid frames.
+        if np.any(self.n_valid_frames == 0):
+            raise ValueError("Each mixture needs at least one valid frame, but mask of items {} has none.".format(np.flatnonzero(self.n_valid_frames == 0).tolist()))
+
+        super()._reset(**kwargs)
+
+    def __call__(self, input, mask=None, iteration=100, **kwargs):
+        """
+        Args:
+            input (batch_size, n_channels, n_bins, n_frames)
+            mask (batch_size, n_frames): True for valid frames. If None, all frames are valid.
+        Returns:
+            output (batch_size, n_sources, n_bins, n_frames): masked frames are filled with 0.
+        Per-item loss of each iteration is appended to `self.loss` as (batch_size,).
+        """
+        batch_size, n_channels, n_bins, n_frames = input.shape
+
+        if mask is None:
+            mask = np.ones((batch_size, n_frames), dtype=bool)
+        
+        mask = mask.astype(bool)
+        input = input * mask[:,np.newaxis,np.newaxis,:]
+
+        self.batch_size = batch_size
+        self.mask = mask
+        self.n_valid_frames = mask.sum(axis=1) # (batch_size,)
+
+        self.input = input.transpose(1,0,2,3).reshape(n_channels, batch_size * n_bins, n_frames)
+
+        self._reset(**kwargs)
+
+        self.iterate(iteration)
+
+        reference_id = self.reference_id
+        X, W = self.input, self.demix_filter
+        Y = self.separate(X, demix_filter=W)
+
+        with profile(self.profiler, 'projection_back'):
+            scale = projection_back(Y, reference=X[reference_id])
+            output = Y * scale[...,np.newaxis] # (n_sources, batch_size * n_bins, n_frames)
+        self.estimation = output
+
+        n_sources = output.shape[0]
+        output = output.reshape(n_sources, batch_size, n_bins, n_frames).transpose(1,0,2,3) # (batch_size, n_sources, n_bins, n_frames)
+
+        return output
+
+    def update_once(self):
+        batch_size = self.batch_size
+        mask = self.mask
+
+        Y = self.estimation
+        n_sources, n_bins, n_frames = Y.shape
+        
+        with profile(self.profiler, 'update_source_model'):
+            P = np.abs(Y)**2 # (n_sources, batch_size * n_bins, n_frames)
+            P = P.reshape(n_sources, batch_size, n_bins // batch_size, n_frames)
+            R = np.sqrt(P.sum(axis=2)) # (n_sources, batch_size, n_frames)
+            R[:,np.logical_not(mask)] = 1
+
+            # Masked frames are excluded, and frames are averaged by the number of valid frames of each mixture.
+            scale = (n_frames / self.n_valid_frames).astype(self.real_dtype) # (batch_size,)
+            weight = mask * scale[:,np.newaxis] / R # (n_sources, batch_size, n_frames)
+            weight = np.repeat(weight, n_bins // batch_size, axis=1) # (n_sources, batch_size * n_bins, n_frames)
+
+        with profile(self.profiler, 'update_space_model'):
+            self.update_demix_filter(weight)
+    
+    def compute_negative_loglikelihood(self):
+        """
+        Returns:
+            loss (batch_size,)
+        """
+        batch_size = self.batch_size
+        mask = self.mask
+
+        X, W = self.input, self.demix_filter
+        Y = self.separate(X, demix_filter=W)
+        n_sources, n_bins, n_frames = Y.shape
+
+        P = np.abs(Y)**2
+        P = P.reshape(n_sources, batch_size, n_bins // batch_size, n_frames).sum(axis=2) # (n_sources, batch_size, n_frames)
+        loss = 2 * np.sum(np.sqrt(P), axis=0) # (batch_size, n_frames)
+        loss = np.sum(mask * loss, axis=1) / self.n_valid_frames # (batch_size,)
+        logdet = np.log(np.abs(np.linalg.det(W))) # (batch_size * n_bins,)
+        loss = loss - 2 * logdet.reshape(batch_size, n_bins // batch_size).sum(axis=1)
+
+        return loss
+
+class OnlineAuxLaplaceIVA(AuxLaplaceIVA):
+    """
+    Block-wise online AuxIVA.
+    Weighted covariances are exponentially averaged with a forgetting factor and demixing filters are updated once per block,
+    so the cost per frame does not depend on the length of session. The algorithmic latency is `block_size` frames.
+    Reference: "Online algorithm for independent vector analysis based on auxiliary function technique"
+    See https://ieeexplore.ieee.org/document/6954349
+    """
+    def __init__(self, forget=0.98, block_size=1, reference_id=0, update_rule='IP', callback=None, eps=EPS, threshold=THRESHOLD, stability='norm'):
+        """
+        Args:
+            forget <float>: forgetting factor of weighted covariances per block, in (0, 1).
+            block_size <int>: number of frames of each block.
+            update_rule <str>: 'IP', 'IP2' (only for 2 sources), or 'ISS'. ISS is computed from the averaged covariances.
+        """
+        super().__init__(reference_id=reference_id, update_rule=update_rule, callback=callback, eps=eps, threshold=threshold, stability=stability)
+
+        if not 0 < forget < 1:
+            raise ValueError("forget is expected in (0, 1), but given {}.".format(forget))
+
+        self.forget = forget
+        self.block_size = block_size
+
+        self.demix_filter = None
+        self.weighted_covariance = None
+
+    def reset(self, n_channels, n_bins, input_dtype=None):
+        """
+        Start a new session.
+        Args:
+            input_dtype: dtype of input, whose precision is used if `self.dtype` is None.
+        """
+        self.complex_dtype, self.real_dtype = resolve_dtype(self.dtype, input_dtype=input_dtype)
+        self._eps = adjust_eps(self.eps, self.real_dtype)
+
+        eps = self._eps
+        n_sources = n_channels # n_channels == n_sources
+
+        self.n_sources, self.n_channels = n_sources, n_channels
+        self.n_bins = n_bins
+        self.n_frames = 0
+
+        W = np.eye(n_channels, dtype=self.complex_dtype)
+        self.demix_filter = np.tile(W, reps=(n_bins, 1, 1))
+        # Small diagonal loading keeps WU invertible until enough frames are observed.
+        self.weighted_covariance = eps * np.tile(W, reps=(n_sources, n_bins, 1, 1))
+
+        self.stability_check.reset()
+
+    def __call__(self, input, iteration=1, **kwargs):
+        """
+        Process the whole spectrogram block by block, e.g. for simulation of online processing.
+        Args:
+            input (n_channels, n_bins, n_frames)
+            iteration <int>: number of updates per block.
+        Returns:
+            output (n_channels, n_bins, n_frames)
+        """
+        for key in kwargs.keys():
+            setattr(self, key, kwargs[key])
+
+        block_size = self.block_size
+        n_channels, n_bins, n_frames = input.shape
+
+        self.reset(n_channels, n_bins, input_dtype=input.dtype)
+
+        output = []
+
+        for start_idx in range(0, n_frames, block_size):
+            _output = self.process_block(input[:,:,start_idx:start_idx+block_size], iteration=iteration)
+            output.append(_output)
+
+        output = np.concatenate(output, axis=2)
+        self.input = input
+        self.estimation = output
+
+        return output
+
+    def process_block(self, input, iteration=1):
+        """
+        Args:
+            input (n_channels, n_bins, block_size): latest frames.
+            iteration <int>: number of updates per block.
+        Returns:
+            output (n_sources, n_bins, block_size): separated frames scaled by projection back.
+        """
+        n_channels, n_bins, n_frames = input.shape
+
+        if self.demix_filter is None or self.demix_filter.shape[:2] != (n_bins, n_channels):
+            self.reset(n_channels, n_bins, input_dtype=input.dtype)
+
+        forget = self.forget
+        eps = self._eps
+        reference_id = self.reference_id
+        accumulate_dtype = np.complex128 if self.accumulate_double else None
+
+        X = input.astype(self.complex_dtype, copy=False)
+        W, U_prev = self.demix_filter, self.weighted_covariance
+
+        for idx in range(iteration):
+            Y = self.separate(X, demix_filter=W)
+            R = np.sqrt(np.sum(np.abs(Y)**2, axis=1))[:,np.newaxis,:] # (n_sources, 1, n_frames)
+            R[R < eps] = eps
+            U = forget * U_prev + (1 - forget) * weighted_covariance(X, 1/R, accumulate_dtype=accumulate_dtype) # (n_sources, n_bins, n_channels, n_channels)
+
+            if self.update_rule == 'IP':
+                W = update_by_ip(W, U, stability_check=self.stability_check)
+            elif self.update_rule == 'IP2':
+                W = update_by_ip2(W, U, eps=eps)
+            else:
+                W = update_by_iss_covariance(W, U, eps=eps)
+
+        self.demix_filter, self.weighted_covariance = W, U
+        self.n_frames += n_frames
+
+        # Projection back by the mixing matrix W^{-1}, which needs no past frames.
+        Y = self.separate(X, demix_filter=W)
+        scale = np.linalg.inv(W)[:,reference_id,:].transpose(1,0) # (n_sources, n_bins)
+        output = Y * scale[...,np.newaxis] # (n_sources, n_bins, n_frames)
+
+        if self.callback is not None:
+            self.callback(self)
+
+        return output
+
 def _convolve_mird(titles, reverb=0.160, degrees=[0], mic_intervals=[8,8,8,8,8,8,8], mic_indices=[0], samples=None):
     intervals = '-'.join([str(interval) for interval in mic_intervals])
 
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Job runner to separate a corpus of multichannel WAV files with a process pool.
+Usage: cd src; python -m bss.runner --manifest manifest.txt --out_dir exp/AuxLaplaceIVA --method AuxLaplaceIVA
+Each line of manifest is a path of multichannel WAV file, optionally followed by a tab and a path of steering vector (.npy)
+of shape (n_bins, n_channels, n_sources), which is required by beamformers.
+"""
+
+import argparse
+import os
+import json
+import time
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+BLAS_THREADS_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS']
+
+__separators__ = ['AuxLaplaceIVA', 'GaussILRMA', 'tILRMA', 'GradLaplaceFDICA', 'NaturalGradLaplaceFDICA', 'DSBF', 'MVDR']
+__beamformers__ = ['DSBF', 'MVDR']
+
+parser = argparse.ArgumentParser(description="Separate multichannel WAV files listed in manifest.")
+
+parser.add_argument('--manifest', type=str, required=True, help='Path of manifest.')
+parser.add_argument('--out_dir', type=str, required=True, help='Directory to save separated signals and timings.')
+parser.add_argument('--method', type=str, default='AuxLaplaceIVA', choices=__separators__, help='Separation method.')
+parser.add_argument('--iteration', type=int, default=100, help='Number of iterations.')
+parser.add_argument('--fft_size', type=int, default=4096, help='FFT size.')
+parser.add_argument('--hop_size', type=int, default=2048, help='Hop size.')
+parser.add_argument('--n_bases', type=int, default=4, help='Number of bases of ILRMA.')
+parser.add_argument('--reference_id', type=int, default=0, help='Reference microphone.')
+parser.add_argument('--n_workers', type=int, default=None, help='Number of worker processes. Default: os.cpu_count() // n_threads.')
+parser.add_argument('--n_threads', type=int, default=1, help='Number of BLAS threads per worker.')
+parser.add_argument('--seed', type=int, default=111, help='Random seed of each job.')
+parser.add_argument('--profile', action='store_true', help='Record wall time of stages of each job into result.json, and save trace.json (Chrome trace).')
+
+def build_separator(method, iteration=100, n_bases=4, reference_id=0, profiler=None):
+    """
+    Args:
+        method <str>: one of __separators__.
+        profiler <algorithm.profiler.Profiler>: recorder of stages of separation. If None, nothing is recorded.
+    Returns:
+        separator: callable which maps (n_channels, n_bins, n_frames) to (n_sources, n_bins, n_frames).
+            Projection back is applied inside of each separator.
+    """
+    from bss.iva import AuxLaplaceIVA
+    from bss.ilrma import GaussILRMA, tILRMA
+    from bss.fdica import GradLaplaceFDICA, NaturalGradLaplaceFDICA
+
+    if method == 'AuxLaplaceIVA':
+        separator = AuxLaplaceIVA(reference_id=reference_id)
+    elif method == 'GaussILRMA':
+        separator = GaussILRMA(n_bases=n_bases, reference_id=reference_id)
+    elif method == 'tILRMA':
+        separator = tILRMA(n_bases=n_bases, reference_id=reference_id)
+    elif method == 'GradLaplaceFDICA':
+        separator = GradLaplaceFDICA(reference_id=reference_id)
+    elif method == 'NaturalGradLaplaceFDICA':
+        separator = NaturalGradLaplaceFDICA(reference_id=reference_id)
+    else:
+        raise ValueError("Not support method {}".format(method))
+
+    return lambda input: separator(input, iteration=iteration, profiler=profiler)
+
+def read_manifest(path):
+    """
+    Returns:
+        jobs <list<dict>>: each job has 'id', 'path', and 'steering_vector'.
+    """
+    jobs = []
+    ids = set()
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line == '' or line.startswith('#'):
+                continue
+
+            columns = line.split('\t')
+            wav_path = columns[0]
+            steering_vector_path = columns[1] if len(columns) > 1 else None
+            job_id = os.path.splitext(os.path.basename(wav_path))[0]
+
+            if job_id in ids:
+                raise ValueError("Duplicated file name {} in manifest.".format(job_id))
+            ids.add(job_id)
+
+            jobs.append({
+                'id': job_id,
+                'path': wav_path,
+                'steering_vector': steering_vector_path
+            })
+
+    return jobs
+
+@contextmanager
+def blas_threads_environment(n_threads):
+    """
+    Set BLAS_THREADS_VARIABLES to n_threads while worker processes are spawned, which inherit them before NumPy is imported.
+    Variables of this process are restored on exit, so that BLAS loaded later by the caller is not limited.
+    Args:
+        n_threads <int>: number of BLAS threads per worker.
+    """
+    previous = {key: os.environ.get(key) for key in BLAS_THREADS_VARIABLES}
+
+    for key in BLAS_THREADS_VARIABLES:
+        os.environ[key] = str(n_threads)
+
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+def _init_worker(n_threads):
+    # Environment variables are inherited by spawned workers before NumPy is imported.
+    # threadpoolctl is used as well if available, because some BLAS ignore them once loaded.
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=n_threads)
+    except ImportError:
+        pass
+
+def separate_file(job, config):
+    """
+    STFT -> separation (including projection back) -> iSTFT of single file.
+    Args:
+        job <dict>: 'id', 'path', and 'steering_vector'.
+        config <dict>: arguments of runner.
+    Returns:
+        result <dict>: paths of separated signals and timings.
+    """
+    import numpy as np
+
+    from utils.utils_audio import read_wav, write_wav
+    from algorithm.stft import stft, istft
+    from algorithm.profiler import Profiler, profile
+    from bss.beamform import DelaySumBeamformer, MVDRBeamformer
+
+    method = config['method']
+    fft_size, hop_size = config['fft_size'], config['hop_size']
+    reference_id = config['reference_id']
+    out_dir = os.path.join(config['out_dir'], job['id'])
+
+    np.random.seed(config['seed'])
+
+    profiler = Profiler() if config.get('profile') else None
+    start = time.perf_counter()
+
+    mixed_signal, sr = read_wav(job['path'])
+    if mixed_signal.ndim == 1:
+        mixed_signal = mixed_signal[:,np.newaxis]
+    mixed_signal = mixed_signal.transpose(1,0) # (n_channels, T)
+    n_channels, T = mixed_signal.shape
+
+    with profile(profiler, 'stft'):
+        mixture = stft(mixed_signal, fft_size=fft_size, hop_size=hop_size) # (n_channels, n_bins, n_frames)
+
+    if method in __beamformers__:
+        if job['steering_vector'] is None:
+            raise ValueError("Specify steering vector of {} in manifest.".format(job['path']))
+        steering_vector = np.load(job['steering_vector'])
+
+        if method == 'DSBF':
+            separator = DelaySumBeamformer(steering_vector=steering_vector, reference_id=reference_id)
+        else:
+            separator = MVDRBeamformer(steering_vector=steering_vector, reference_id=reference_id)
+    else:
+        separator = build_separator(method, iteration=config['iteration'], n_bases=config['n_bases'], reference_id=reference_id, profiler=profiler)
+
+    with profile(profiler, 'separate'):
+        estimation = separator(mixture)
+
+    with profile(profiler, 'istft'):
+        estimated_signal = istft(estimation, fft_size=fft_size, hop_size=hop_size, length=T) # (n_sources, T)
+
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+
+    for idx, _estimated_signal in enumerate(estimated_signal):
+        path = os.path.join(out_dir, "estimated-{}.wav".format(idx))
+        write_wav(path, signal=_estimated_signal, sr=sr)
+        paths.append(path)
+
+    duration = T / sr
+    result = {
+        'id': job['id'],
+        'path': job['path'],
+        'method': method,
+        'estimation': paths,
+        'duration': duration,
+        'elapsed': elapsed,
+        'rtf': elapsed / duration
+    }
+
+    if profiler is not None:
+        result['profile'] = profiler.summary()
+        profiler.to_chrome_trace(os.path.join(out_dir, "trace.json"))
+
+    # result.json is written at last, and marks the job as completed.
+    result_path = os.path.join(out_dir, "result.json")
+    with open(result_path + '.tmp', 'w') as f:
+        json.dump(result, f)
+    os.replace(result_path + '.tmp', result_path)
+
+    return result
+
+def is_completed(job, out_dir):
+    return os.path.exists(os.path.join(out_dir, job['id'], "result.json"))
+
+def run(jobs, config, n_workers=None, n_threads=1):
+    """
+    Args:
+        jobs <list<dict>>: see read_manifest.
+        config <dict>: arguments of runner.
+        n_workers <int>: number of worker processes.
+        n_threads <int>: number of BLAS threads per worker.
+    Returns:
+        results <list<dict>>: results of jobs completed in this run.
+        failures <list<dict>>: jobs which raised an exception.
+    """
+    if n_workers is None:
+        n_workers = max((os.cpu_count() or 1) // n_threads, 1)
+
+    out_dir = config['out_dir']
+    os.makedirs(out_dir, exist_ok=True)
+
+    pending_jobs = [job for job in jobs if not is_completed(job, out_dir)]
+    print("{} jobs, {} already completed.".format(len(jobs), len(jobs) - len(pending_jobs)), flush=True)
+
+    results, failures = [], []
+    context = multiprocessing.get_context('spawn')
+    start = time.perf_counter()
+
+    with blas_threads_environment(n_threads), ProcessPoolExecutor(max_workers=n_workers, mp_context=context, initializer=_init_worker, initargs=(n_threads,)) as executor:
+        futures = {executor.submit(separate_file, job, config): job for job in pending_jobs}
+
+        with open(os.path.join(out_dir, "timings.jsonl"), 'a') as f:
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failures.append({'id': job['id'], 'path': job['path'], 'error': repr(e)})
+                    print("Failed {}: {}".format(job['path'], repr(e)), flush=True)
+                    continue
+
+                results.append(result)
+                f.write(json.dumps(result) + '\n')
+                f.flush()
+                print("[{}/{}] {}: RTF {:.3f}".format(len(results), len(pending_jobs), result['id'], result['rtf']), flush=True)
+
+    wall_time = time.perf_counter() - start
+    duration = sum([result['duration'] for result in results])
+    elapsed = sum([result['elapsed'] for result in results])
+
+    if duration > 0:
+        print("Audio: {:.1f}s, wall time: {:.1f}s, RTF per worker: {:.3f}, throughput RTF: {:.3f}".format(duration, wall_time, elapsed / duration, wall_time / duration), flush=True)
+
+    return results, failures
+
+def main(args):
+    jobs = read_manifest(args.manifest)
+
+    config = {
+        'out_dir': args.out_dir,
+        'method': args.method,
+        'iteration': args.iteration,
+        'fft_size': args.fft_size,
+        'hop_size': args.hop_size,
+        'n_bases': args.n_bases,
+        'reference_id': args.reference_id,
+        'seed': args.seed,
+        'profile': args.profile
+    }
+
+    _, failures = run(jobs, config, n_workers=args.n_workers, n_threads=args.n_threads)
+
+    if len(failures) > 0:
+        with open(os.path.join(args.out_dir, "failures.jsonl"), 'w') as f:
+            for failure in failures:
+                f.write(json.dumps(failure) + '\n')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    print(args)
+    main(args)
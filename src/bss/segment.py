@@ -0,0 +1,166 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+EPS=1e-12
+
+class SegmentSeparator:
+    """
+    Separation of a long recording by overlapping segments of frames, whose memory is bounded by `segment_size` instead of the length of recording.
+    Each segment is separated by `separator` warm-started from the demixing filters (and NMF bases for ILRMA) of the previous segment,
+    so segments after the first one need only `warm_iteration` iterations.
+    Sources of each segment are aligned to the previous segment by correlation of power envelopes in the overlap,
+    and segments are stitched by overlap-add with linear cross-fade.
+    Scales are continuous across segments as long as `separator` applies projection back onto the same reference microphone.
+    """
+    def __init__(self, separator, segment_size=512, overlap=128, iteration=100, warm_iteration=20, eps=EPS):
+        """
+        Args:
+            separator: separator which supports `__call__(input, iteration, warm_start=True)`, e.g. AuxLaplaceIVA or GaussILRMA.
+            segment_size <int>: number of frames of each segment.
+            overlap <int>: number of frames shared by adjacent segments. Must be smaller than `segment_size`.
+            iteration <int>: number of iterations of the first segment.
+            warm_iteration <int>: number of iterations of the following segments.
+        """
+        if overlap < 0 or overlap >= segment_size:
+            raise ValueError("overlap must satisfy 0 <= overlap < segment_size, but given overlap={} and segment_size={}.".format(overlap, segment_size))
+
+        self.separator = separator
+        self.segment_size = segment_size
+        self.overlap = overlap
+        self.iteration = iteration
+        self.warm_iteration = warm_iteration
+        self.eps = eps
+
+        self.permutations = []
+
+    def segments(self, n_frames):
+        """
+        Args:
+            n_frames <int>
+        Returns:
+            segments <list<slice>>: ranges of frames. Adjacent ranges share `overlap` frames, and the last one ends at n_frames.
+        """
+        segment_size, overlap = self.segment_size, self.overlap
+        hop_size = segment_size - overlap
+
+        segments = []
+        start_idx = 0
+
+        while True:
+            end_idx = min(start_idx + segment_size, n_frames)
+            segments.append(slice(start_idx, end_idx))
+
+            if end_idx >= n_frames:
+                break
+
+            start_idx += hop_size
+
+        return segments
+
+    def __call__(self, input, out=None, **kwargs):
+        """
+        Args:
+            input (n_channels, n_bins, n_frames): any array sliceable along frames, e.g. np.memmap of spectrogram.
+            out (n_sources, n_bins, n_frames): array to write the output into, e.g. np.memmap. If None, it is allocated.
+            kwargs: options of separator, e.g. dtype=np.complex64.
+        Returns:
+            output (n_sources, n_bins, n_frames)
+        """
+        for frames, output in self.iterate(input, **kwargs):
+            if out is None:
+                n_channels, n_bins, n_frames = input.shape
+                out = np.empty((output.shape[0], n_bins, n_frames), dtype=output.dtype)
+
+            out[:,:,frames] = output
+
+        return out
+
+    def iterate(self, input, **kwargs):
+        """
+        Separate segments one by one. Only the current segment and the overlap of the previous one are kept in memory.
+        Args:
+            input (n_channels, n_bins, n_frames): any array sliceable along frames, e.g. np.memmap of spectrogram.
+            kwargs: options of separator, e.g. dtype=np.complex64.
+        Yields:
+            frames <slice>: range of frames which are finalized.
+            output (n_sources, n_bins, len(frames))
+        """
+        n_channels, n_bins, n_frames = input.shape
+
+        separator = self.separator
+        segments = self.segments(n_frames)
+
+        self.permutations = []
+        tail = None
+
+        for segment_idx, frames in enumerate(segments):
+            X = np.asarray(input[:,:,frames])
+
+            if segment_idx == 0:
+                Y = separator(X, iteration=self.iteration, warm_start=False, **kwargs)
+            else:
+                Y = separator(X, iteration=self.warm_iteration, warm_start=True, **kwargs)
+
+            n_overlap = 0 if tail is None else tail.shape[-1]
+
+            if n_overlap > 0:
+                permutation = self.solve_permutation(tail, Y[:,:,:n_overlap])
+                Y = Y[permutation]
+                self.permute_sources(permutation)
+                self.permutations.append(permutation)
+
+                fade_in = np.arange(1, n_overlap + 1) / (n_overlap + 1)
+                Y[:,:,:n_overlap] = (1 - fade_in) * tail + fade_in * Y[:,:,:n_overlap]
+
+            if frames.stop < n_frames:
+                n_overlap = self.overlap
+                tail = Y[:,:,-n_overlap:].copy() if n_overlap > 0 else None
+                yield slice(frames.start, frames.stop - n_overlap), Y[:,:,:Y.shape[-1] - n_overlap]
+            else:
+                yield frames, Y
+
+    def solve_permutation(self, reference, estimation):
+        """
+        Args:
+            reference (n_sources, n_bins, n_overlap): output of the previous segment in the overlap.
+            estimation (n_sources, n_bins, n_overlap): output of the current segment in the overlap.
+        Returns:
+            permutation (n_sources,): aligned source k is estimation[permutation[k]].
+        """
+        reference, estimation = self.compute_envelope(reference), self.compute_envelope(estimation)
+        similarity = np.sum(reference @ estimation.transpose(0,2,1), axis=0) # (n_sources, n_sources)
+        _, permutation = linear_sum_assignment(- similarity)
+
+        return permutation
+
+    def compute_envelope(self, estimation):
+        """
+        Args:
+            estimation (n_sources, n_bins, n_frames)
+        Returns:
+            envelope (n_bins, n_sources, n_frames): power envelopes with zero mean and unit norm, which are invariant to scaling.
+        """
+        eps = self.eps
+
+        envelope = np.abs(estimation).transpose(1,0,2) # (n_bins, n_sources, n_frames)
+        envelope = envelope - envelope.mean(axis=2, keepdims=True)
+        norm = np.sqrt(np.sum(envelope**2, axis=2, keepdims=True))
+        norm[norm < eps] = eps
+        envelope = envelope / norm
+
+        return envelope
+
+    def permute_sources(self, permutation):
+        """
+        Permute sources of separator, so that the next segment is warm-started in the aligned order.
+        Args:
+            permutation (n_sources,)
+        """
+        separator = self.separator
+        separator.demix_filter = separator.demix_filter[:,permutation]
+
+        if getattr(separator, 'base', None) is not None:
+            if separator.partitioning:
+                separator.latent = separator.latent[permutation]
+            else:
+                separator.base = separator.base[permutation]
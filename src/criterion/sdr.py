@@ -0,0 +1,36 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+EPS=1e-12
+
+def sisdr(input, target, eps=EPS):
+    """
+    Scale-invariant signal-to-distortion ratio [dB]
+    Args:
+        input (*, T)
+        target (*, T)
+    Returns:
+        output (*)
+    """
+    alpha = np.sum(input * target, axis=-1, keepdims=True) / (np.sum(target**2, axis=-1, keepdims=True) + eps)
+    target = alpha * target
+    distortion = input - target
+
+    output = 10 * np.log10((np.sum(target**2, axis=-1) + eps) / (np.sum(distortion**2, axis=-1) + eps))
+
+    return output
+
+def permutation_invariant_sisdr(input, target, eps=EPS):
+    """
+    Args:
+        input (n_sources, T)
+        target (n_sources, T)
+    Returns:
+        output (n_sources,): SI-SDR of target sources under the best permutation.
+        permutation (n_sources,): index of estimated source assigned to each target source.
+    """
+    sdr = sisdr(input[np.newaxis,:,:], target[:,np.newaxis,:], eps=eps) # (n_targets, n_estimations)
+    _, permutation = linear_sum_assignment(- sdr)
+    output = sdr[np.arange(len(target)), permutation]
+
+    return output, permutation
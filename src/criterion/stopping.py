@@ -0,0 +1,183 @@
+import time
+import numpy as np
+
+EPS=1e-12
+
+class StoppingCriterion:
+    """
+    Base class of stopping criteria of iterative separators.
+    `reset()` is called at the beginning of each run, and `__call__(separator)` after each iteration.
+    When a criterion is met, `reason` and `iteration` record why and when the run stopped.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.iteration = 0
+        self.reason = None
+
+    def __call__(self, separator):
+        """
+        Args:
+            separator: separator which has `loss` (and `demix_filter` for some criteria).
+        Returns:
+            is_stopped <bool>
+        """
+        self.iteration += 1
+        reason = self.check(separator)
+
+        if reason is None:
+            return False
+
+        self.reason = reason
+
+        return True
+
+    def check(self, separator):
+        """
+        Returns:
+            reason <str>: reason of stopping, or None if not stopped.
+        """
+        raise NotImplementedError("Implement 'check' function.")
+
+class LossChange(StoppingCriterion):
+    """
+    Stop when the relative change of loss |L_{i} - L_{i-1}| / |L_{i-1}| is below `tol` for `patience` evaluations in a row.
+    For batched separators, whose loss is an array, all items have to satisfy the condition.
+    If loss is evaluated every `loss_interval` iterations, only iterations which append new loss are counted.
+    """
+    def __init__(self, tol=1e-5, patience=1, eps=EPS):
+        self.tol = tol
+        self.patience = patience
+        self.eps = eps
+
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+
+        self.n_stalled = 0
+        self.n_losses = 0
+
+    def check(self, separator):
+        loss = separator.loss
+
+        if len(loss) < 2 or len(loss) == self.n_losses:
+            return None
+
+        self.n_losses = len(loss)
+
+        current, previous = np.asarray(loss[-1], dtype=np.float64), np.asarray(loss[-2], dtype=np.float64)
+        change = np.abs(current - previous) / np.maximum(np.abs(previous), self.eps)
+
+        if np.all(change < self.tol):
+            self.n_stalled += 1
+        else:
+            self.n_stalled = 0
+
+        if self.n_stalled >= self.patience:
+            return "relative loss change {:.3e} < {:.3e} for {} iterations".format(float(np.max(change)), self.tol, self.n_stalled)
+
+        return None
+
+class DemixFilterChange(StoppingCriterion):
+    """
+    Stop when the relative change of demixing filters ||W_{i} - W_{i-1}||_F / ||W_{i-1}||_F is below `tol` for `patience` iterations in a row.
+    """
+    def __init__(self, tol=1e-4, patience=1, eps=EPS):
+        self.tol = tol
+        self.patience = patience
+        self.eps = eps
+
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+
+        self.n_stalled = 0
+        self.demix_filter = None
+
+    def check(self, separator):
+        demix_filter = separator.demix_filter
+        previous, self.demix_filter = self.demix_filter, demix_filter.copy()
+
+        if previous is None:
+            return None
+
+        change = np.linalg.norm(demix_filter - previous) / max(np.linalg.norm(previous), self.eps)
+
+        if change < self.tol:
+            self.n_stalled += 1
+        else:
+            self.n_stalled = 0
+
+        if self.n_stalled >= self.patience:
+            return "relative demixing filter change {:.3e} < {:.3e} for {} iterations".format(change, self.tol, self.n_stalled)
+
+        return None
+
+class TimeBudget(StoppingCriterion):
+    """
+    Stop when the wall-clock time since `reset()` exceeds `max_time` seconds.
+    """
+    def __init__(self, max_time):
+        self.max_time = max_time
+
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+
+        self.start = time.perf_counter()
+
+    def check(self, separator):
+        elapsed = time.perf_counter() - self.start
+
+        if elapsed > self.max_time:
+            return "elapsed time {:.3f}s > {:.3f}s".format(elapsed, self.max_time)
+
+        return None
+
+class AnyCriterion(StoppingCriterion):
+    """
+    Stop when any of criteria is met.
+    """
+    def __init__(self, criteria):
+        """
+        Args:
+            criteria <list<StoppingCriterion>>
+        """
+        self.criteria = criteria
+
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+
+        for criterion in self.criteria:
+            criterion.reset()
+
+    def check(self, separator):
+        reasons = []
+
+        # All criteria are updated, so that their internal states are kept consistent.
+        for criterion in self.criteria:
+            if criterion(separator):
+                reasons.append(criterion.reason)
+
+        if len(reasons) == 0:
+            return None
+
+        return ", ".join(reasons)
+
+def build_stopping(stopping):
+    """
+    Args:
+        stopping <StoppingCriterion>, <list<StoppingCriterion>>, or None
+    Returns:
+        stopping <StoppingCriterion> or None
+    """
+    if stopping is None or isinstance(stopping, StoppingCriterion):
+        return stopping
+
+    return AnyCriterion(list(stopping))
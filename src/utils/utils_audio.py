@@ -1,17 +1,366 @@
 import math
+import struct
 from scipy.io import wavfile
 import numpy as np
 
+from algorithm.stft import StreamingSTFT, StreamingISTFT
+
+CHUNK_SIZE=2**16
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+__sample_formats__ = ['uint8', 'int16', 'int24', 'int32', 'float32']
+
 def read_wav(path):
     sr, signal = wavfile.read(path)
     signal = signal / 32768
-    
+
     return signal, sr
 
-def write_wav(path, signal, sr):
-    signal = signal * 32768
-    signal = np.clip(signal, -32768, 32767).astype(np.int16)
-    wavfile.write(path, sr, signal)
+def write_wav(path, signal, sr, chunk_size=CHUNK_SIZE):
+    """
+    Write 16-bit PCM WAV. Samples are scaled, clipped, and cast chunk by chunk into the memory-mapped file,
+    so no full-length copy of signal is made.
+    Args:
+        signal (n_samples,) or (n_samples, n_channels)
+    """
+    n_samples = signal.shape[0]
+    n_channels = 1 if signal.ndim == 1 else signal.shape[1]
+
+    data = create_wav(path, n_samples=n_samples, n_channels=n_channels, sr=sr, sample_format='int16')
+
+    for start_idx in range(0, n_samples, chunk_size):
+        end_idx = min(start_idx + chunk_size, n_samples)
+        chunk = signal[start_idx:end_idx] * 32768
+
+        if signal.ndim == 1:
+            chunk = chunk[:,np.newaxis]
+
+        data[start_idx:end_idx] = np.clip(chunk, -32768, 32767)
+
+    data.flush()
+
+class WavMemmap:
+    """
+    Memory-mapped PCM WAV file (uint8, int16, int24, int32, or float32).
+    Raw samples are views of the file without copy, and conversion to floating point is done only for requested ranges,
+    so long recordings can be streamed chunk by chunk without loading the whole file.
+    """
+    def __init__(self, path, mode='r'):
+        """
+        Args:
+            path <str>: path of WAV file.
+            mode <str>: 'r' (read-only), 'r+' (read and write), or 'c' (copy-on-write). See np.memmap.
+        """
+        self.path = path
+
+        with open(path, 'rb') as f:
+            header = _read_header(f)
+
+        self.sr = header['sr']
+        self.n_channels = header['n_channels']
+        self.sample_format = header['sample_format']
+
+        offset, n_bytes = header['offset'], header['n_bytes']
+
+        if self.sample_format == 'int24':
+            # 24-bit samples have no NumPy dtype, so they are viewed as 3 bytes each.
+            n_samples = n_bytes // (3 * self.n_channels)
+            shape = (n_samples, self.n_channels, 3)
+            dtype = np.uint8
+        else:
+            dtype = np.dtype(self.sample_format).newbyteorder('<')
+            n_samples = n_bytes // (dtype.itemsize * self.n_channels)
+            shape = (n_samples, self.n_channels)
+
+        self.n_samples = n_samples
+
+        if n_samples > 0:
+            self.data = np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=shape)
+        else:
+            self.data = np.zeros(shape, dtype=dtype)
+
+    def __len__(self):
+        return self.n_samples
+
+    @property
+    def shape(self):
+        return (self.n_samples, self.n_channels)
+
+    @property
+    def duration(self):
+        return self.n_samples / self.sr
+
+    def frames(self, start=0, end=None):
+        """
+        Args:
+            start <int>: first sample.
+            end <int>: last sample (exclusive). If None, the end of file.
+        Returns:
+            frames (end - start, n_channels): view of raw samples without copy. (end - start, n_channels, 3) of bytes for int24.
+        """
+        return self.data[start:end]
+
+    def read(self, start=0, end=None, dtype=np.float64):
+        """
+        Args:
+            start <int>: first sample.
+            end <int>: last sample (exclusive). If None, the end of file.
+            dtype: floating point dtype of output.
+        Returns:
+            signal (end - start, n_channels): samples scaled to [-1, 1).
+        """
+        return _to_float(self.frames(start, end), self.sample_format, dtype=dtype)
+
+    def chunks(self, chunk_size=CHUNK_SIZE, dtype=np.float64):
+        """
+        Args:
+            chunk_size <int>: number of samples of each chunk. The last chunk may be shorter.
+            dtype: floating point dtype of output.
+        Yields:
+            chunk (chunk_size, n_channels): samples scaled to [-1, 1).
+        """
+        for start_idx in range(0, self.n_samples, chunk_size):
+            yield self.read(start_idx, start_idx + chunk_size, dtype=dtype)
+
+def create_wav(path, n_samples, n_channels, sr, sample_format='int16'):
+    """
+    Create WAV file of given length, and map its samples to memory for writing.
+    Args:
+        sample_format <str>: 'uint8', 'int16', 'int32', or 'float32'.
+    Returns:
+        data (n_samples, n_channels) <np.memmap>: raw samples. Call `data.flush()` after writing.
+    """
+    if sample_format not in __sample_formats__ or sample_format == 'int24':
+        raise ValueError("Not support {} for writing. Choose from 'uint8', 'int16', 'int32', or 'float32'.".format(sample_format))
+
+    dtype = np.dtype(sample_format).newbyteorder('<')
+    block_align = n_channels * dtype.itemsize
+    n_bytes = n_samples * block_align
+
+    if sample_format == 'float32':
+        fmt = struct.pack('<HHIIHHH', WAVE_FORMAT_IEEE_FLOAT, n_channels, sr, sr * block_align, block_align, 8 * dtype.itemsize, 0)
+        chunks = b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'fact' + struct.pack('<II', 4, n_samples)
+    else:
+        fmt = struct.pack('<HHIIHH', WAVE_FORMAT_PCM, n_channels, sr, sr * block_align, block_align, 8 * dtype.itemsize)
+        chunks = b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+
+    chunks += b'data' + struct.pack('<I', n_bytes)
+    header = b'RIFF' + struct.pack('<I', 4 + len(chunks) + n_bytes + n_bytes % 2) + b'WAVE' + chunks
+
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.truncate(len(header) + n_bytes + n_bytes % 2)
+
+    if n_samples == 0:
+        return np.zeros((0, n_channels), dtype=dtype)
+
+    return np.memmap(path, dtype=dtype, mode='r+', offset=len(header), shape=(n_samples, n_channels))
+
+def save_spectrogram(path, spectrogram):
+    """
+    Args:
+        path <str>: path of .npy file.
+        spectrogram (n_channels, n_bins, n_frames)
+    """
+    np.save(path, spectrogram)
+
+def load_spectrogram(path, mmap=True):
+    """
+    Args:
+        path <str>: path of .npy file.
+        mmap <bool>: map the file to memory (read-only) instead of loading it.
+    Returns:
+        spectrogram (n_channels, n_bins, n_frames)
+    """
+    return np.load(path, mmap_mode='r' if mmap else None)
+
+def create_spectrogram(path, shape, dtype=np.complex128):
+    """
+    Create .npy file of given shape, and map it to memory for writing, e.g. as `out` of bss.segment.SegmentSeparator.
+    Returns:
+        spectrogram <np.memmap>: uninitialized array of (*shape). Call `spectrogram.flush()` after writing.
+    """
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=tuple(shape))
+
+def stft_wav(wav, path, fft_size, hop_size=None, window_fn='hann', chunk_size=CHUNK_SIZE, dtype=np.complex128):
+    """
+    Stream WAV file chunk by chunk into STFT, whose frames are written into .npy file.
+    The output is identical to `algorithm.stft.stft` of the whole signal.
+    Args:
+        wav <WavMemmap> or <str>: WAV file.
+        path <str>: path of .npy file.
+        dtype: dtype of spectrogram, e.g. np.complex64.
+    Returns:
+        spectrogram (n_channels, n_bins, n_frames) <np.memmap>
+    """
+    if isinstance(wav, str):
+        wav = WavMemmap(wav)
+
+    if hop_size is None:
+        hop_size = fft_size // 2
+
+    n_channels, n_samples = wav.n_channels, wav.n_samples
+    n_bins = fft_size // 2 + 1
+
+    # Boundary padding of fft_size // 2 at both ends, and zero padding to complete the last frame as scipy.signal.stft does.
+    n_padded = n_samples + 2 * (fft_size // 2)
+    n_frames = max(math.ceil((n_padded - fft_size) / hop_size), 0) + 1
+
+    spectrogram = create_spectrogram(path, (n_channels, n_bins, n_frames), dtype=dtype)
+    analysis = StreamingSTFT(fft_size, hop_size=hop_size, window_fn=window_fn)
+    frame_idx = 0
+
+    for chunk in wav.chunks(chunk_size=chunk_size):
+        output = analysis(chunk.transpose(1,0))
+        spectrogram[:,:,frame_idx:frame_idx+output.shape[-1]] = output
+        frame_idx += output.shape[-1]
+
+    output = analysis.flush()
+    spectrogram[:,:,frame_idx:frame_idx+output.shape[-1]] = output
+    frame_idx += output.shape[-1]
+
+    assert frame_idx == n_frames, "Number of frames is {}, but {} is expected.".format(frame_idx, n_frames)
+
+    spectrogram.flush()
+
+    return spectrogram
+
+def istft_wav(spectrogram, path, sr, fft_size, hop_size=None, window_fn='hann', length=None, chunk_size=256, sample_format='int16'):
+    """
+    Stream frames of spectrogram chunk by chunk into inverse STFT, whose samples are written into WAV file.
+    Args:
+        spectrogram (n_channels, n_bins, n_frames): any array sliceable along frames, e.g. np.memmap.
+        path <str>: path of WAV file.
+        length <int>: number of samples. If None, all samples are written.
+        chunk_size <int>: number of frames of each chunk.
+        sample_format <str>: 'int16', 'int32', or 'float32'.
+    Returns:
+        wav <WavMemmap>
+    """
+    if hop_size is None:
+        hop_size = fft_size // 2
+
+    n_channels, _, n_frames = spectrogram.shape
+
+    if length is None:
+        length = (n_frames - 1) * hop_size
+
+    data = create_wav(path, n_samples=length, n_channels=n_channels, sr=sr, sample_format=sample_format)
+    synthesis = StreamingISTFT(fft_size, hop_size=hop_size, window_fn=window_fn)
+    sample_idx = 0
+
+    def _write(output):
+        nonlocal sample_idx
+
+        n_samples = min(output.shape[-1], length - sample_idx)
+        data[sample_idx:sample_idx+n_samples] = _from_float(output[:,:n_samples].transpose(1,0), sample_format)
+        sample_idx += n_samples
+
+    for start_idx in range(0, n_frames, chunk_size):
+        _write(synthesis(np.asarray(spectrogram[:,:,start_idx:start_idx+chunk_size])))
+
+    _write(synthesis.flush())
+
+    if isinstance(data, np.memmap):
+        data.flush()
+
+    return WavMemmap(path)
+
+def _read_header(f):
+    """
+    Args:
+        f: file object of WAV file.
+    Returns:
+        header <dict>: 'sr', 'n_channels', 'sample_format', 'offset' and 'n_bytes' of samples.
+    """
+    riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+
+    if riff != b'RIFF' or wave != b'WAVE':
+        raise ValueError("Not a RIFF/WAVE file.")
+
+    header = {}
+
+    while True:
+        chunk_header = f.read(8)
+
+        if len(chunk_header) < 8:
+            break
+
+        chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+
+        if chunk_id == b'fmt ':
+            fmt = f.read(chunk_size)
+            format_tag, n_channels, sr, _, block_align, bits_per_sample = struct.unpack('<HHIIHH', fmt[:16])
+
+            if format_tag == WAVE_FORMAT_EXTENSIBLE:
+                format_tag, = struct.unpack('<H', fmt[24:26])
+
+            header['sr'], header['n_channels'] = sr, n_channels
+            header['sample_format'] = _sample_format(format_tag, bits_per_sample)
+        elif chunk_id == b'data':
+            if 'sample_format' not in header:
+                raise ValueError("'fmt ' chunk is not found before 'data' chunk.")
+
+            offset = f.tell()
+            f.seek(0, 2)
+            # Size of 'data' chunk may be unknown (0 or 0xFFFFFFFF) in files written by streaming recorders.
+            header['offset'], header['n_bytes'] = offset, min(chunk_size, f.tell() - offset)
+
+            return header
+        else:
+            f.seek(chunk_size + chunk_size % 2, 1)
+
+        if chunk_id == b'fmt ' and chunk_size % 2 == 1:
+            f.seek(1, 1)
+
+    raise ValueError("'data' chunk is not found.")
+
+def _sample_format(format_tag, bits_per_sample):
+    if format_tag == WAVE_FORMAT_PCM and bits_per_sample in [8, 16, 24, 32]:
+        return {8: 'uint8', 16: 'int16', 24: 'int24', 32: 'int32'}[bits_per_sample]
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits_per_sample == 32:
+        return 'float32'
+
+    raise ValueError("Not support format tag {} with {} bits per sample. Choose from {}.".format(format_tag, bits_per_sample, __sample_formats__))
+
+def _to_float(frames, sample_format, dtype=np.float64):
+    """
+    Args:
+        frames (n_samples, n_channels): raw samples. (n_samples, n_channels, 3) of bytes for int24.
+    Returns:
+        signal (n_samples, n_channels): samples scaled to [-1, 1).
+    """
+    if sample_format == 'float32':
+        return frames.astype(dtype)
+    if sample_format == 'uint8':
+        return (frames.astype(dtype) - 128) / 128
+    if sample_format == 'int24':
+        frames = frames.astype(np.int32)
+        frames = frames[...,0] | (frames[...,1] << 8) | (frames[...,2] << 16)
+        frames = (frames << 8) >> 8 # sign extension
+
+        return frames.astype(dtype) / 2**23
+
+    return frames.astype(dtype) / 2**(8 * np.dtype(sample_format).itemsize - 1)
+
+def _from_float(signal, sample_format):
+    """
+    Args:
+        signal (n_samples, n_channels): samples in [-1, 1).
+    Returns:
+        frames (n_samples, n_channels): raw samples, which are scaled and clipped.
+    """
+    if sample_format == 'float32':
+        return signal.astype(np.float32)
+    if sample_format == 'uint8':
+        return np.clip(signal * 128 + 128, 0, 255).astype(np.uint8)
+
+    scale = 2**(8 * np.dtype(sample_format).itemsize - 1)
+
+    return np.clip(signal * scale, - scale, scale - 1).astype(sample_format)
 
 def mu_law_compand(x, mu=255):
     return np.sign(x) * np.log(1 + mu * np.abs(x)) / np.log(1 + mu)